@@ -0,0 +1,276 @@
+# analytics.py - Topic/level/language usage rollups and trending topics
+# Each generated explanation is recorded in memory; a background task
+# folds the buffered events into the usage_hourly and usage_daily tables
+# with upsert increments every ROLLUP_FLUSH_SECONDS, so usage reports
+# never scan explanations. One Space-Saving sketch per trending window
+# keeps that window's heavy-hitter topics in memory for /api/trending;
+# topics are listed by canonical form, never by any one user's wording.
+#
+#   python analytics.py backfill [--days N]   # rebuild rollups from explanations
+import os
+import asyncio
+import argparse
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+
+import sqlalchemy
+
+from database import IS_POSTGRES, database, connect_sqlite, fetch_all_read, usage_hourly_table, usage_daily_table
+from topic_index import canonicalize_topic
+
+ROLLUP_FLUSH_SECONDS = int(os.getenv("ROLLUP_FLUSH_SECONDS", "60"))
+# Topics tracked by the trending sketch
+TRENDING_CAPACITY = int(os.getenv("TRENDING_CAPACITY", "500"))
+# Each window's sketch counts are halved this often, so old bursts fade out
+TRENDING_HALF_LIFE_MINUTES = {
+    "hour": int(os.getenv("TRENDING_HOUR_HALF_LIFE_MINUTES", "15")),
+    "day": int(os.getenv("TRENDING_DAY_HALF_LIFE_MINUTES", "360")),
+}
+# Topics requested fewer times than this are never listed (they may be one user's private text)
+TRENDING_MIN_COUNT = int(os.getenv("TRENDING_MIN_COUNT", "3"))
+
+ROLLUPS = {"hour": usage_hourly_table, "day": usage_daily_table}
+WINDOWS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+def bucket_start(timestamp, period):
+    if period == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class SpaceSaving:
+    """Space-Saving top-K sketch: at most `capacity` counters, error bounded by the smallest one"""
+
+    def __init__(self, capacity=TRENDING_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, item, count=1):
+        with self._lock:
+            if item in self.counts:
+                self.counts[item] += count
+            elif len(self.counts) < self.capacity:
+                self.counts[item] = count
+                self.errors[item] = 0
+            else:
+                # Replace the smallest counter; its count becomes the new item's error bound
+                smallest = min(self.counts, key=self.counts.get)
+                floor = self.counts.pop(smallest)
+                self.errors.pop(smallest)
+                self.counts[item] = floor + count
+                self.errors[item] = floor
+
+    def decay(self, factor=0.5):
+        with self._lock:
+            for item in list(self.counts):
+                self.counts[item] *= factor
+                self.errors[item] *= factor
+                if self.counts[item] < 0.5:
+                    del self.counts[item]
+                    del self.errors[item]
+
+    def top(self, limit=10, min_count=0):
+        """[(item, estimated count, guaranteed count)] by estimated count"""
+        with self._lock:
+            ranked = sorted(self.counts.items(), key=lambda pair: pair[1], reverse=True)
+            return [
+                (item, round(count, 1), round(count - self.errors[item], 1))
+                for item, count in ranked if count - self.errors[item] >= min_count
+            ][:limit]
+
+class UsageRecorder:
+    """Buffers usage events between rollup flushes and feeds the trending sketches"""
+
+    def __init__(self):
+        self._events = Counter()
+        self._lock = threading.Lock()
+        self.sketches = {window: SpaceSaving() for window in WINDOWS}
+
+    def record(self, topic, level, language, timestamp=None):
+        canonical = canonicalize_topic(topic)[:200]
+        if not canonical:
+            return
+        hour = bucket_start(timestamp or datetime.utcnow(), "hour")
+        with self._lock:
+            self._events[(hour, canonical, level or "Unknown", language or "English")] += 1
+        for sketch in self.sketches.values():
+            sketch.add(canonical)
+
+    def drain(self):
+        with self._lock:
+            events, self._events = self._events, Counter()
+        return events
+
+usage = UsageRecorder()
+
+def rollup_rows(events):
+    """Hourly events -> {period: [row, ...]} with daily buckets merged"""
+    rows = {}
+    for period in ROLLUPS:
+        merged = Counter()
+        for (hour, topic, level, language), count in events.items():
+            merged[(bucket_start(hour, period), topic, level, language)] += count
+        rows[period] = [
+            {"bucket_start": bucket, "topic": topic, "level": level, "language": language, "count": count}
+            for (bucket, topic, level, language), count in merged.items()
+        ]
+    return rows
+
+# Database functions
+async def upsert_rollups_pg(rows):
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    async with database.transaction():
+        for period, table in ROLLUPS.items():
+            if not rows[period]:
+                continue
+            query = pg_insert(table)
+            query = query.on_conflict_do_update(
+                index_elements=[table.c.bucket_start, table.c.topic, table.c.level, table.c.language],
+                set_={"count": table.c.count + query.excluded.count}
+            )
+            await database.execute_many(query, rows[period])
+
+def upsert_rollups_sqlite(rows):
+    conn = connect_sqlite()
+    try:
+        for period, table in ROLLUPS.items():
+            conn.executemany(f'''
+                INSERT INTO {table.name} (bucket_start, topic, level, language, count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (bucket_start, topic, level, language) DO UPDATE SET count = count + excluded.count
+            ''', [
+                (row["bucket_start"].isoformat(), row["topic"], row["level"], row["language"], row["count"])
+                for row in rows[period]
+            ])
+        conn.commit()
+    finally:
+        conn.close()
+
+async def flush_usage():
+    """Fold buffered events into the rollup tables"""
+    events = usage.drain()
+    if not events:
+        return 0
+    rows = rollup_rows(events)
+    try:
+        if IS_POSTGRES:
+            await upsert_rollups_pg(rows)
+        else:
+            upsert_rollups_sqlite(rows)
+    except Exception as e:
+        # Put the events back so the next flush retries them
+        with usage._lock:
+            usage._events.update(events)
+        print(f"❌ Error flushing usage rollups: {e}")
+        return 0
+    return sum(events.values())
+
+async def usage_totals(column, since, period="hour", limit=10):
+    """Summed counts per topic/level/language since a time, from a rollup table"""
+    table = ROLLUPS[period]
+    if IS_POSTGRES:
+        query = sqlalchemy.select(table.c[column], sqlalchemy.func.sum(table.c.count).label("total")).where(
+            table.c.bucket_start >= since
+        ).group_by(table.c[column]).order_by(sqlalchemy.text("total DESC")).limit(limit)
+        return [(row[column], int(row["total"])) for row in await fetch_all_read(query)]
+    conn = connect_sqlite(read_only=True)
+    try:
+        return [tuple(row) for row in conn.execute(
+            f'SELECT {column}, SUM(count) AS total FROM {table.name} WHERE bucket_start >= ? '
+            f'GROUP BY {column} ORDER BY total DESC LIMIT ?',
+            (since.isoformat(), limit)
+        )]
+    finally:
+        conn.close()
+
+async def trending(window="day", limit=10):
+    """Trending topics from the window's sketch plus rollup totals for the window"""
+    window = window if window in WINDOWS else "day"
+    # Rollups are per bucket start, so include the bucket containing `since`
+    since = bucket_start(datetime.utcnow() - WINDOWS[window], window)
+    top_topics = await usage_totals("topic", since, window, limit * 3)
+    return {
+        "window": window,
+        "trending": [
+            {"topic": topic, "score": score, "min_count": guaranteed}
+            for topic, score, guaranteed in usage.sketches[window].top(limit, TRENDING_MIN_COUNT)
+        ],
+        "top_topics": [
+            {"topic": topic, "count": count}
+            for topic, count in top_topics if count >= TRENDING_MIN_COUNT
+        ][:limit],
+        "levels": dict(await usage_totals("level", since, window)),
+        "languages": dict(await usage_totals("language", since, window)),
+    }
+
+async def seed_sketch():
+    """Fill each window's trending sketch from recent hourly rollups after a restart"""
+    try:
+        for window, span in WINDOWS.items():
+            since = bucket_start(datetime.utcnow() - span, "hour")
+            for topic, count in await usage_totals("topic", since, "hour", TRENDING_CAPACITY):
+                usage.sketches[window].add(topic, count)
+    except Exception as e:
+        print(f"❌ Error seeding trending topics: {e}")
+
+async def analytics_loop():
+    """Flush rollups every ROLLUP_FLUSH_SECONDS and decay each sketch every half-life"""
+    last_decay = dict.fromkeys(WINDOWS, datetime.utcnow())
+    while True:
+        await asyncio.sleep(ROLLUP_FLUSH_SECONDS)
+        await flush_usage()
+        for window, sketch in usage.sketches.items():
+            if datetime.utcnow() - last_decay[window] >= timedelta(minutes=TRENDING_HALF_LIFE_MINUTES[window]):
+                sketch.decay()
+                last_decay[window] = datetime.utcnow()
+
+def start_analytics():
+    """Schedule the rollup flush loop on the running event loop"""
+    return asyncio.create_task(analytics_loop())
+
+async def backfill(days=30):
+    """Rebuild rollups for the last `days` days from the explanations table"""
+    from database import get_engine, explanations_table
+
+    since = bucket_start(datetime.utcnow() - timedelta(days=days), "day")
+    events = Counter()
+    with get_engine().begin() as conn:
+        for table in ROLLUPS.values():
+            conn.execute(table.delete().where(table.c.bucket_start >= since))
+        # Read timestamps as text: SQLite rows hold isoformat strings
+        query = sqlalchemy.select(
+            explanations_table.c.topic, explanations_table.c.level, explanations_table.c.language,
+            sqlalchemy.cast(explanations_table.c.timestamp, sqlalchemy.String).label("timestamp")
+        ).where(explanations_table.c.timestamp >= since)
+        for row in conn.execution_options(stream_results=True).execute(query):
+            canonical = canonicalize_topic(row.topic)[:200]
+            if canonical:
+                hour = bucket_start(datetime.fromisoformat(row.timestamp), "hour")
+                events[(hour, canonical, row.level or "Unknown", row.language or "English")] += 1
+    rows = rollup_rows(events)
+    if IS_POSTGRES:
+        await upsert_rollups_pg(rows)
+    else:
+        upsert_rollups_sqlite(rows)
+    print(f"✅ Rebuilt rollups from {sum(events.values())} explanations since {since:%Y-%m-%d}")
+
+if __name__ == "__main__":
+    from database import connect_database, disconnect_database, create_tables
+
+    parser = argparse.ArgumentParser(description="Usage rollups")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    backfill_parser = subparsers.add_parser("backfill", help="Rebuild rollups from explanations")
+    backfill_parser.add_argument("--days", type=int, default=30)
+    args = parser.parse_args()
+
+    async def main():
+        create_tables()
+        await connect_database()
+        try:
+            await backfill(args.days)
+        finally:
+            await disconnect_database()
+
+    asyncio.run(main())
@@ -1,36 +1,70 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, Request, Response, UploadFile, File
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from typing import Optional, List, Literal
 import uvicorn
-import jwt
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 import os
 import sys
-import json
-import traceback
 import asyncio
 import sqlite3
+import uuid
+import sqlalchemy
 
 # Add parent directory to Python path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from explain_engine import generate_explanation
+from explain_engine import get_genai
+from formatting import clean_response
+from rendering import render_html
+from response_cache import ResponseCache, find_cached_explanation, store_cached_explanation, load_topic_index
+from warmup import WARMUP_ON_STARTUP, start_background_warmup
+from compression import CompressionMiddleware
+from serialization import FastJSONResponse, dumps, make_etag, etag_matches
+from blob_store import COMPRESSED_COLUMNS, codecs, inflate, make_blob, store_blob_pg, store_blob_sqlite
+from auth import (
+    ACCESS_TOKEN_EXPIRE_MINUTES, AUTH_CACHE_SIZE, InvalidTokenError, create_access_token, verify_token,
+    verify_password, get_password_hash, normalize_email
+)
+from refresh_tokens import issue_refresh_token, redeem_refresh_token, start_refresh_token_purge
+from user_import import import_users
+from history_export import EXPORT_FORMATS, stream_history
+from stats import stats, refresh_stats, start_stats_refresh
+from analytics import usage, flush_usage, seed_sketch, start_analytics, trending
+from retention import get_archived_history, rehydrate_explanation, start_retention
+from deadlines import DeadlineExceeded, RequestCancelled, explain_requests, remaining, request_deadline
+from scheduler import BATCH, PRIORITIES, QueueFull, scheduler
+from translation import explain_in_language, explain_all_languages
+from catalog import LANGUAGES
 
 # Import database configuration
 from database import (
-    DATABASE_URL, IS_POSTGRES, IS_SQLITE, database, engine, metadata,
-    users_table, explanations_table, connect_database, disconnect_database,
-    create_tables, get_db
+    DATABASE_URL, IS_POSTGRES, database,
+    users_table, explanations_table, explanation_blobs_table, connect_database, disconnect_database,
+    create_tables, SQLITE_PATH, replica_router, connect_sqlite, fetch_one_read, fetch_all_read, sqlite_fetch_one_read
 )
 
-# JWT Configuration
-SECRET_KEY = "hjvhvjn,hcsvaeukfhbaukshfbahkv-0-48724"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Max explanations returned by one /api/history call
+HISTORY_LIMIT = 20
+
+# Authenticated users are kept this long, so a request with a (cached,
+# already verified) token doesn't also cost a users-table read
+USER_CACHE_SECONDS = int(os.getenv("USER_CACHE_SECONDS", "30"))
+user_cache = ResponseCache(max_entries=AUTH_CACHE_SIZE, ttl_seconds=USER_CACHE_SECONDS)
+
+# Usernames allowed to use the /admin endpoints
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+
+app = FastAPI(
+    title="XplainIT.ai Backend",
+    version="2.0.0",
+    debug=True,
+    default_response_class=FastJSONResponse
+)
 
-app = FastAPI(title="XplainIT.ai Backend", version="2.0.0", debug=True)
+# Compress large responses (explanations, history) with brotli/gzip
+app.add_middleware(CompressionMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -47,7 +81,6 @@ app.add_middleware(
 )
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 # Data Models
@@ -68,6 +101,11 @@ class UserResponse(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class ExplanationRequest(BaseModel):
     topic: str
@@ -75,6 +113,19 @@ class ExplanationRequest(BaseModel):
     tone: str = "Casual"
     extras: str = ""
     language: str = "English"
+    # Scheduling class for the model call: "deeper_dive" yields to "interactive"
+    priority: Literal["interactive", "deeper_dive", "batch"] = "interactive"
+
+class LanguagesRequest(BaseModel):
+    topic: str
+    level: str = "Beginner"
+    tone: str = "Casual"
+    extras: str = ""
+    # Defaults to every language the frontend offers
+    languages: Optional[List[str]] = None
+
+class UserStats(BaseModel):
+    total_explanations: Optional[int] = None
 
 class ExplanationResponse(BaseModel):
     id: str
@@ -82,23 +133,55 @@ class ExplanationResponse(BaseModel):
     topic: str
     timestamp: datetime
     settings: dict
+    explanation_html: Optional[str] = None
+    metadata: dict = {}
+    user: Optional[UserStats] = None
+
+class DuplicateUserError(Exception):
+    """A signup hit the unique constraint on username or email"""
+
+    def __init__(self, field: str):
+        super().__init__(f"{field} already registered")
+        self.field = field
+
+def duplicate_user_field(error: Exception):
+    """Which unique column (username/email) a constraint violation is about, if any"""
+    # SQLite: "UNIQUE constraint failed: users.email"
+    # PostgreSQL: 'duplicate key value violates unique constraint "ix_users_email"'
+    message = str(error).lower()
+    if "unique" not in message:
+        return None
+    for field in ("email", "username"):
+        if field in message:
+            return field
+    return None
 
 # Database functions for PostgreSQL
 async def get_user_by_username_pg(username: str):
     """Get user from PostgreSQL database by username"""
     try:
         query = users_table.select().where(users_table.c.username == username)
-        result = await database.fetch_one(query)
+        result = await fetch_one_read(query)
         return dict(result) if result else None
     except Exception as e:
         print(f"❌ Error getting user {username}: {e}")
         return None
 
+async def get_user_by_id_pg(user_id: str):
+    """Get user from PostgreSQL database by id"""
+    try:
+        query = users_table.select().where(users_table.c.id == user_id)
+        result = await fetch_one_read(query)
+        return dict(result) if result else None
+    except Exception as e:
+        print(f"❌ Error getting user by id {user_id}: {e}")
+        return None
+
 async def get_user_by_email_pg(email: str):
     """Get user from PostgreSQL database by email"""
     try:
         query = users_table.select().where(users_table.c.email == email)
-        result = await database.fetch_one(query)
+        result = await fetch_one_read(query)
         return dict(result) if result else None
     except Exception as e:
         print(f"❌ Error getting user by email {email}: {e}")
@@ -120,111 +203,129 @@ async def create_user_in_db_pg(user_data: dict):
         await database.execute(query)
         print(f"✅ User {user_data['username']} created successfully in PostgreSQL!")
     except Exception as e:
+        field = duplicate_user_field(e)
+        if field:
+            raise DuplicateUserError(field) from e
         print(f"❌ Error creating user in PostgreSQL: {e}")
         raise
 
 async def save_explanation_to_db_pg(explanation_data: dict):
     """Save explanation to PostgreSQL database"""
     try:
-        # Insert explanation
+        # The body is stored once per distinct content; the history row references it
+        blob = make_blob(explanation_data["explanation"], explanation_data.get("explanation_html"))
         query = explanations_table.insert().values(
             id=explanation_data["id"],
             user_id=explanation_data["user_id"],
             topic=explanation_data["topic"],
-            explanation=explanation_data["explanation"],
+            explanation="",
+            content_hash=blob["content_hash"],
             level=explanation_data["settings"]["level"],
             tone=explanation_data["settings"]["tone"],
             language=explanation_data["settings"]["language"],
             extras=explanation_data["settings"]["extras"],
             timestamp=explanation_data["timestamp"]
         )
-        await database.execute(query)
-        
-        # Update user's total explanations
+        # Update user's total explanations and read the new count back
         update_query = users_table.update().where(
             users_table.c.id == explanation_data["user_id"]
         ).values(
             total_explanations=users_table.c.total_explanations + 1
-        )
-        await database.execute(update_query)
+        ).returning(users_table.c.total_explanations)
+        
+        async with database.transaction():
+            await store_blob_pg(blob)
+            await database.execute(query)
+            total_explanations = await database.fetch_val(update_query)
         
         print(f"✅ Explanation saved for user {explanation_data['user_id']} in PostgreSQL")
+        return {"total_explanations": total_explanations}
     except Exception as e:
         print(f"❌ Error saving explanation to PostgreSQL: {e}")
         raise
 
-async def get_user_explanations_pg(user_id: str):
-    """Get user's explanations from PostgreSQL database"""
+async def get_user_explanations_pg(user_id: str, since: Optional[datetime] = None, limit: int = HISTORY_LIMIT):
+    """Get user's newest explanations from PostgreSQL database
+
+    With since, the oldest explanations newer than it, in ascending order.
+    """
     try:
-        query = explanations_table.select().where(
-            explanations_table.c.user_id == user_id
-        ).order_by(explanations_table.c.timestamp.desc()).limit(20)
+        explanations = explanations_table
+        blobs = explanation_blobs_table
+        query = sqlalchemy.select(
+            *[column for column in explanations.c if column.name not in ("explanation", "explanation_html")],
+            sqlalchemy.func.coalesce(blobs.c.explanation, explanations.c.explanation).label("explanation"),
+            sqlalchemy.func.coalesce(blobs.c.explanation_html, explanations.c.explanation_html).label("explanation_html"),
+            *[blobs.c[name] for name in COMPRESSED_COLUMNS]
+        ).select_from(
+            explanations.outerjoin(blobs, explanations.c.content_hash == blobs.c.content_hash)
+        ).where(
+            explanations.c.user_id == user_id
+        )
+        if since is not None:
+            query = query.where(explanations_table.c.timestamp > since).order_by(explanations_table.c.timestamp.asc())
+        else:
+            query = query.order_by(explanations_table.c.timestamp.desc())
+        query = query.limit(limit)
         
-        results = await database.fetch_all(query)
-        return [dict(exp) for exp in results]
+        # Users who just wrote are read from the primary (see ReplicaRouter)
+        results = await fetch_all_read(query, key=user_id)
+        return [inflate(dict(exp)) for exp in results]
     except Exception as e:
         print(f"❌ Error getting explanations for user {user_id}: {e}")
         return []
 
+async def get_explanation_pg(user_id: str, explanation_id: str):
+    """Get one of a user's explanations from PostgreSQL"""
+    explanations = explanations_table
+    blobs = explanation_blobs_table
+    query = sqlalchemy.select(
+        *[column for column in explanations.c if column.name not in ("explanation", "explanation_html")],
+        sqlalchemy.func.coalesce(blobs.c.explanation, explanations.c.explanation).label("explanation"),
+        sqlalchemy.func.coalesce(blobs.c.explanation_html, explanations.c.explanation_html).label("explanation_html"),
+        *[blobs.c[name] for name in COMPRESSED_COLUMNS]
+    ).select_from(
+        explanations.outerjoin(blobs, explanations.c.content_hash == blobs.c.content_hash)
+    ).where(
+        (explanations.c.id == explanation_id) & (explanations.c.user_id == user_id)
+    )
+    result = await fetch_one_read(query, key=user_id)
+    return inflate(dict(result)) if result else None
+
 # Database functions for SQLite (fallback)
 def get_user_by_username_sqlite(username: str):
     """Get user from SQLite database by username"""
     try:
-        conn = sqlite3.connect("xplainit.db")
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        conn.close()
-        
-        if user:
-            return dict(user)
-        return None
+        return sqlite_fetch_one_read('SELECT * FROM users WHERE username = ?', (username,))
     except Exception as e:
         print(f"❌ Error getting user {username} from SQLite: {e}")
         return None
 
+def get_user_by_id_sqlite(user_id: str):
+    """Get user from SQLite database by id"""
+    try:
+        return sqlite_fetch_one_read('SELECT * FROM users WHERE id = ?', (user_id,))
+    except Exception as e:
+        print(f"❌ Error getting user by id {user_id} from SQLite: {e}")
+        return None
+
 def get_user_by_email_sqlite(email: str):
     """Get user from SQLite database by email"""
     try:
-        conn = sqlite3.connect("xplainit.db")
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM users WHERE email = ?', (email,))
-        user = cursor.fetchone()
-        conn.close()
-        
-        if user:
-            return dict(user)
-        return None
+        return sqlite_fetch_one_read('SELECT * FROM users WHERE email = ?', (email,))
     except Exception as e:
         print(f"❌ Error getting user by email {email} from SQLite: {e}")
         return None
 
 def create_user_in_db_sqlite(user_data: dict):
     """Create user in SQLite database"""
+    conn = connect_sqlite()
     try:
-        conn = sqlite3.connect("xplainit.db")
         cursor = conn.cursor()
         
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id TEXT PRIMARY KEY,
-                username TEXT UNIQUE NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                hashed_password TEXT NOT NULL,
-                full_name TEXT,
-                total_explanations INTEGER DEFAULT 0,
-                created_at TEXT NOT NULL,
-                is_active BOOLEAN DEFAULT 1
-            )
-        ''')
-        
-        cursor.execute('''
-            INSERT INTO users (id, username, email, hashed_password, full_name, created_at)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO users (id, username, email, hashed_password, full_name, created_at, total_explanations, is_active)
+            VALUES (?, ?, ?, ?, ?, ?, 0, 1)
         ''', (
             user_data["id"],
             user_data["username"], 
@@ -235,12 +336,115 @@ def create_user_in_db_sqlite(user_data: dict):
         ))
         
         conn.commit()
-        conn.close()
         print(f"✅ User {user_data['username']} created successfully in SQLite!")
         
+    except sqlite3.IntegrityError as e:
+        field = duplicate_user_field(e)
+        if field:
+            raise DuplicateUserError(field) from e
+        print(f"❌ Error creating user in SQLite: {e}")
+        raise
     except Exception as e:
         print(f"❌ Error creating user in SQLite: {e}")
         raise
+    finally:
+        # Always close, or a failed insert keeps the write lock
+        conn.close()
+
+def save_explanation_to_db_sqlite(explanation_data: dict):
+    """Save explanation to SQLite database"""
+    try:
+        conn = connect_sqlite()
+        cursor = conn.cursor()
+        
+        # The body is stored once per distinct content; the history row references it
+        blob = make_blob(explanation_data["explanation"], explanation_data.get("explanation_html"))
+        store_blob_sqlite(cursor, blob)
+        cursor.execute('''
+            INSERT INTO explanations (id, user_id, topic, explanation, content_hash, level, tone, language, extras, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            explanation_data["id"],
+            explanation_data["user_id"],
+            explanation_data["topic"],
+            "",
+            blob["content_hash"],
+            explanation_data["settings"]["level"],
+            explanation_data["settings"]["tone"],
+            explanation_data["settings"]["language"],
+            explanation_data["settings"]["extras"],
+            explanation_data["timestamp"].isoformat()
+        ))
+        cursor.execute(
+            'UPDATE users SET total_explanations = COALESCE(total_explanations, 0) + 1 WHERE id = ?',
+            (explanation_data["user_id"],)
+        )
+        cursor.execute('SELECT total_explanations FROM users WHERE id = ?', (explanation_data["user_id"],))
+        row = cursor.fetchone()
+        
+        conn.commit()
+        conn.close()
+        print(f"✅ Explanation saved for user {explanation_data['user_id']} in SQLite")
+        return {"total_explanations": row[0] if row else None}
+        
+    except Exception as e:
+        print(f"❌ Error saving explanation to SQLite: {e}")
+        raise
+
+def get_user_explanations_sqlite(user_id: str, since: Optional[datetime] = None, limit: int = HISTORY_LIMIT):
+    """Get user's newest explanations from SQLite database
+
+    With since, the oldest explanations newer than it, in ascending order.
+    The second table (explanations_cold, or the hot table when paging
+    forward) is only read when the first has fewer than limit matching rows.
+    """
+    try:
+        conn = connect_sqlite(read_only=True, key=user_id)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        query = '''
+            SELECT e.id, e.user_id, e.topic, e.level, e.tone, e.language, e.extras, e.timestamp, e.content_hash,
+                   COALESCE(b.explanation, e.explanation) AS explanation,
+                   COALESCE(b.explanation_html, e.explanation_html) AS explanation_html,
+                   b.codec, b.explanation_compressed, b.explanation_html_compressed
+            FROM {table} e
+            LEFT JOIN explanation_blobs b ON b.content_hash = e.content_hash
+            WHERE e.user_id = ? AND e.timestamp > ?
+            ORDER BY e.timestamp {order} LIMIT ?
+        '''
+        # Cold rows are older than hot ones, so paging forward reads them first
+        tables = ("explanations", "explanations_cold") if since is None else ("explanations_cold", "explanations")
+        results = []
+        for table in tables:
+            cursor.execute(
+                query.format(table=table, order="DESC" if since is None else "ASC"),
+                (user_id, since.isoformat() if since is not None else "", limit - len(results))
+            )
+            results += [inflate(dict(exp)) for exp in cursor.fetchall()]
+            if len(results) >= limit:
+                break
+        conn.close()
+        return results
+    except Exception as e:
+        print(f"❌ Error getting explanations for user {user_id} from SQLite: {e}")
+        return []
+
+def get_explanation_sqlite(user_id: str, explanation_id: str):
+    """Get one of a user's explanations from SQLite (hot or cold table)"""
+    for table in ("explanations", "explanations_cold"):
+        row = sqlite_fetch_one_read(f'''
+            SELECT e.id, e.user_id, e.topic, e.level, e.tone, e.language, e.extras, e.timestamp, e.content_hash,
+                   COALESCE(b.explanation, e.explanation) AS explanation,
+                   COALESCE(b.explanation_html, e.explanation_html) AS explanation_html,
+                   b.codec, b.explanation_compressed, b.explanation_html_compressed
+            FROM {table} e
+            LEFT JOIN explanation_blobs b ON b.content_hash = e.content_hash
+            WHERE e.id = ? AND e.user_id = ?
+        ''', (explanation_id, user_id), key=user_id)
+        if row:
+            return inflate(row)
+    return None
 
 # Wrapper functions to handle both databases
 async def get_user_by_username(username: str):
@@ -250,8 +454,16 @@ async def get_user_by_username(username: str):
     else:
         return get_user_by_username_sqlite(username)
 
+async def get_user_by_id(user_id: str):
+    """Get user by id - handles both PostgreSQL and SQLite"""
+    if IS_POSTGRES:
+        return await get_user_by_id_pg(user_id)
+    else:
+        return get_user_by_id_sqlite(user_id)
+
 async def get_user_by_email(email: str):
     """Get user by email - handles both PostgreSQL and SQLite"""
+    email = normalize_email(email)
     if IS_POSTGRES:
         return await get_user_by_email_pg(email)
     else:
@@ -266,19 +478,45 @@ async def create_user_in_db(user_data: dict):
 
 async def save_explanation_to_db(explanation_data: dict):
     """Save explanation to database - handles both PostgreSQL and SQLite"""
+    # This user's next history read must not hit a replica that hasn't caught up
+    replica_router.note_write(explanation_data["user_id"])
     if IS_POSTGRES:
-        await save_explanation_to_db_pg(explanation_data)
+        return await save_explanation_to_db_pg(explanation_data)
     else:
-        # SQLite implementation (similar to your existing code)
-        pass
+        return save_explanation_to_db_sqlite(explanation_data)
+
+async def get_user_explanations(user_id: str, since: Optional[datetime] = None):
+    """Get user explanations - handles both PostgreSQL and SQLite
+
+    Archived explanations fill the page (without bodies) when the database
+    has fewer than HISTORY_LIMIT. With since, the page holds the oldest
+    explanations newer than it, ascending, so clients can page forward.
+    """
+    if since is not None:
+        # Archived rows are the oldest, so they come first when paging forward
+        explanations = await get_archived_history(user_id, since, HISTORY_LIMIT, oldest_first=True)
+        if len(explanations) < HISTORY_LIMIT:
+            limit = HISTORY_LIMIT - len(explanations)
+            if IS_POSTGRES:
+                explanations += await get_user_explanations_pg(user_id, since, limit)
+            else:
+                explanations += get_user_explanations_sqlite(user_id, since, limit)
+        return explanations
+    if IS_POSTGRES:
+        explanations = await get_user_explanations_pg(user_id, since)
+    else:
+        explanations = get_user_explanations_sqlite(user_id, since)
+    if len(explanations) < HISTORY_LIMIT:
+        explanations += await get_archived_history(user_id, since, HISTORY_LIMIT - len(explanations))
+    return explanations
 
-async def get_user_explanations(user_id: str):
-    """Get user explanations - handles both PostgreSQL and SQLite"""
+async def get_explanation(user_id: str, explanation_id: str):
+    """Get one explanation, rehydrating it from the archive if needed"""
     if IS_POSTGRES:
-        return await get_user_explanations_pg(user_id)
+        explanation = await get_explanation_pg(user_id, explanation_id)
     else:
-        # SQLite implementation
-        return []
+        explanation = get_explanation_sqlite(user_id, explanation_id)
+    return explanation or await rehydrate_explanation(user_id, explanation_id)
 
 # Startup and shutdown events
 @app.on_event("startup")
@@ -292,37 +530,63 @@ async def startup():
     # Create tables
     create_tables()
     
+    # Dictionaries for compressed explanation bodies
+    codecs.load()
+    
+    # Index cached topics for near-duplicate lookups
+    await load_topic_index()
+    
+    # Aggregate counters for /debug/db-info and /admin/stats
+    await refresh_stats()
+    start_stats_refresh()
+    
+    # Usage rollups and trending topics
+    await seed_sketch()
+    start_analytics()
+    
+    # Partition upkeep, hot/cold split and archival
+    start_retention()
+    
+    # Refresh tokens that expired without being redeemed
+    start_refresh_token_purge()
+    
+    # Load the Gemini SDK in the background; /test and auth don't need it
+    asyncio.get_running_loop().run_in_executor(None, get_genai)
+    
+    # Precompute catalog explanations in the background
+    if WARMUP_ON_STARTUP:
+        start_background_warmup()
+    
     print("✅ Application startup completed!")
 
 @app.on_event("shutdown")
 async def shutdown():
     """Close database connection"""
+    await flush_usage()
     if IS_POSTGRES:
         await disconnect_database()
     print("🔌 Application shutdown completed!")
 
 # Authentication functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    return pwd_context.hash(password)
-
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-
 async def authenticate_user(username: str, password: str):
     user = await get_user_by_username(username)
     if not user or not verify_password(password, user["hashed_password"]):
         return False
     return user
 
+async def issue_tokens(user: dict):
+    """Access token plus a rotated refresh token for a user"""
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user["username"]}, expires_delta=access_token_expires
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": await issue_refresh_token(user["id"]),
+        "expires_in": int(access_token_expires.total_seconds())
+    }
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -330,18 +594,23 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except jwt.JWTError:
+        username: str = verify_token(token)["sub"]
+    except InvalidTokenError:
         raise credentials_exception
     
-    user = await get_user_by_username(username)
+    user = user_cache.get(username)
     if user is None:
-        raise credentials_exception
+        user = await get_user_by_username(username)
+        if user is None:
+            raise credentials_exception
+        user_cache.set(username, user)
     return user
 
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    if current_user["username"] not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
 # API Endpoints
 @app.get("/")
 async def root():
@@ -357,29 +626,21 @@ async def root():
 
 @app.post("/auth/signup", response_model=UserResponse)
 async def signup(user: UserCreate):
-    """Register a new user"""
-    print(f"🔍 Signup attempt for username: {user.username}, email: {user.email}")
+    """Register a new user
     
-    # Check if username exists
-    existing_user = await get_user_by_username(user.username)
-    if existing_user:
-        print(f"❌ Username {user.username} already exists")
-        raise HTTPException(status_code=400, detail="Username already registered")
-    
-    # Check if email exists
-    existing_email = await get_user_by_email(user.email)
-    if existing_email:
-        print(f"❌ Email {user.email} already exists")
-        raise HTTPException(status_code=400, detail="Email already registered")
+    A single insert: the unique constraints on username and email reject
+    duplicates atomically, so concurrent signups can't both succeed.
+    """
+    print(f"🔍 Signup attempt for username: {user.username}, email: {user.email}")
     
-    # Create new user
-    user_id = f"user_{int(datetime.utcnow().timestamp())}"
-    hashed_password = get_password_hash(user.password)
+    # Create new user (bcrypt runs off the event loop)
+    user_id = f"user_{uuid.uuid4().hex}"
+    hashed_password = await asyncio.to_thread(get_password_hash, user.password)
     
     new_user = {
         "id": user_id,
         "username": user.username,
-        "email": user.email,
+        "email": normalize_email(user.email),
         "full_name": user.full_name,
         "hashed_password": hashed_password,
         "total_explanations": 0,
@@ -390,7 +651,11 @@ async def signup(user: UserCreate):
     try:
         await create_user_in_db(new_user)
         print(f"✅ User {user.username} created successfully")
+        stats.record_users()
         return UserResponse(**new_user)
+    except DuplicateUserError as e:
+        print(f"❌ {e.field.capitalize()} for {user.username} already exists")
+        raise HTTPException(status_code=400, detail=f"{e.field.capitalize()} already registered")
     except Exception as e:
         print(f"❌ Error creating user: {e}")
         raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
@@ -410,15 +675,36 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
         )
     
     print(f"✅ Login successful for username: {form_data.username}")
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user["username"]}, expires_delta=access_token_expires
+    return await issue_tokens(user)
+
+@app.post("/auth/refresh", response_model=Token)
+async def refresh(request: RefreshRequest):
+    """Exchange a refresh token for new tokens (no password check)"""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid or expired refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    user_id = await redeem_refresh_token(request.refresh_token)
+    if user_id is None:
+        raise credentials_exception
+    user = await get_user_by_id(user_id)
+    if user is None or user.get("is_active") is False:
+        raise credentials_exception
+    return await issue_tokens(user)
+
+@app.post("/auth/logout")
+async def logout(request: RefreshRequest):
+    """Revoke a refresh token"""
+    await redeem_refresh_token(request.refresh_token)
+    return {"message": "Logged out"}
 
 @app.get("/auth/me", response_model=UserResponse)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     """Get current user information"""
+    # The counters must be current, so this one reads past the user cache
+    current_user = await get_user_by_username(current_user["username"]) or current_user
+    user_cache.set(current_user["username"], current_user)
     return UserResponse(
         id=current_user["id"],
         username=current_user["username"],
@@ -428,25 +714,76 @@ async def get_current_user_info(current_user: dict = Depends(get_current_user)):
         created_at=datetime.fromisoformat(current_user["created_at"]) if isinstance(current_user["created_at"], str) else current_user["created_at"]
     )
 
+def stopped_work_error(e: Exception) -> HTTPException:
+    """The HTTP error for model work that was turned away, timed out or cancelled"""
+    if isinstance(e, QueueFull):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    if isinstance(e, DeadlineExceeded):
+        return HTTPException(status_code=504, detail="Explanation not ready before the request deadline")
+    # 499: nginx's "client closed request"; nobody reads a superseded answer either
+    status_code = 409 if e.reason == "superseded" else 499
+    return HTTPException(status_code=status_code, detail=f"Explanation cancelled: {e.reason}")
+
 @app.post("/api/explain", response_model=ExplanationResponse)
-async def explain_topic(request: ExplanationRequest, current_user: dict = Depends(get_current_user)):
-    """Generate AI explanation for authenticated user"""
+async def explain_topic(
+    request: ExplanationRequest,
+    http_request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Generate AI explanation for authenticated user
+    
+    The client's X-Request-Timeout / X-Request-Deadline header bounds the
+    model call. A newer request from the same user, or the client going
+    away, cancels it so abandoned work stops using model quota.
+    """
+    deadline = request_deadline(http_request.headers)
+    if remaining(deadline) <= 0:
+        raise HTTPException(status_code=504, detail="Request deadline already passed")
+    # Whatever this user was waiting on before is abandoned now
+    explain_requests.cancel(current_user["id"])
     try:
-        # Generate explanation
-        explanation = generate_explanation(
-            request.topic, 
-            request.level, 
-            request.tone, 
-            request.extras, 
-            request.language
+        # Serve from cache when this topic (or a near-duplicate of it) was
+        # already generated with the same settings
+        cached = await find_cached_explanation(
+            request.topic, request.level, request.tone, request.extras, request.language
         )
+        if cached is not None:
+            explanation = cached["explanation"]
+            response_metadata = {
+                "cache": "hit" if cached["exact"] else "similar",
+                "similarity": cached["similarity"]
+            }
+        else:
+            # Translate a cached version in another language, or generate
+            explanation, response_metadata = await explain_requests.run(
+                current_user["id"],
+                explain_in_language(
+                    request.topic, 
+                    request.level, 
+                    request.tone, 
+                    request.extras, 
+                    request.language,
+                    deadline,
+                    PRIORITIES[request.priority],
+                    current_user["id"]
+                ),
+                request=http_request,
+                deadline=deadline
+            )
+            # Format once here; the cleaned markdown is what gets cached and stored
+            explanation = clean_response(explanation)
+            await store_cached_explanation(
+                request.topic, request.level, request.tone, request.extras, request.language, explanation
+            )
         
         # Create explanation record
-        explanation_id = f"exp_{int(datetime.utcnow().timestamp())}"
+        explanation_id = f"exp_{int(datetime.utcnow().timestamp())}_{uuid.uuid4().hex[:8]}"
         explanation_data = {
             "id": explanation_id,
             "user_id": current_user["id"],
             "explanation": explanation,
+            # Rendered once here; clients inject the stored HTML as-is
+            "explanation_html": render_html(explanation),
             "topic": request.topic,
             "timestamp": datetime.utcnow(),
             "settings": {
@@ -457,47 +794,162 @@ async def explain_topic(request: ExplanationRequest, current_user: dict = Depend
             }
         }
         
-        # Save to database
-        await save_explanation_to_db(explanation_data)
+        # Save to database - returns the user's updated counters so the
+        # client doesn't need a follow-up /auth/me request
+        user_stats = await save_explanation_to_db(explanation_data)
+        stats.record_explanation(request.language, request.level)
+        usage.record(request.topic, request.level, request.language)
         
-        return ExplanationResponse(**explanation_data)
+        return ExplanationResponse(**explanation_data, metadata=response_metadata, user=user_stats)
         
+    except (QueueFull, DeadlineExceeded, RequestCancelled) as e:
+        raise stopped_work_error(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating explanation: {str(e)}")
 
-@app.get("/api/history")
-async def get_user_history(current_user: dict = Depends(get_current_user)):
-    """Get explanation history for current user"""
-    explanations = await get_user_explanations(current_user["id"])
+@app.post("/api/explain/languages")
+async def explain_languages(
+    request: LanguagesRequest,
+    http_request: Request,
+    current_user: dict = Depends(get_current_user)
+):
+    """Pre-generate a topic in every language (or the listed ones) in one request
+    
+    One language is generated (unless one is cached already) and the rest
+    are translated from it concurrently at batch priority. Results go to
+    the cache, not to the user's history.
+    """
+    languages = request.languages or LANGUAGES
+    unknown = [language for language in languages if language not in LANGUAGES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported languages: {', '.join(unknown)}")
+    deadline = request_deadline(http_request.headers)
+    try:
+        results = await explain_requests.run(
+            (current_user["id"], "languages"),
+            explain_all_languages(
+                request.topic, request.level, request.tone, request.extras, languages,
+                deadline, BATCH, current_user["id"]
+            ),
+            request=http_request,
+            deadline=deadline
+        )
+    except (QueueFull, DeadlineExceeded, RequestCancelled) as e:
+        raise stopped_work_error(e)
     return {
+        "topic": request.topic,
+        "explanations": {
+            language: {**result, "explanation_html": render_html(result["explanation"])}
+            for language, result in results.items()
+        },
+        "failed": [language for language in languages if language not in results]
+    }
+
+@app.get("/api/history")
+async def get_user_history(
+    request: Request,
+    since: Optional[datetime] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get explanation history for current user
+    
+    With ?since=<timestamp of the newest explanation the client has>, only
+    newer explanations are returned, oldest first, so clients can sync
+    incrementally. has_more means the page is full: ask again with the
+    last returned timestamp as since.
+    """
+    explanations = await get_user_explanations(current_user["id"], since)
+    body = dumps({
         "user_id": current_user["id"],
         "username": current_user["username"],
         "explanations": explanations,
-        "total_count": len(explanations)
-    }
+        "total_count": len(explanations),
+        "since": since,
+        "incremental": since is not None,
+        "has_more": since is not None and len(explanations) >= HISTORY_LIMIT
+    })
+    
+    # Unchanged history costs a 304 instead of the full body
+    etag = make_etag(body)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/api/history/export")
+async def export_user_history(format: str = "ndjson", current_user: dict = Depends(get_current_user)):
+    """Stream the current user's entire history as NDJSON or CSV"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    filename = f"xplainit-history-{current_user['username']}.{format}"
+    return StreamingResponse(
+        stream_history(current_user["id"], format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/history/{explanation_id}")
+async def get_history_item(explanation_id: str, current_user: dict = Depends(get_current_user)):
+    """One explanation with its body; archived ones are read back from their archive file"""
+    explanation = await get_explanation(current_user["id"], explanation_id)
+    if not explanation:
+        raise HTTPException(status_code=404, detail="Explanation not found")
+    return explanation
+
+@app.post("/admin/users/import")
+async def import_users_endpoint(file: UploadFile = File(...), admin_user: dict = Depends(get_admin_user)):
+    """Create accounts in bulk from a CSV or NDJSON upload"""
+    try:
+        text = (await file.read()).decode("utf-8-sig")
+        report = await import_users(text)
+    except (UnicodeDecodeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    print(f"✅ Bulk import by {admin_user['username']}: {report['created']} created, {report['skipped_count']} skipped")
+    stats.record_users(report["created"])
+    return report
+
+@app.get("/api/trending")
+async def trending_topics(window: str = "day", limit: int = 10, current_user: dict = Depends(get_current_user)):
+    """Trending topics and level/language mix, from the sketch and usage rollups"""
+    if window not in ("hour", "day"):
+        raise HTTPException(status_code=400, detail="window must be 'hour' or 'day'")
+    return await trending(window, max(1, min(limit, 50)))
+
+@app.get("/admin/stats")
+async def admin_stats(admin_user: dict = Depends(get_admin_user)):
+    """User and explanation totals with per-language/level breakdowns, from memory"""
+    return {**stats.snapshot(), "cancelled_explanations": explain_requests.counters}
+
+@app.get("/admin/scheduler")
+async def admin_scheduler(admin_user: dict = Depends(get_admin_user)):
+    """Model-call queue depth, running calls and queue-wait percentiles per priority class"""
+    return scheduler.snapshot()
 
 @app.get("/debug/db-info")
 async def debug_database_info():
-    """Debug endpoint to check database status"""
+    """Debug endpoint to check database status (counts and replica lag are served from memory)"""
     try:
+        snapshot = stats.snapshot()
         if IS_POSTGRES:
             # PostgreSQL info
-            query = "SELECT COUNT(*) FROM users"
-            user_count = await database.fetch_val(query)
-            
             return {
                 "database_type": "PostgreSQL",
                 "database_url": DATABASE_URL.split('@')[0] + '@***' if '@' in DATABASE_URL else DATABASE_URL,
                 "connection_status": "connected",
-                "total_users": user_count,
+                "total_users": snapshot["total_users"],
+                "counts_source": snapshot["source"],
+                "replicas": replica_router.status(),
                 "environment": "production" if os.getenv("RENDER") else "local"
             }
         else:
             # SQLite info
             return {
                 "database_type": "SQLite",
-                "database_path": "xplainit.db",
+                "database_path": SQLITE_PATH,
                 "connection_status": "connected",
+                "total_users": snapshot["total_users"],
+                "counts_source": snapshot["source"],
+                "replicas": replica_router.status(),
                 "environment": "local"
             }
     except Exception as e:
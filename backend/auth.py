@@ -0,0 +1,179 @@
+# auth.py - Password hashing, JWT signing and verification with rotating keys
+# Tokens carry a `kid` header naming the key that signed them. Keys come
+# from the environment or a JSON file; the first/active key signs new
+# tokens and every listed key still verifies, so keys can be rotated
+# without logging everyone out. Verified tokens are cached until they
+# expire, so repeat requests skip the signature check.
+#
+#   JWT_SIGNING_KEYS="2024-06:secret-b,2024-01:secret-a"   # active key first
+#   JWT_KEYS_FILE=/etc/xplainit/jwt_keys.json  # {"active": "2024-06", "keys": {"2024-06": "...", ...}}
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import jwt
+from passlib.context import CryptContext
+
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Verified tokens remembered per process
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+# How often the keys file is checked for changes
+KEYS_FILE_CHECK_SECONDS = int(os.getenv("JWT_KEYS_FILE_CHECK_SECONDS", "30"))
+# Anything longer is not one of our tokens
+MAX_TOKEN_LENGTH = 4096
+
+# Local development fallback when no keys are configured
+DEVELOPMENT_SECRET_KEY = "hjvhvjn,hcsvaeukfhbaukshfbahkv-0-48724"
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+def verify_password(plain_password, hashed_password):
+    return pwd_context.verify(plain_password, hashed_password)
+
+def get_password_hash(password):
+    return pwd_context.hash(password)
+
+def normalize_email(email):
+    """The stored form of an email address (signup and bulk import both use it)"""
+    return email.strip().lower()
+
+class InvalidTokenError(Exception):
+    """The token is malformed, expired, or not signed by a known key"""
+
+def _parse_key_list(value):
+    """'kid:secret,kid:secret' -> (active kid, {kid: secret})"""
+    keys = {}
+    for item in value.split(","):
+        kid, _, secret = item.strip().partition(":")
+        if kid and secret:
+            keys[kid] = secret
+    return next(iter(keys), None), keys
+
+class KeyRing:
+    """Signing keys by kid, reloaded when the keys file changes"""
+
+    def __init__(self):
+        self.active_kid = None
+        self.keys = {}
+        self._file_mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        active_kid, keys = None, {}
+        keys_file = os.getenv("JWT_KEYS_FILE")
+        if keys_file and os.path.exists(keys_file):
+            with open(keys_file) as f:
+                config = json.load(f)
+            keys = dict(config.get("keys", {}))
+            active_kid = config.get("active") or next(iter(keys), None)
+            self._file_mtime = os.path.getmtime(keys_file)
+        elif os.getenv("JWT_SIGNING_KEYS"):
+            active_kid, keys = _parse_key_list(os.getenv("JWT_SIGNING_KEYS"))
+        elif os.getenv("JWT_SECRET_KEY"):
+            active_kid, keys = "default", {"default": os.getenv("JWT_SECRET_KEY")}
+        else:
+            print("⚠️ No JWT keys configured, using the development secret")
+            active_kid, keys = "default", {"default": DEVELOPMENT_SECRET_KEY}
+
+        if active_kid not in keys:
+            raise RuntimeError(f"Active JWT key {active_kid!r} is not among the configured keys")
+        self.active_kid, self.keys = active_kid, keys
+
+    def maybe_reload(self):
+        """Pick up a rotated keys file (checked at most every KEYS_FILE_CHECK_SECONDS)"""
+        keys_file = os.getenv("JWT_KEYS_FILE")
+        now = time.monotonic()
+        if not keys_file or now - self._checked_at < KEYS_FILE_CHECK_SECONDS:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                if os.path.getmtime(keys_file) != self._file_mtime:
+                    self.load()
+                    # Tokens signed with a removed key must not stay valid
+                    token_cache.clear()
+                    print(f"🔑 Reloaded JWT keys (active: {self.active_kid})")
+            except (OSError, ValueError, RuntimeError) as e:
+                print(f"❌ Error reloading JWT keys: {e}")
+
+class TokenCache:
+    """Thread-safe LRU of verified token claims, keyed by token hash"""
+
+    def __init__(self, max_entries=AUTH_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(token):
+        return hashlib.blake2b(token.encode("utf-8"), digest_size=16).digest()
+
+    def get(self, token):
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["exp"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry["claims"]
+
+    def set(self, token, claims):
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = {"claims": claims, "exp": claims["exp"]}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+key_ring = KeyRing()
+token_cache = TokenCache()
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    """Sign a token with the active key"""
+    to_encode = data.copy()
+    expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
+    to_encode.update({"exp": expire})
+    return jwt.encode(
+        to_encode, key_ring.keys[key_ring.active_kid],
+        algorithm=ALGORITHM, headers={"kid": key_ring.active_kid}
+    )
+
+def verify_token(token: str) -> dict:
+    """Claims of a valid token; raises InvalidTokenError otherwise"""
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+
+    # Cheap rejects before any crypto
+    if not token or len(token) > MAX_TOKEN_LENGTH or token.count(".") != 2:
+        raise InvalidTokenError("Malformed token")
+    key_ring.maybe_reload()
+    try:
+        kid = jwt.get_unverified_header(token).get("kid") or key_ring.active_kid
+        secret = key_ring.keys.get(kid)
+        if secret is None:
+            raise InvalidTokenError("Unknown signing key")
+        claims = jwt.decode(token, secret, algorithms=[ALGORITHM], options={"require": ["exp", "sub"]})
+    except jwt.PyJWTError as e:
+        raise InvalidTokenError(str(e)) from e
+
+    token_cache.set(token, claims)
+    return claims
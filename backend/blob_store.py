@@ -0,0 +1,364 @@
+# blob_store.py - Content-addressed storage for explanation bodies
+# Cached explanations are served byte-identical to many users, so history
+# rows store only a content hash and the text lives once in explanation_blobs.
+# Bodies are zstd-compressed on write (with the newest dictionary trained on
+# stored explanations, if any) and decompressed in Python when rows are
+# read; BLOB_COMPRESSION=off stores new bodies as plain text. Compressed
+# rows stay readable either way.
+#
+#   python blob_store.py migrate [--batch-size N]     # move existing history bodies into blobs
+#   python blob_store.py train [--samples N]          # train a new compression dictionary
+#   python blob_store.py compress [--batch-size N]    # compress stored plain-text bodies
+#   python blob_store.py decompress [--batch-size N]  # turn compressed bodies back into text
+#   python blob_store.py report                       # storage saved by deduplication and compression
+import os
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+
+import sqlalchemy
+
+from database import (
+    database, explanation_blobs_table, explanations_table, compression_dictionaries_table, get_engine
+)
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+BLOB_COMPRESSION = os.getenv("BLOB_COMPRESSION", "zstd" if HAS_ZSTD else "off")
+BLOB_ZSTD_LEVEL = int(os.getenv("BLOB_ZSTD_LEVEL", "3"))
+# Bodies smaller than this are stored as text
+BLOB_COMPRESSION_MIN_SIZE = int(os.getenv("BLOB_COMPRESSION_MIN_SIZE", "256"))
+DICTIONARY_SIZE = int(os.getenv("BLOB_DICTIONARY_SIZE", str(64 * 1024)))
+# Columns a query must select (from explanation_blobs) for inflate()
+COMPRESSED_COLUMNS = ("codec", "explanation_compressed", "explanation_html_compressed")
+BODY_COLUMNS = ("explanation", "explanation_html") + COMPRESSED_COLUMNS
+
+def content_hash(explanation, explanation_html=None):
+    """Hex SHA-256 of an explanation body: the markdown and its rendered HTML
+
+    Both are stored in the blob, so a renderer or sanitizer change gives
+    the same markdown a new blob instead of reusing stale HTML.
+    """
+    digest = hashlib.sha256(explanation.encode("utf-8"))
+    if explanation_html is not None:
+        digest.update(b"\0")
+        digest.update(explanation_html.encode("utf-8"))
+    return digest.hexdigest()
+
+# Compression
+class Codecs:
+    """zstd dictionaries by id, with per-thread compressors and decompressors
+
+    zstandard contexts can't be shared between threads, so each thread
+    builds its own on first use.
+    """
+
+    def __init__(self):
+        self.dictionaries = {}
+        self.active = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read every dictionary from the database; the newest one compresses new bodies"""
+        if not HAS_ZSTD:
+            return
+        with get_engine().connect() as conn:
+            rows = conn.execute(
+                sqlalchemy.select(compression_dictionaries_table.c.id, compression_dictionaries_table.c.data)
+                .order_by(compression_dictionaries_table.c.id)
+            ).fetchall()
+        with self._lock:
+            self.dictionaries = {row.id: zstandard.ZstdCompressionDict(bytes(row.data)) for row in rows}
+            self.active = rows[-1].id if rows else None
+            self._local = threading.local()
+
+    def _contexts(self):
+        if not hasattr(self._local, "compressors"):
+            self._local.compressors, self._local.decompressors = {}, {}
+        return self._local.compressors, self._local.decompressors
+
+    def codec(self):
+        """Codec name for new bodies"""
+        return "zstd" if self.active is None else f"zstd:{self.active}"
+
+    def compress(self, data: bytes, codec: str):
+        compressors, _ = self._contexts()
+        if codec not in compressors:
+            dictionary = self._dictionary(codec)
+            compressors[codec] = zstandard.ZstdCompressor(level=BLOB_ZSTD_LEVEL, dict_data=dictionary)
+        return compressors[codec].compress(data)
+
+    def decompress(self, data: bytes, codec: str):
+        if not HAS_ZSTD:
+            raise RuntimeError("The zstandard package is needed to read compressed explanations")
+        _, decompressors = self._contexts()
+        if codec not in decompressors:
+            decompressors[codec] = zstandard.ZstdDecompressor(dict_data=self._dictionary(codec))
+        return decompressors[codec].decompress(bytes(data))
+
+    def _dictionary(self, codec):
+        if codec == "zstd":
+            return None
+        dictionary_id = int(codec.split(":", 1)[1])
+        if dictionary_id not in self.dictionaries:
+            # Trained by another process since this one loaded
+            self.load()
+        return self.dictionaries[dictionary_id]
+
+codecs = Codecs()
+
+def compression_enabled():
+    return BLOB_COMPRESSION == "zstd" and HAS_ZSTD
+
+def make_blob(explanation, explanation_html=None):
+    """Blob row for an explanation body, compressed unless disabled or tiny"""
+    size = len(explanation.encode("utf-8")) + len((explanation_html or "").encode("utf-8"))
+    blob = {
+        "content_hash": content_hash(explanation, explanation_html),
+        "explanation": explanation,
+        "explanation_html": explanation_html,
+        "size": size,
+        "created_at": datetime.utcnow(),
+        "codec": None,
+        "explanation_compressed": None,
+        "explanation_html_compressed": None
+    }
+    if compression_enabled() and size >= BLOB_COMPRESSION_MIN_SIZE:
+        compress_blob(blob)
+    return blob
+
+def compress_blob(blob):
+    """Move a blob's text into its compressed columns"""
+    codec = codecs.codec()
+    blob["codec"] = codec
+    blob["explanation_compressed"] = codecs.compress(blob["explanation"].encode("utf-8"), codec)
+    if blob["explanation_html"] is not None:
+        blob["explanation_html_compressed"] = codecs.compress(blob["explanation_html"].encode("utf-8"), codec)
+    blob["explanation"], blob["explanation_html"] = "", None
+    return blob
+
+def inflate(row):
+    """Fill in explanation/explanation_html of a row selected with COMPRESSED_COLUMNS
+
+    The compressed columns are removed from the row.
+    """
+    codec = row.pop("codec", None)
+    compressed = row.pop("explanation_compressed", None)
+    compressed_html = row.pop("explanation_html_compressed", None)
+    if codec:
+        row["explanation"] = codecs.decompress(compressed, codec).decode("utf-8")
+        row["explanation_html"] = codecs.decompress(compressed_html, codec).decode("utf-8") if compressed_html is not None else None
+    return row
+
+async def store_blob_pg(blob: dict):
+    """Insert a blob unless the same content is already stored"""
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    query = pg_insert(explanation_blobs_table).values(**blob).on_conflict_do_nothing(
+        index_elements=[explanation_blobs_table.c.content_hash]
+    )
+    await database.execute(query)
+
+def store_blob_sqlite(cursor, blob: dict):
+    """Insert a blob on an open SQLite cursor unless it's already stored"""
+    cursor.execute('''
+        INSERT OR IGNORE INTO explanation_blobs (content_hash, explanation, explanation_html, size, created_at,
+                                                 codec, explanation_compressed, explanation_html_compressed)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (
+        blob["content_hash"], blob["explanation"], blob["explanation_html"],
+        blob["size"], blob["created_at"].isoformat(),
+        blob["codec"], blob["explanation_compressed"], blob["explanation_html_compressed"]
+    ))
+
+def migrate_explanations(batch_size=1000):
+    """Move inline history bodies into explanation_blobs
+
+    Rows are processed in batches; each migrated row keeps an empty
+    explanation and points at its blob. Safe to run repeatedly.
+    """
+    engine = get_engine()
+    explanations = explanations_table
+    migrated = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                sqlalchemy.select(explanations.c.id, explanations.c.explanation, explanations.c.explanation_html)
+                .where(explanations.c.content_hash.is_(None))
+                .limit(batch_size)
+            ).fetchall()
+            if not rows:
+                break
+
+            blobs = {}
+            updates = []
+            for row in rows:
+                blob = make_blob(row.explanation or "", row.explanation_html)
+                blobs.setdefault(blob["content_hash"], blob)
+                updates.append({"row_id": row.id, "hash": blob["content_hash"]})
+
+            existing = set(conn.execute(
+                sqlalchemy.select(explanation_blobs_table.c.content_hash)
+                .where(explanation_blobs_table.c.content_hash.in_(list(blobs)))
+            ).scalars())
+            new_blobs = [blob for key, blob in blobs.items() if key not in existing]
+            if new_blobs:
+                conn.execute(explanation_blobs_table.insert(), new_blobs)
+            conn.execute(
+                explanations.update()
+                .where(explanations.c.id == sqlalchemy.bindparam("row_id"))
+                .values(content_hash=sqlalchemy.bindparam("hash"), explanation="", explanation_html=None),
+                updates
+            )
+            migrated += len(rows)
+            print(f"✅ Migrated {migrated} explanations")
+    return migrated
+
+def train_dictionary(samples=2000, dictionary_size=DICTIONARY_SIZE):
+    """Train a zstd dictionary on a random sample of stored bodies and make it active"""
+    if not HAS_ZSTD:
+        raise RuntimeError("The zstandard package is needed to train a dictionary")
+    blobs = explanation_blobs_table
+    engine = get_engine()
+    with engine.connect() as conn:
+        rows = conn.execute(
+            sqlalchemy.select(blobs.c.explanation, blobs.c.explanation_html, *[blobs.c[name] for name in COMPRESSED_COLUMNS])
+            .order_by(sqlalchemy.func.random()).limit(samples)
+        ).fetchall()
+    texts = []
+    for row in rows:
+        row = inflate(dict(row._mapping))
+        texts.append(row["explanation"].encode("utf-8"))
+        if row["explanation_html"]:
+            texts.append(row["explanation_html"].encode("utf-8"))
+    if len(texts) < 10:
+        raise ValueError(f"Need at least 10 stored bodies to train a dictionary, found {len(texts)}")
+    dictionary = zstandard.train_dictionary(dictionary_size, texts)
+    with engine.begin() as conn:
+        dictionary_id = conn.execute(compression_dictionaries_table.insert().values(
+            data=dictionary.as_bytes(), samples=len(texts), created_at=datetime.utcnow()
+        )).inserted_primary_key[0]
+    codecs.load()
+    print(f"✅ Trained dictionary {dictionary_id} ({len(dictionary.as_bytes()):,} bytes) on {len(texts)} bodies")
+    return dictionary_id
+
+def recode_blobs(compress=True, batch_size=500):
+    """Compress plain-text bodies (or decompress compressed ones) in batches
+
+    Blobs are walked in content_hash order, so each batch is one indexed
+    range read and the job can be stopped and rerun at any time.
+    """
+    if compress and not HAS_ZSTD:
+        raise RuntimeError("The zstandard package is needed to compress bodies")
+    blobs = explanation_blobs_table
+    engine = get_engine()
+    last = ""
+    recoded = 0
+    while True:
+        with engine.begin() as conn:
+            query = sqlalchemy.select(
+                blobs.c.content_hash, blobs.c.explanation, blobs.c.explanation_html, blobs.c.size,
+                *[blobs.c[name] for name in COMPRESSED_COLUMNS]
+            ).where(blobs.c.content_hash > last).order_by(blobs.c.content_hash).limit(batch_size)
+            if compress:
+                query = query.where(blobs.c.codec.is_(None) & (blobs.c.size >= BLOB_COMPRESSION_MIN_SIZE))
+            else:
+                query = query.where(blobs.c.codec.isnot(None))
+            rows = [dict(row._mapping) for row in conn.execute(query)]
+            if not rows:
+                break
+            last = rows[-1]["content_hash"]
+            updates = []
+            for row in rows:
+                row = inflate(row)
+                row.update(codec=None, explanation_compressed=None, explanation_html_compressed=None)
+                if compress:
+                    compress_blob(row)
+                updates.append({"key": row["content_hash"], **{f"new_{name}": row[name] for name in BODY_COLUMNS}})
+            conn.execute(
+                blobs.update().where(blobs.c.content_hash == sqlalchemy.bindparam("key")).values(
+                    **{name: sqlalchemy.bindparam(f"new_{name}") for name in BODY_COLUMNS}
+                ),
+                updates
+            )
+            recoded += len(rows)
+            print(f"✅ {'Compressed' if compress else 'Decompressed'} {recoded} bodies")
+    return recoded
+
+def storage_report():
+    """Bytes history would take with inline bodies vs. with shared blobs"""
+    explanations = explanations_table
+    blobs = explanation_blobs_table
+    with get_engine().connect() as conn:
+        referenced, logical_bytes = conn.execute(
+            sqlalchemy.select(sqlalchemy.func.count(), sqlalchemy.func.coalesce(sqlalchemy.func.sum(blobs.c.size), 0))
+            .select_from(explanations.join(blobs, explanations.c.content_hash == blobs.c.content_hash))
+        ).one()
+        blob_count, stored_bytes = conn.execute(
+            sqlalchemy.select(sqlalchemy.func.count(), sqlalchemy.func.coalesce(sqlalchemy.func.sum(blobs.c.size), 0))
+        ).one()
+        compressed_blobs, compressed_size, compressed_bytes = conn.execute(
+            sqlalchemy.select(
+                sqlalchemy.func.count(),
+                sqlalchemy.func.coalesce(sqlalchemy.func.sum(blobs.c.size), 0),
+                sqlalchemy.func.coalesce(sqlalchemy.func.sum(
+                    sqlalchemy.func.length(blobs.c.explanation_compressed)
+                    + sqlalchemy.func.coalesce(sqlalchemy.func.length(blobs.c.explanation_html_compressed), 0)
+                ), 0)
+            ).where(blobs.c.codec.isnot(None))
+        ).one()
+        inline = conn.execute(
+            sqlalchemy.select(sqlalchemy.func.count()).where(explanations.c.content_hash.is_(None))
+        ).scalar()
+    saved = logical_bytes - stored_bytes
+    return {
+        "history_rows": referenced,
+        "unmigrated_rows": inline,
+        "blobs": blob_count,
+        "logical_bytes": logical_bytes,
+        "stored_bytes": stored_bytes,
+        "saved_bytes": saved,
+        "saved_percent": round(100 * saved / logical_bytes, 1) if logical_bytes else 0.0,
+        "compressed_blobs": compressed_blobs,
+        "compressed_bytes": compressed_bytes,
+        "compression_ratio": round(compressed_size / compressed_bytes, 2) if compressed_bytes else None
+    }
+
+if __name__ == "__main__":
+    from database import create_tables
+
+    parser = argparse.ArgumentParser(description="Explanation blob storage")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Move existing history bodies into blobs")
+    migrate_parser.add_argument("--batch-size", type=int, default=1000)
+    train_parser = subparsers.add_parser("train", help="Train a new compression dictionary")
+    train_parser.add_argument("--samples", type=int, default=2000)
+    for command, description in (("compress", "Compress stored plain-text bodies"), ("decompress", "Turn compressed bodies back into text")):
+        recode_parser = subparsers.add_parser(command, help=description)
+        recode_parser.add_argument("--batch-size", type=int, default=500)
+    subparsers.add_parser("report", help="Show storage saved by deduplication and compression")
+    args = parser.parse_args()
+
+    create_tables()
+    codecs.load()
+    if args.command == "migrate":
+        migrate_explanations(args.batch_size)
+    elif args.command == "train":
+        train_dictionary(args.samples)
+    elif args.command in ("compress", "decompress"):
+        recode_blobs(args.command == "compress", args.batch_size)
+    report = storage_report()
+    print(
+        f"📦 {report['history_rows']} history rows share {report['blobs']} blobs: "
+        f"{report['stored_bytes']:,} bytes stored instead of {report['logical_bytes']:,} "
+        f"({report['saved_bytes']:,} bytes / {report['saved_percent']}% saved, "
+        f"{report['unmigrated_rows']} rows not migrated)"
+    )
+    if report["compressed_blobs"]:
+        print(f"📦 {report['compressed_blobs']} blobs compressed to {report['compressed_bytes']:,} bytes "
+              f"({report['compression_ratio']}x)")
@@ -0,0 +1,36 @@
+# catalog.py - Quick-example topics and settings shared with the frontend
+# The lists live in frontend/utils/constants.py; load that file directly so
+# both services stay in sync without the backend importing Streamlit code.
+import os
+import importlib.util
+
+CONSTANTS_PATH = os.path.abspath(
+    os.path.join(os.path.dirname(__file__), "..", "frontend", "utils", "constants.py")
+)
+
+def _load_constants():
+    """Load the frontend constants module, or None if it isn't deployed"""
+    if not os.path.exists(CONSTANTS_PATH):
+        print(f"⚠️ Catalog constants not found at {CONSTANTS_PATH}")
+        return None
+    spec = importlib.util.spec_from_file_location("xplainit_constants", CONSTANTS_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+_constants = _load_constants()
+
+LEVELS = getattr(_constants, "LEVELS", ["Beginner", "Intermediate", "Advanced"])
+TONES = getattr(_constants, "TONES", ["Casual", "Formal", "Technical"])
+LANGUAGES = getattr(_constants, "LANGUAGES", ["English"])
+DEFAULT_EXTRAS = getattr(_constants, "DEFAULT_EXTRAS", "")
+
+def catalog_topics():
+    """All unique topics from TOPIC_EXAMPLES and QUICK_EXAMPLES, in catalog order"""
+    topics = []
+    for catalog in (getattr(_constants, "QUICK_EXAMPLES", {}), getattr(_constants, "TOPIC_EXAMPLES", {})):
+        for examples in catalog.values():
+            for topic in examples:
+                if topic not in topics:
+                    topics.append(topic)
+    return topics
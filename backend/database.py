@@ -1,10 +1,9 @@
 import os
-import databases
+import time
+import sqlite3
+import threading
 import sqlalchemy
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, Boolean, DateTime, Text, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from urllib.parse import urlparse
+from sqlalchemy import create_engine, MetaData, Table, Column, Integer, BigInteger, String, Boolean, DateTime, Text, LargeBinary, ForeignKey, Index
 
 # Database URL configuration
 def get_database_url():
@@ -27,17 +26,212 @@ IS_SQLITE = DATABASE_URL.startswith("sqlite://")
 
 print(f"📊 Using {'PostgreSQL' if IS_POSTGRES else 'SQLite'} database")
 
-# Create database connection
+# Create database connection (the databases driver is only loaded for PostgreSQL)
 if IS_POSTGRES:
+    import databases
     database = databases.Database(DATABASE_URL)
-    engine = create_engine(DATABASE_URL)
 else:
     # For SQLite, use synchronous connection
     database = None
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+
+def sqlite_path(url):
+    """File path of a sqlite:/// URL"""
+    return url.split("sqlite:///", 1)[1]
+
+SQLITE_PATH = sqlite_path(DATABASE_URL) if IS_SQLITE else None
+
+# Read replicas (same scheme as DATABASE_URL), comma-separated
+DATABASE_REPLICA_URLS = [
+    url.strip().replace("postgres://", "postgresql://", 1)
+    for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+# Replicas further behind than this are skipped until they catch up
+REPLICA_MAX_LAG_SECONDS = float(os.getenv("REPLICA_MAX_LAG_SECONDS", "5"))
+# How often replica lag is re-measured
+REPLICA_CHECK_SECONDS = float(os.getenv("REPLICA_CHECK_SECONDS", "5"))
+
+class ReplicaRouter:
+    """Send read-only queries to a replica that is close enough to the primary
+
+    Replicas are used round-robin while their measured lag is within
+    REPLICA_MAX_LAG_SECONDS; unreachable or lagging replicas fall back to
+    the primary. Reads keyed by a user who wrote within the lag window go
+    to the primary too, so users always see their own writes.
+    """
+
+    def __init__(self, urls):
+        self.replicas = []
+        for url in urls:
+            replica = {"url": url, "lag": None, "healthy": False, "checked_at": 0.0, "error": None}
+            if IS_POSTGRES:
+                replica["database"] = databases.Database(url)
+            else:
+                replica["path"] = sqlite_path(url)
+            self.replicas.append(replica)
+        self._next = 0
+        self._recent_writes = {}
+        self._lock = threading.Lock()
+
+    def note_write(self, key):
+        """Remember that key (a user id) just wrote to the primary"""
+        if self.replicas and key is not None:
+            now = time.monotonic()
+            with self._lock:
+                self._recent_writes[key] = now
+                if len(self._recent_writes) > 10000:
+                    cutoff = now - REPLICA_MAX_LAG_SECONDS
+                    self._recent_writes = {k: t for k, t in self._recent_writes.items() if t > cutoff}
+
+    def _wrote_recently(self, key):
+        written_at = self._recent_writes.get(key)
+        return written_at is not None and time.monotonic() - written_at < REPLICA_MAX_LAG_SECONDS
+
+    def _pick(self, key=None):
+        """Next usable replica, or None for the primary"""
+        if not self.replicas or (key is not None and self._wrote_recently(key)):
+            return None
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self._next % len(self.replicas)]
+                self._next += 1
+                if replica["healthy"] and replica["lag"] is not None and replica["lag"] <= REPLICA_MAX_LAG_SECONDS:
+                    return replica
+        return None
+
+    def _mark(self, replica, lag=None, error=None):
+        replica.update(lag=lag, healthy=error is None, error=error, checked_at=time.monotonic())
+
+    def _stale(self):
+        return [r for r in self.replicas if time.monotonic() - r["checked_at"] >= REPLICA_CHECK_SECONDS]
+
+    # SQLite stand-ins: lag is how much newer the primary file is than the replica copy
+    def refresh_sqlite(self):
+        for replica in self._stale():
+            try:
+                lag = os.path.getmtime(SQLITE_PATH) - os.path.getmtime(replica["path"])
+                self._mark(replica, lag=max(0.0, lag))
+            except OSError as e:
+                self._mark(replica, error=str(e))
+
+    async def refresh_pg(self):
+        for replica in self._stale():
+            try:
+                lag = await replica["database"].fetch_val(
+                    "SELECT CASE WHEN pg_is_in_recovery() THEN "
+                    "COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) ELSE 0 END"
+                )
+                self._mark(replica, lag=float(lag))
+            except Exception as e:
+                self._mark(replica, error=str(e))
+
+    async def refresh(self):
+        """Re-measure replica lag if it's older than REPLICA_CHECK_SECONDS"""
+        if IS_POSTGRES:
+            await self.refresh_pg()
+        else:
+            self.refresh_sqlite()
+
+    async def read_database(self, key=None):
+        """databases.Database to run a read-only query on"""
+        if self.replicas:
+            await self.refresh_pg()
+        replica = self._pick(key)
+        return replica["database"] if replica else database
+
+    def read_sqlite_path(self, key=None):
+        """(path, is_replica) of the SQLite file to read from"""
+        if self.replicas:
+            self.refresh_sqlite()
+        replica = self._pick(key)
+        return (replica["path"], True) if replica else (SQLITE_PATH, False)
+
+    def mark_failed(self, db_or_path, error):
+        for replica in self.replicas:
+            if replica.get("database") is db_or_path or replica.get("path") == db_or_path:
+                self._mark(replica, error=str(error))
+
+    def status(self):
+        """Replica health as of the last lag check; doesn't query the replicas"""
+        now = time.monotonic()
+        return [{
+            "url": replica["url"].split("@")[-1],
+            "healthy": replica["healthy"],
+            "lag_seconds": None if replica["lag"] is None else round(replica["lag"], 3),
+            "checked_seconds_ago": round(now - replica["checked_at"], 1) if replica["checked_at"] else None,
+            "error": replica["error"]
+        } for replica in self.replicas]
+
+replica_router = ReplicaRouter(DATABASE_REPLICA_URLS)
+
+def connect_sqlite(read_only=False, key=None, **kwargs):
+    """SQLite connection to the primary, or to a replica for read-only work"""
+    if read_only:
+        path, is_replica = replica_router.read_sqlite_path(key)
+        if is_replica:
+            return sqlite3.connect(f"file:{path}?mode=ro", uri=True, **kwargs)
+    return sqlite3.connect(SQLITE_PATH, **kwargs)
+
+async def fetch_one_read(query, key=None):
+    """fetch_one on a replica; a miss or a failing replica is retried on the primary
+
+    A row missing on the replica may just not have replicated yet (a user
+    who signed up a moment ago), so misses are re-checked on the primary.
+    """
+    db = await replica_router.read_database(key)
+    if db is not database:
+        try:
+            row = await db.fetch_one(query)
+            if row is not None:
+                return row
+        except Exception as e:
+            replica_router.mark_failed(db, e)
+    return await database.fetch_one(query)
+
+async def fetch_all_read(query, key=None):
+    """fetch_all on a replica, falling back to the primary if the replica fails"""
+    db = await replica_router.read_database(key)
+    if db is not database:
+        try:
+            return await db.fetch_all(query)
+        except Exception as e:
+            replica_router.mark_failed(db, e)
+    return await database.fetch_all(query)
+
+def _sqlite_fetch_one(path, sql, params, uri=False):
+    conn = sqlite3.connect(path, uri=uri)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute(sql, params).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+def sqlite_fetch_one_read(sql, params=(), key=None):
+    """Fetch one row (as a dict) from a replica, re-checking misses on the primary"""
+    path, is_replica = replica_router.read_sqlite_path(key)
+    if is_replica:
+        try:
+            row = _sqlite_fetch_one(f"file:{path}?mode=ro", sql, params, uri=True)
+            if row is not None:
+                return row
+        except sqlite3.Error as e:
+            replica_router.mark_failed(path, e)
+    return _sqlite_fetch_one(SQLITE_PATH, sql, params)
+
+# The SQLAlchemy engine is only needed for DDL, so it's built on first use
+_engine = None
+
+def get_engine():
+    """Get the SQLAlchemy engine, creating it on first use"""
+    global _engine
+    if _engine is None:
+        if IS_POSTGRES:
+            _engine = create_engine(DATABASE_URL)
+        else:
+            _engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+    return _engine
 
 metadata = MetaData()
-Base = declarative_base()
 
 # Define Users table
 users_table = Table(
@@ -53,23 +247,127 @@ users_table = Table(
     Column("is_active", Boolean, default=True)
 )
 
-# Define Explanations table
-explanations_table = Table(
-    "explanations",
+# Define Refresh tokens table (only a hash of each opaque token is stored;
+# the primary key makes refresh a single indexed lookup)
+refresh_tokens_table = Table(
+    "refresh_tokens",
     metadata,
-    Column("id", String, primary_key=True, index=True),
-    Column("user_id", String, ForeignKey("users.id"), nullable=False),
-    Column("topic", String, nullable=False),
+    Column("token_hash", String, primary_key=True),
+    Column("user_id", String, ForeignKey("users.id"), nullable=False, index=True),
+    Column("expires_at", DateTime, nullable=False),
+    Column("created_at", DateTime, nullable=False)
+)
+
+# Define Explanation blobs table (explanation bodies stored once, keyed by
+# a hash of their content; history rows reference them). Compressed bodies
+# leave explanation empty and live in the *_compressed columns, encoded as
+# named by codec (see blob_store.py); size is always the uncompressed size.
+explanation_blobs_table = Table(
+    "explanation_blobs",
+    metadata,
+    Column("content_hash", String, primary_key=True),
     Column("explanation", Text, nullable=False),
+    Column("explanation_html", Text),
+    Column("size", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False),
+    Column("codec", String),
+    Column("explanation_compressed", LargeBinary),
+    Column("explanation_html_compressed", LargeBinary)
+)
+
+# Define Compression dictionaries table (zstd dictionaries trained on
+# explanation bodies; a blob's codec names the dictionary it needs)
+compression_dictionaries_table = Table(
+    "compression_dictionaries",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("data", LargeBinary, nullable=False),
+    Column("samples", Integer, nullable=False),
+    Column("created_at", DateTime, nullable=False)
+)
+
+# Define Explanations tables (explanation is empty once the body lives in
+# explanation_blobs under content_hash). On PostgreSQL explanations is
+# range-partitioned by month on timestamp, so the partition key is part of
+# the primary key; on SQLite rows older than SQLITE_HOT_DAYS are moved to
+# explanations_cold by retention.py so the hot table and its index stay small.
+def _explanations_table(name, *indexes, **kwargs):
+    return Table(
+        name,
+        metadata,
+        Column("id", String, primary_key=True, index=True),
+        Column("user_id", String, ForeignKey("users.id"), nullable=False),
+        Column("topic", String, nullable=False),
+        Column("explanation", Text, nullable=False),
+        Column("level", String),
+        Column("tone", String),
+        Column("language", String),
+        Column("extras", String),
+        Column("timestamp", DateTime, primary_key=True),
+        Column("explanation_html", Text),
+        Column("content_hash", String, ForeignKey("explanation_blobs.content_hash")),
+        # History reads filter by user and sort/filter by time
+        Index(f"ix_{name}_user_id_timestamp", "user_id", "timestamp"),
+        *indexes,
+        **kwargs
+    )
+
+explanations_table = _explanations_table("explanations", postgresql_partition_by="RANGE (timestamp)")
+# Archival reads the cold table a month at a time
+explanations_cold_table = _explanations_table("explanations_cold", Index("ix_explanations_cold_timestamp", "timestamp"))
+
+# Define Archived explanations table (history stubs for rows moved to the
+# compressed archive files by retention.py; archive_offset is where the
+# compressed member holding the row starts, so rehydrating reads only that)
+archived_explanations_table = Table(
+    "archived_explanations",
+    metadata,
+    Column("id", String, primary_key=True),
+    Column("user_id", String, nullable=False),
+    Column("topic", String, nullable=False),
+    Column("level", String),
+    Column("tone", String),
+    Column("language", String),
+    Column("extras", String),
+    Column("timestamp", DateTime, nullable=False),
+    Column("archive", String, nullable=False),
+    Column("archive_offset", BigInteger, nullable=False),
+    Index("ix_archived_explanations_user_id_timestamp", "user_id", "timestamp")
+)
+
+# Tables only used by one backend
+SQLITE_ONLY_TABLES = {"explanations_cold"}
+
+# Define Explanation cache table (warm-up results and generated explanations
+# shared across users, keyed by a hash of topic + settings)
+explanation_cache_table = Table(
+    "explanation_cache",
+    metadata,
+    Column("cache_key", String, primary_key=True),
+    Column("topic", String, nullable=False),
     Column("level", String),
     Column("tone", String),
     Column("language", String),
     Column("extras", String),
-    Column("timestamp", DateTime, nullable=False)
+    Column("explanation", Text, nullable=False),
+    Column("created_at", DateTime, nullable=False)
 )
 
-# Create SessionLocal for SQLite fallback
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Define Usage rollup tables (explanation counts per hour/day bucket and
+# canonical topic, level and language; maintained by analytics.py)
+def _usage_rollup_table(name):
+    return Table(
+        name,
+        metadata,
+        Column("bucket_start", DateTime, primary_key=True),
+        Column("topic", String, primary_key=True),
+        Column("level", String, primary_key=True),
+        Column("language", String, primary_key=True),
+        Column("count", Integer, nullable=False)
+    )
+
+usage_hourly_table = _usage_rollup_table("usage_hourly")
+usage_daily_table = _usage_rollup_table("usage_daily")
 
 # Database connection functions
 async def connect_database():
@@ -77,19 +375,108 @@ async def connect_database():
     if IS_POSTGRES and database:
         await database.connect()
         print("✅ Connected to PostgreSQL database")
+        for replica in replica_router.replicas:
+            try:
+                await replica["database"].connect()
+                print(f"✅ Connected to read replica {replica['url'].split('@')[-1]}")
+            except Exception as e:
+                replica_router.mark_failed(replica["database"], e)
+                print(f"❌ Read replica unavailable, reading from the primary: {e}")
     else:
         print("✅ Using SQLite database")
 
 async def disconnect_database():
     """Disconnect from database"""
     if IS_POSTGRES and database:
+        for replica in replica_router.replicas:
+            if replica["database"].is_connected:
+                await replica["database"].disconnect()
         await database.disconnect()
         print("🔌 Disconnected from PostgreSQL database")
 
+def add_missing_columns():
+    """Add columns introduced after a table was first created
+
+    create_all only creates missing tables, so nullable columns added to
+    existing tables later are added here with ALTER TABLE.
+    """
+    engine = get_engine()
+    inspector = sqlalchemy.inspect(engine)
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(sqlalchemy.text(
+                    f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+                ))
+                print(f"✅ Added column {table.name}.{column.name}")
+
+# Monthly partitions created ahead of time on PostgreSQL
+EXPLANATION_PARTITIONS_AHEAD = int(os.getenv("EXPLANATION_PARTITIONS_AHEAD", "3"))
+
+def month_start(timestamp, months=0):
+    """First instant of the month `months` after the one containing timestamp"""
+    index = timestamp.year * 12 + timestamp.month - 1 + months
+    return timestamp.replace(year=index // 12, month=index % 12 + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def explanation_partition_name(month):
+    return f"explanations_p{month:%Y_%m}"
+
+def ensure_explanation_partitions(start=None, months_ahead=EXPLANATION_PARTITIONS_AHEAD):
+    """Create monthly explanations partitions from start's month to months_ahead past now
+
+    Does nothing if explanations isn't partitioned (databases created
+    before partitioning; see `python retention.py partition`). Rows outside
+    every monthly range land in explanations_default.
+    """
+    from datetime import datetime
+
+    engine = get_engine()
+    with engine.begin() as conn:
+        partitioned = conn.execute(sqlalchemy.text(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('explanations')"
+        )).first()
+        if not partitioned:
+            return []
+        existing = {row[0] for row in conn.execute(sqlalchemy.text(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = 'explanations'::regclass"
+        ))}
+        created = []
+        if "explanations_default" not in existing:
+            conn.execute(sqlalchemy.text("CREATE TABLE explanations_default PARTITION OF explanations DEFAULT"))
+            created.append("explanations_default")
+        month = month_start(start or datetime.utcnow())
+        last = month_start(datetime.utcnow(), months_ahead)
+        while month <= last:
+            name = explanation_partition_name(month)
+            if name not in existing:
+                conn.execute(sqlalchemy.text(
+                    f"CREATE TABLE {name} PARTITION OF explanations "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{month_start(month, 1):%Y-%m-%d}')"
+                ))
+                created.append(name)
+            month = month_start(month, 1)
+    for name in created:
+        print(f"✅ Created partition {name}")
+    return created
+
 def create_tables():
     """Create all tables"""
     try:
-        metadata.create_all(bind=engine)
+        tables = [
+            table for table in metadata.sorted_tables
+            if not (IS_POSTGRES and table.name in SQLITE_ONLY_TABLES)
+        ]
+        metadata.create_all(bind=get_engine(), tables=tables)
+        add_missing_columns()
+        if IS_POSTGRES:
+            ensure_explanation_partitions()
         print("✅ Database tables created successfully")
     except Exception as e:
         print(f"❌ Error creating tables: {e}")
@@ -99,7 +486,8 @@ def create_tables():
 def get_db():
     """Get database session for SQLite"""
     if IS_SQLITE:
-        db = SessionLocal()
+        from sqlalchemy.orm import sessionmaker
+        db = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())()
         try:
             yield db
         finally:
@@ -0,0 +1,98 @@
+# deadlines.py - Request deadlines and cancellation of abandoned model calls
+# Clients send how long they will wait (X-Request-Timeout: seconds, or
+# X-Request-Deadline: unix time); the server stops upstream work once that
+# passes. Work is also cancelled when the client disconnects or when the
+# same user starts a newer request (latest request wins), so abandoned
+# requests stop consuming model quota.
+import os
+import time
+import asyncio
+
+REQUEST_TIMEOUT_HEADER = "x-request-timeout"
+REQUEST_DEADLINE_HEADER = "x-request-deadline"
+# Longest any explanation may run, whatever the client asks for
+EXPLAIN_MAX_SECONDS = float(os.getenv("EXPLAIN_MAX_SECONDS", "120"))
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before the work finished"""
+
+class RequestCancelled(Exception):
+    """The work was cancelled because the client left or sent a newer request"""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+def request_deadline(headers, limit=EXPLAIN_MAX_SECONDS):
+    """Monotonic deadline from the request headers, capped at limit seconds from now"""
+    budget = limit
+    try:
+        if headers.get(REQUEST_TIMEOUT_HEADER):
+            budget = min(budget, float(headers[REQUEST_TIMEOUT_HEADER]))
+        elif headers.get(REQUEST_DEADLINE_HEADER):
+            budget = min(budget, float(headers[REQUEST_DEADLINE_HEADER]) - time.time())
+    except ValueError:
+        pass
+    return time.monotonic() + budget
+
+def remaining(deadline):
+    """Seconds left before a deadline (negative once it has passed)"""
+    return deadline - time.monotonic()
+
+async def _watch_disconnect(request, task, cancel):
+    while not task.done():
+        if await request.is_disconnected():
+            cancel(task, "disconnected")
+            return
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+
+class LatestRequestWins:
+    """In-flight work per key (a user); starting new work cancels the old"""
+
+    def __init__(self):
+        self._tasks = {}
+        self._reasons = {}
+        self.counters = {"superseded": 0, "disconnected": 0, "deadline": 0}
+
+    def _cancel(self, task, reason):
+        if not task.done() and task not in self._reasons:
+            self._reasons[task] = reason
+            self.counters[reason] += 1
+            task.cancel()
+
+    def cancel(self, key, reason="superseded"):
+        """Cancel the key's in-flight work, if any"""
+        task = self._tasks.get(key)
+        if task is not None:
+            self._cancel(task, reason)
+
+    async def run(self, key, coro, request=None, deadline=None):
+        """Await coro as the key's current work
+
+        Raises RequestCancelled if a newer request for the key or a client
+        disconnect cancels it, DeadlineExceeded if the deadline passes.
+        """
+        self.cancel(key)
+        task = asyncio.ensure_future(coro)
+        self._tasks[key] = task
+        watcher = asyncio.ensure_future(_watch_disconnect(request, task, self._cancel)) if request is not None else None
+        try:
+            done, _ = await asyncio.wait({task}, timeout=remaining(deadline) if deadline is not None else None)
+            if not done:
+                self._cancel(task, "deadline")
+                raise DeadlineExceeded()
+            if task.cancelled():
+                raise RequestCancelled(self._reasons.pop(task, "cancelled"))
+            return task.result()
+        finally:
+            # Also reached when this handler itself is cancelled
+            if not task.done():
+                task.cancel()
+            if watcher is not None:
+                watcher.cancel()
+            self._reasons.pop(task, None)
+            if self._tasks.get(key) is task:
+                del self._tasks[key]
+
+explain_requests = LatestRequestWins()
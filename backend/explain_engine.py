@@ -1,30 +1,205 @@
 # explain_engine.py - Google AI Studio
-import google.generativeai as genai
 import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+from token_budget import (
+    plan_budget, budget_metadata, count_tokens, SUMMARY_OUTPUT_TOKENS
+)
+from deadlines import DeadlineExceeded, remaining
+from scheduler import INTERACTIVE, QueueFull, scheduler
+
 load_dotenv()
 
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+MODEL_NAME = 'gemini-1.5-flash'
+# Translating a cached explanation is a simpler job than writing one, so a
+# smaller model does it; TRANSLATION_MODE=stub skips the model entirely
+TRANSLATION_MODEL_NAME = os.getenv("TRANSLATION_MODEL", "gemini-1.5-flash-8b")
+TRANSLATION_MODE = os.getenv("TRANSLATION_MODE", "model")
+TRANSLATION_MAX_OUTPUT_TOKENS = int(os.getenv("TRANSLATION_MAX_OUTPUT_TOKENS", "4096"))
+# How many chunk summaries run at once for very long inputs
+SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", "4"))
 
-def generate_explanation(topic, level, tone, extras, language):
-    prompt = f"""Explain '{topic}' clearly for someone at {level} level.
+# google.generativeai takes ~1 s to import, so it's loaded on first use
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_genai():
+    """Import and configure the Gemini SDK once, on first use"""
+    global _genai
+    if _genai is None:
+        with _genai_lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                _genai = genai
+    return _genai
+
+def build_prompt(topic, level, tone, extras, language):
+    return f"""Explain '{topic}' clearly for someone at {level} level.
 
 Use a {tone} tone and {language or 'English'} language.
 {f'Additional requirements: {extras}' if extras else ''}
 
 Make it comprehensive, engaging, and easy to understand with examples."""
-    
+
+def _generate(prompt, max_output_tokens):
+    """Run one model call with an output cap, returning the response"""
+    model = get_genai().GenerativeModel(MODEL_NAME)
+    return model.generate_content(
+        prompt,
+        generation_config={"max_output_tokens": max_output_tokens}
+    )
+
+async def _generate_async(prompt, max_output_tokens, deadline=None, priority=INTERACTIVE, user=None,
+                          model_name=MODEL_NAME):
+    """_generate for the event loop; cancelling the caller cancels the upstream call
+
+    The call waits for a scheduler slot in its priority class, queued
+    fairly against other users' calls by output budget.
+    """
+    model = get_genai().GenerativeModel(model_name)
+    async with scheduler.slot(priority, user, cost=max_output_tokens):
+        return await model.generate_content_async(
+            prompt,
+            generation_config={"max_output_tokens": max_output_tokens},
+            request_options={"timeout": max(remaining(deadline), 0.1)} if deadline is not None else None
+        )
+
+def _usage(response):
+    """Pull token usage out of a model response if the SDK reports it"""
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return None
+    return {
+        "prompt_tokens": getattr(usage, "prompt_token_count", None),
+        "output_tokens": getattr(usage, "candidates_token_count", None),
+    }
+
+def summary_prompt(chunk):
+    return f"""Summarize the following part of a longer document.
+Keep every key fact, term, number and name needed to explain it later.
+
+{chunk}"""
+
+def summarize_chunk(chunk):
+    """Summarize one chunk of a long document, keeping the key facts"""
+    response = _generate(summary_prompt(chunk), SUMMARY_OUTPUT_TOKENS)
+    return response.text or ""
+
+def summarize_chunks(chunks):
+    """Summarize chunks in parallel, preserving their order"""
+    with ThreadPoolExecutor(max_workers=SUMMARY_WORKERS) as executor:
+        return list(executor.map(summarize_chunk, chunks))
+
+def generate_explanation_with_budget(topic, level, tone, extras, language):
+    """Generate an explanation and return it with its token budget report"""
+    plan = plan_budget(topic, level)
+    try:
+        text = plan["text"]
+        if plan["strategy"] == "map_reduce":
+            # Map: summarize chunks in parallel. Reduce: explain the combined summary.
+            text = "\n\n".join(summarize_chunks(plan["chunks"]))
+
+        prompt = build_prompt(text, level, tone, extras, language)
+        response = _generate(prompt, plan["max_output_tokens"])
+        metadata = budget_metadata(plan, count_tokens(prompt), _usage(response))
+        explanation = response.text if response.text else "No response generated. Try again."
+        return explanation, metadata
+    except Exception as e:
+        return f"Error: {str(e)}", budget_metadata(plan, 0)
+
+async def summarize_chunks_async(chunks, deadline=None, priority=INTERACTIVE, user=None):
+    """summarize_chunks for the event loop, SUMMARY_WORKERS calls at a time
+
+    The first failing chunk cancels the others, which would only spend
+    quota on a summary that can't be used, and its exception propagates.
+    """
+    semaphore = asyncio.Semaphore(SUMMARY_WORKERS)
+
+    async def summarize(chunk):
+        async with semaphore:
+            response = await _generate_async(summary_prompt(chunk), SUMMARY_OUTPUT_TOKENS, deadline, priority, user)
+            return response.text or ""
+
+    tasks = [asyncio.ensure_future(summarize(chunk)) for chunk in chunks]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def generate_explanation_async(topic, level, tone, extras, language, deadline=None,
+                                     priority=INTERACTIVE, user=None):
+    """generate_explanation_with_budget without blocking the event loop
+
+    Cancelling the task cancels the in-flight model calls. A call cut off
+    by the deadline raises DeadlineExceeded instead of returning error text;
+    QueueFull propagates when the scheduler turns the call away.
+    """
+    plan = plan_budget(topic, level)
+    try:
+        text = plan["text"]
+        if plan["strategy"] == "map_reduce":
+            text = "\n\n".join(await summarize_chunks_async(plan["chunks"], deadline, priority, user))
+
+        prompt = build_prompt(text, level, tone, extras, language)
+        response = await _generate_async(prompt, plan["max_output_tokens"], deadline, priority, user)
+        metadata = budget_metadata(plan, count_tokens(prompt), _usage(response))
+        explanation = response.text if response.text else "No response generated. Try again."
+        return explanation, metadata
+    except QueueFull:
+        raise
+    except Exception as e:
+        if deadline is not None and remaining(deadline) <= 0:
+            raise DeadlineExceeded() from e
+        return f"Error: {str(e)}", budget_metadata(plan, 0)
+
+def build_translation_prompt(explanation, source_language, language):
+    return f"""Translate the following explanation from {source_language} to {language}.
+Keep the markdown structure, headings, lists, code, formulas and proper names.
+Reply with the translation only.
+
+{explanation}"""
+
+async def translate_explanation_async(explanation, source_language, language, deadline=None,
+                                      priority=INTERACTIVE, user=None):
+    """Translate an explanation into language, returning it with a budget report
+
+    Errors are handled like generate_explanation_async.
+    """
+    prompt = build_translation_prompt(explanation, source_language, language)
+    max_output_tokens = min(max(count_tokens(explanation) * 2, SUMMARY_OUTPUT_TOKENS), TRANSLATION_MAX_OUTPUT_TOKENS)
+    metadata = {
+        "strategy": "translate",
+        "source_language": source_language,
+        "prompt_tokens": count_tokens(prompt),
+        "max_output_tokens": max_output_tokens,
+    }
+    if TRANSLATION_MODE == "stub":
+        return f"[{language}]\n\n{explanation}", metadata
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(prompt)
-        return response.text if response.text else "No response generated. Try again."
+        response = await _generate_async(prompt, max_output_tokens, deadline, priority, user, TRANSLATION_MODEL_NAME)
+        usage = _usage(response)
+        if usage:
+            metadata["usage"] = usage
+        return (response.text if response.text else "No response generated. Try again."), metadata
+    except QueueFull:
+        raise
     except Exception as e:
-        return f"Error: {str(e)}"
+        if deadline is not None and remaining(deadline) <= 0:
+            raise DeadlineExceeded() from e
+        return f"Error: {str(e)}", metadata
+
+def generate_explanation(topic, level, tone, extras, language):
+    explanation, _ = generate_explanation_with_budget(topic, level, tone, extras, language)
+    return explanation
 
 def test_connection():
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = get_genai().GenerativeModel(MODEL_NAME)
         response = model.generate_content("Say hello!")
         return True, "Google AI working!"
     except Exception as e:
@@ -0,0 +1,53 @@
+# formatting.py - Markdown clean-up for AI responses
+# Runs once on the server when an explanation is generated (the cleaned form
+# is what gets cached and stored); the frontend reuses it for local fallbacks.
+import re
+
+DIV_TAG = re.compile(r'</?div[^>]*>')
+BOLD_HEADING = re.compile(r'\*{1,2}([^\n*]+)\*{1,2}')
+INLINE_EMPHASIS = re.compile(r'\*{1,2}([^\*\n]+)\*{1,2}')
+
+def clean_response(response):
+    """Clean up AI response and format with markdown headings
+
+    Single pass over the lines after stripping <div> tags:
+    - *Heading* / **Heading** on its own line -> ### Heading
+    - lines ending with ? or : -> ### headings
+    - • and - bullets -> "- "
+    - *text* / **text** -> **text**
+    - runs of blank lines collapse to one
+    """
+    if '<div' in response or '</div' in response:
+        response = DIV_TAG.sub('', response)
+
+    lines = []
+    append = lines.append
+    blank = False
+    for line in response.split('\n'):
+        stripped = line.strip()
+        if not stripped:
+            if not blank and lines:
+                append('')
+            blank = True
+            continue
+        blank = False
+        first = stripped[0]
+
+        if first == '*':
+            heading = BOLD_HEADING.fullmatch(stripped)
+            if heading:
+                append("### " + heading.group(1))
+                continue
+
+        if first == '•' or (first == '-' and not stripped.startswith('--')):
+            line = '- ' + stripped[1:].lstrip(' ')
+        elif first != '#' and stripped[-1] in '?:':
+            line = "### " + stripped
+        else:
+            line = line.rstrip()
+
+        if '*' in line:
+            line = INLINE_EMPHASIS.sub(r'**\1**', line)
+        append(line)
+
+    return '\n'.join(lines).strip()
@@ -0,0 +1,111 @@
+# history_export.py - Stream a user's full history as NDJSON or CSV
+# Rows are read through a server-side cursor (PostgreSQL) or fetchmany
+# batches (SQLite) and encoded batch by batch, so an export never holds
+# the whole history in memory. Archived explanations come first, read
+# back from their archive files one file at a time.
+import io
+import csv
+import asyncio
+import sqlite3
+
+import sqlalchemy
+
+from database import IS_POSTGRES, database, explanations_table, explanation_blobs_table, connect_sqlite
+from serialization import dumps
+from retention import archived_items_for_user
+from blob_store import inflate
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+EXPORT_COLUMNS = ["id", "topic", "level", "tone", "language", "extras", "timestamp", "explanation"]
+SQLITE_UNION_COLUMNS = "id, topic, level, tone, language, extras, timestamp, explanation, content_hash"
+# Rows encoded per chunk of the response
+EXPORT_BATCH_SIZE = 500
+
+def encode_rows(rows, fmt, header=False):
+    """Encode a batch of rows as NDJSON lines or CSV records"""
+    if fmt == "ndjson":
+        return b"".join(dumps(row) + b"\n" for row in rows)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows([row[column] for column in EXPORT_COLUMNS] for row in rows)
+    return buffer.getvalue().encode("utf-8")
+
+def _history_query(user_id):
+    explanations = explanations_table
+    blobs = explanation_blobs_table
+    return sqlalchemy.select(
+        *[explanations.c[column] for column in EXPORT_COLUMNS if column != "explanation"],
+        sqlalchemy.func.coalesce(blobs.c.explanation, explanations.c.explanation).label("explanation"),
+        # Exports leave out the HTML, so only the markdown is decompressed
+        blobs.c.codec, blobs.c.explanation_compressed
+    ).select_from(
+        explanations.outerjoin(blobs, explanations.c.content_hash == blobs.c.content_hash)
+    ).where(
+        explanations.c.user_id == user_id
+    ).order_by(explanations.c.timestamp)
+
+async def _with_archived(user_id, rows):
+    """Archived rows followed by the database rows"""
+    async for row in archived_items_for_user(user_id):
+        yield {column: row.get(column) for column in EXPORT_COLUMNS}
+    async for row in rows:
+        row = inflate(dict(row))
+        row.pop("explanation_html", None)
+        yield row
+
+async def _sqlite_rows(user_id):
+    """Hot and cold rows, fetched EXPORT_BATCH_SIZE at a time off the event loop"""
+    conn = connect_sqlite(read_only=True, key=user_id, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.execute('''
+            SELECT e.id, e.topic, e.level, e.tone, e.language, e.extras, e.timestamp,
+                   COALESCE(b.explanation, e.explanation) AS explanation,
+                   b.codec, b.explanation_compressed
+            FROM (
+                SELECT {columns} FROM explanations_cold WHERE user_id = ?
+                UNION ALL
+                SELECT {columns} FROM explanations WHERE user_id = ?
+            ) e
+            LEFT JOIN explanation_blobs b ON b.content_hash = e.content_hash
+            ORDER BY e.timestamp
+        '''.format(columns=SQLITE_UNION_COLUMNS), (user_id, user_id))
+        while True:
+            rows = await asyncio.to_thread(cursor.fetchmany, EXPORT_BATCH_SIZE)
+            for row in rows:
+                yield dict(row)
+            if len(rows) < EXPORT_BATCH_SIZE:
+                break
+    finally:
+        conn.close()
+
+async def _encode(rows, fmt):
+    """Encode an async stream of rows EXPORT_BATCH_SIZE at a time"""
+    batch = []
+    first = True
+    async for row in rows:
+        batch.append(dict(row))
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield encode_rows(batch, fmt, header=first)
+            batch, first = [], False
+    if batch or first:
+        yield encode_rows(batch, fmt, header=first)
+
+def stream_history_pg(user_id, fmt):
+    """Async chunks of a user's history, read through a server-side cursor"""
+    return _encode(_with_archived(user_id, database.iterate(_history_query(user_id))), fmt)
+
+def stream_history_sqlite(user_id, fmt):
+    """Async chunks of a user's history (hot and cold tables)"""
+    return _encode(_with_archived(user_id, _sqlite_rows(user_id)), fmt)
+
+def stream_history(user_id, fmt):
+    """Async chunks of the export body"""
+    if IS_POSTGRES:
+        return stream_history_pg(user_id, fmt)
+    return stream_history_sqlite(user_id, fmt)
@@ -0,0 +1,176 @@
+# offline_engine.py - Offline explanations from a local SQLite snapshot
+# When the backend is unreachable the frontend answers from a snapshot of
+# cached explanations for the quick-example catalog, matched to the topic
+# by trigram similarity. Only shared catalog entries are exported - never
+# users' history or topics they typed - since the file ships with the
+# frontend. No network access; lookups are in-memory.
+#
+#   python offline_engine.py export [--limit N]   # build the snapshot from the main database
+#   python offline_engine.py query "black holes explained"
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import threading
+from collections import Counter, defaultdict
+from itertools import chain
+
+from topic_index import canonicalize_topic
+
+SNAPSHOT_PATH = os.getenv(
+    "OFFLINE_SNAPSHOT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "explanations_snapshot.db")
+)
+# Minimum trigram similarity (0-1) for a snapshot entry to count as a match
+OFFLINE_MIN_SIMILARITY = float(os.getenv("OFFLINE_MIN_SIMILARITY", "0.35"))
+
+def trigrams(text):
+    """Character trigrams of the canonical topic, padded so short words still match"""
+    padded = f"  {canonicalize_topic(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class OfflineEngine:
+    """In-memory trigram index over a snapshot of explanations"""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.index = defaultdict(list)
+        self.sizes = []
+        for doc_id, entry in enumerate(entries):
+            grams = trigrams(entry["topic"])
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.index[gram].append(doc_id)
+
+    @classmethod
+    def load(cls, path=SNAPSHOT_PATH):
+        if not os.path.exists(path):
+            return cls([])
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        try:
+            rows = conn.execute('SELECT * FROM snapshot').fetchall()
+        finally:
+            conn.close()
+        return cls([dict(row) for row in rows])
+
+    def search(self, topic, level=None, tone=None, language=None, min_similarity=OFFLINE_MIN_SIMILARITY):
+        """Best snapshot entry for a topic, as (entry, similarity) or (None, 0.0)
+
+        Entries in another language are skipped; matching level and tone
+        break ties between equally similar topics.
+        """
+        query = trigrams(topic)
+        if not query:
+            return None, 0.0
+
+        # Shared trigram count per candidate (Counter over the posting lists runs in C)
+        overlap = Counter(chain.from_iterable(self.index.get(gram, ()) for gram in query))
+
+        best, best_key = None, None
+        for doc_id, shared in overlap.items():
+            entry = self.entries[doc_id]
+            if language and entry["language"] not in (language, None):
+                continue
+            similarity = shared / (len(query) + self.sizes[doc_id] - shared)
+            if similarity < min_similarity:
+                continue
+            key = (round(similarity, 3), entry["level"] == level, entry["tone"] == tone)
+            if best_key is None or key > best_key:
+                best, best_key = (entry, similarity), key
+        return best if best else (None, 0.0)
+
+    def __len__(self):
+        return len(self.entries)
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_offline_engine():
+    """Load the snapshot once per process"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = OfflineEngine.load()
+    return _engine
+
+def generate_offline_explanation(topic, level, tone, extras, language):
+    """Explanation from the snapshot, or None if nothing similar enough exists"""
+    entry, similarity = get_offline_engine().search(topic, level, tone, language)
+    if entry is None:
+        return None
+    note = "" if canonicalize_topic(entry["topic"]) == canonicalize_topic(topic) else \
+        "*Offline answer for a similar saved topic*\n\n"
+    return note + entry["explanation"]
+
+def export_snapshot(path=SNAPSHOT_PATH, limit=5000):
+    """Copy cached catalog explanations from the main database into a snapshot file"""
+    import sqlalchemy
+    from database import get_engine, explanation_cache_table
+    from catalog import catalog_topics
+
+    columns = ["topic", "level", "tone", "language", "explanation"]
+    cache = explanation_cache_table
+    # Warm-up caches catalog topics verbatim; anything else in the cache was typed by a user
+    query = sqlalchemy.select(*[cache.c[name] for name in columns]).where(
+        cache.c.topic.in_(catalog_topics())
+    ).order_by(cache.c.created_at.desc())
+    seen = set()
+    rows = []
+    with get_engine().connect() as conn:
+        for row in conn.execute(query.limit(limit)):
+            row = dict(row._mapping)
+            key = (canonicalize_topic(row["topic"]), row["level"], row["tone"], row["language"])
+            if key in seen or not row["explanation"] or row["explanation"].startswith("Error:"):
+                continue
+            seen.add(key)
+            rows.append(row)
+
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute('''
+            CREATE TABLE snapshot (
+                id INTEGER PRIMARY KEY,
+                topic TEXT NOT NULL,
+                level TEXT,
+                tone TEXT,
+                language TEXT,
+                explanation TEXT NOT NULL
+            )
+        ''')
+        conn.executemany(
+            'INSERT INTO snapshot (topic, level, tone, language, explanation) VALUES (?, ?, ?, ?, ?)',
+            [tuple(row[name] for name in columns) for row in rows[:limit]]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+    print(f"✅ Exported {min(len(rows), limit)} explanations to {path}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline explanation snapshot")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="Build the snapshot from the main database")
+    export_parser.add_argument("--limit", type=int, default=5000)
+    query_parser = subparsers.add_parser("query", help="Look up a topic in the snapshot")
+    query_parser.add_argument("topic")
+    query_parser.add_argument("--language", default="English")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_snapshot(limit=args.limit)
+    else:
+        engine = get_offline_engine()
+        started = time.perf_counter()
+        entry, similarity = engine.search(args.topic, language=args.language)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if entry is None:
+            print(f"No match among {len(engine)} entries ({elapsed_ms:.2f} ms)")
+            sys.exit(1)
+        print(f"{entry['topic']!r} similarity {similarity:.2f} ({elapsed_ms:.2f} ms, {len(engine)} entries)")
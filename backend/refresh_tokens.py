@@ -0,0 +1,126 @@
+# refresh_tokens.py - Opaque refresh tokens stored hashed in the database
+# Logging in costs a bcrypt verify; refreshing only costs a SHA-256 and an
+# indexed lookup. Each refresh token is single-use: redeeming it deletes
+# it and the caller issues a new one (rotation), so a leaked token stops
+# working as soon as the real client refreshes. Tokens that expire unused
+# are deleted every REFRESH_TOKEN_PURGE_HOURS.
+import os
+import asyncio
+import hashlib
+import secrets
+import sqlite3
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from database import IS_POSTGRES, database, refresh_tokens_table, connect_sqlite
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+REFRESH_TOKEN_PURGE_HOURS = float(os.getenv("REFRESH_TOKEN_PURGE_HOURS", "6"))
+
+def hash_refresh_token(token: str):
+    """Only this hash is stored, so a database leak doesn't leak sessions"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+# Database functions
+async def store_refresh_token_pg(entry: dict):
+    await database.execute(refresh_tokens_table.insert().values(**entry))
+
+def store_refresh_token_sqlite(entry: dict):
+    conn = connect_sqlite()
+    try:
+        conn.execute(
+            'INSERT INTO refresh_tokens (token_hash, user_id, expires_at, created_at) VALUES (?, ?, ?, ?)',
+            (entry["token_hash"], entry["user_id"], entry["expires_at"].isoformat(), entry["created_at"].isoformat())
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+async def take_refresh_token_pg(token_hash: str):
+    """Delete a refresh token and return its row"""
+    query = refresh_tokens_table.delete().where(
+        refresh_tokens_table.c.token_hash == token_hash
+    ).returning(refresh_tokens_table.c.user_id, refresh_tokens_table.c.expires_at)
+    result = await database.fetch_one(query)
+    return dict(result) if result else None
+
+def take_refresh_token_sqlite(token_hash: str):
+    """Delete a refresh token and return its row"""
+    conn = connect_sqlite()
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute(
+            'DELETE FROM refresh_tokens WHERE token_hash = ? RETURNING user_id, expires_at', (token_hash,)
+        ).fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    row = dict(row)
+    row["expires_at"] = datetime.fromisoformat(row["expires_at"])
+    return row
+
+async def delete_expired_refresh_tokens_pg(now: datetime):
+    deleted = refresh_tokens_table.delete().where(
+        refresh_tokens_table.c.expires_at < now
+    ).returning(refresh_tokens_table.c.token_hash).cte("deleted")
+    return await database.fetch_val(select(func.count()).select_from(deleted))
+
+def delete_expired_refresh_tokens_sqlite(now: datetime):
+    conn = connect_sqlite()
+    try:
+        deleted = conn.execute('DELETE FROM refresh_tokens WHERE expires_at < ?', (now.isoformat(),)).rowcount
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
+
+# Wrapper functions to handle both databases
+async def issue_refresh_token(user_id: str):
+    """Create and store a new refresh token for a user"""
+    token = secrets.token_urlsafe(32)
+    now = datetime.utcnow()
+    entry = {
+        "token_hash": hash_refresh_token(token),
+        "user_id": user_id,
+        "expires_at": now + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+        "created_at": now
+    }
+    if IS_POSTGRES:
+        await store_refresh_token_pg(entry)
+    else:
+        store_refresh_token_sqlite(entry)
+    return token
+
+async def redeem_refresh_token(token: str):
+    """Consume a refresh token, returning its user id (None if unknown or expired)"""
+    token_hash = hash_refresh_token(token)
+    if IS_POSTGRES:
+        row = await take_refresh_token_pg(token_hash)
+    else:
+        row = take_refresh_token_sqlite(token_hash)
+    if not row or row["expires_at"] <= datetime.utcnow():
+        return None
+    return row["user_id"]
+
+async def purge_expired_refresh_tokens():
+    """Delete refresh tokens that expired without being redeemed"""
+    if IS_POSTGRES:
+        return await delete_expired_refresh_tokens_pg(datetime.utcnow())
+    return await asyncio.to_thread(delete_expired_refresh_tokens_sqlite, datetime.utcnow())
+
+async def refresh_token_purge_loop():
+    while True:
+        try:
+            deleted = await purge_expired_refresh_tokens()
+            if deleted:
+                print(f"🔑 Deleted {deleted} expired refresh tokens")
+        except Exception as e:
+            print(f"❌ Refresh token purge failed: {e}")
+        await asyncio.sleep(REFRESH_TOKEN_PURGE_HOURS * 3600)
+
+def start_refresh_token_purge():
+    """Schedule the expired refresh token purge on the running event loop"""
+    return asyncio.create_task(refresh_token_purge_loop())
@@ -0,0 +1,100 @@
+# rendering.py - Server-side markdown -> sanitized HTML for explanations
+# Rendered once when an explanation is generated and stored next to the
+# markdown, so the Streamlit page only has to inject ready-made HTML.
+import re
+import hashlib
+from collections import OrderedDict
+from html import escape
+from html.parser import HTMLParser
+
+# Tags the explanation HTML may contain; everything else is dropped
+ALLOWED_TAGS = {
+    "p", "br", "hr", "h1", "h2", "h3", "h4", "h5", "h6",
+    "strong", "em", "b", "i", "code", "pre", "blockquote",
+    "ul", "ol", "li", "a", "table", "thead", "tbody", "tr", "th", "td",
+}
+# Tags whose content is dropped along with the tag
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed"}
+SAFE_URL_SCHEMES = ("http://", "https://", "mailto:")
+
+LIST_ITEM = re.compile(r'^\s*(?:[-*+]|\d+[.)])\s')
+
+# Rendered HTML kept per process, keyed by markdown hash
+RENDER_CACHE_SIZE = 512
+
+class _Sanitizer(HTMLParser):
+    """Rebuild HTML keeping only allowed tags and safe link targets"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip_depth += 1
+            return
+        if self.skip_depth or tag not in ALLOWED_TAGS:
+            return
+        if tag == "a":
+            href = dict(attrs).get("href") or ""
+            if href.lower().startswith(SAFE_URL_SCHEMES):
+                self.parts.append(f'<a href="{escape(href)}" rel="noopener noreferrer" target="_blank">')
+            else:
+                self.parts.append("<a>")
+        else:
+            self.parts.append(f"<{tag}>")
+
+    def handle_startendtag(self, tag, attrs):
+        if not self.skip_depth and tag in ("br", "hr"):
+            self.parts.append(f"<{tag}>")
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self.skip_depth = max(0, self.skip_depth - 1)
+            return
+        if not self.skip_depth and tag in ALLOWED_TAGS and tag not in ("br", "hr"):
+            self.parts.append(f"</{tag}>")
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(escape(data, quote=False))
+
+def sanitize_html(html):
+    sanitizer = _Sanitizer()
+    sanitizer.feed(html)
+    sanitizer.close()
+    return "".join(sanitizer.parts)
+
+def _separate_lists(markdown_text):
+    """Python-Markdown needs a blank line before a list; the model often omits it"""
+    lines = []
+    previous = ""
+    for line in markdown_text.split("\n"):
+        if LIST_ITEM.match(line) and previous.strip() and not LIST_ITEM.match(previous):
+            lines.append("")
+        lines.append(line)
+        previous = line
+    return "\n".join(lines)
+
+_render_cache = OrderedDict()
+
+def render_html(markdown_text):
+    """Render explanation markdown to sanitized HTML (memoized by content hash)"""
+    if not markdown_text:
+        return ""
+    key = hashlib.blake2b(markdown_text.encode("utf-8"), digest_size=16).digest()
+    cached = _render_cache.get(key)
+    if cached is not None:
+        _render_cache.move_to_end(key)
+        return cached
+
+    import markdown
+    html = markdown.markdown(_separate_lists(markdown_text), extensions=["fenced_code", "tables", "sane_lists"])
+    # No blank lines, so the HTML stays a single block when embedded in a
+    # markdown container (&#10; renders the same inside <pre>)
+    html = sanitize_html(html).replace("\n\n", "\n&#10;")
+    _render_cache[key] = html
+    if len(_render_cache) > RENDER_CACHE_SIZE:
+        _render_cache.popitem(last=False)
+    return html
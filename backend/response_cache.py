@@ -0,0 +1,272 @@
+# response_cache.py - Two-tier cache of generated explanations
+# Tier 1 is an in-process LRU, tier 2 is the explanation_cache table so
+# results from the warm-up job survive restarts and are shared by workers.
+import os
+import time
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from database import IS_POSTGRES, database, explanation_cache_table, connect_sqlite
+from topic_index import topic_index
+from catalog import LANGUAGES
+
+CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(24 * 3600)))
+# Cached topics loaded into the similarity index at startup
+TOPIC_INDEX_LOAD_LIMIT = int(os.getenv("TOPIC_INDEX_LOAD_LIMIT", "50000"))
+
+def make_cache_key(topic, level, tone, extras, language):
+    """Hash a topic and its settings into a cache key"""
+    parts = [topic.strip(), level, tone, (extras or "").strip(), language or "English"]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+def is_cacheable(explanation):
+    """Errors and empty answers must never be served from cache"""
+    return bool(explanation) and not explanation.startswith("Error:") \
+        and explanation != "No response generated. Try again."
+
+class ResponseCache:
+    """Thread-safe LRU with a TTL on each entry"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry["value"]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = {
+                "value": value,
+                "expires_at": time.monotonic() + self.ttl_seconds
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+response_cache = ResponseCache()
+
+# Database tier
+async def get_cached_explanation_pg(cache_key: str):
+    query = explanation_cache_table.select().where(
+        explanation_cache_table.c.cache_key == cache_key
+    )
+    result = await database.fetch_one(query)
+    return dict(result) if result else None
+
+def get_cached_explanation_sqlite(cache_key: str):
+    conn = connect_sqlite()
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.cursor()
+        cursor.execute('SELECT * FROM explanation_cache WHERE cache_key = ?', (cache_key,))
+        row = cursor.fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+async def get_cached_explanations_pg(cache_keys):
+    query = explanation_cache_table.select().where(
+        explanation_cache_table.c.cache_key.in_(cache_keys)
+    )
+    return [dict(row) for row in await database.fetch_all(query)]
+
+def get_cached_explanations_sqlite(cache_keys):
+    conn = connect_sqlite()
+    conn.row_factory = sqlite3.Row
+    try:
+        placeholders = ", ".join("?" * len(cache_keys))
+        cursor = conn.execute(f'SELECT * FROM explanation_cache WHERE cache_key IN ({placeholders})', list(cache_keys))
+        return [dict(row) for row in cursor]
+    finally:
+        conn.close()
+
+async def store_cached_explanation_pg(entry: dict):
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    query = pg_insert(explanation_cache_table).values(**entry)
+    query = query.on_conflict_do_update(
+        index_elements=[explanation_cache_table.c.cache_key],
+        set_={"explanation": query.excluded.explanation, "created_at": query.excluded.created_at}
+    )
+    await database.execute(query)
+
+def store_cached_explanation_sqlite(entry: dict):
+    conn = connect_sqlite()
+    try:
+        conn.execute('''
+            INSERT OR REPLACE INTO explanation_cache
+                (cache_key, topic, level, tone, language, extras, explanation, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            entry["cache_key"], entry["topic"], entry["level"], entry["tone"],
+            entry["language"], entry["extras"], entry["explanation"],
+            entry["created_at"].isoformat()
+        ))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _is_fresh(row):
+    created_at = row["created_at"]
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return (datetime.utcnow() - created_at).total_seconds() < CACHE_TTL_SECONDS
+
+async def get_cached_explanation(topic, level, tone, extras, language):
+    """Look up a cached explanation - memory first, then the database"""
+    return await _get_by_cache_key(make_cache_key(topic, level, tone, extras, language))
+
+async def find_cached_explanation(topic, level, tone, extras, language):
+    """Exact cache lookup, falling back to the most similar cached topic
+
+    Returns {"explanation", "exact", "similarity"} or None. The matched
+    topic isn't returned: it's whatever another user typed.
+    """
+    explanation = await get_cached_explanation(topic, level, tone, extras, language)
+    if explanation is not None:
+        return {"explanation": explanation, "exact": True, "similarity": 1.0}
+
+    match = topic_index.find(topic, level, tone, extras, language)
+    if match is None:
+        return None
+    explanation = await _get_by_cache_key(match["cache_key"])
+    if explanation is None:
+        return None
+    return {"explanation": explanation, "exact": False, "similarity": match["similarity"]}
+
+async def find_translation_source(topic, level, tone, extras, language, languages=LANGUAGES):
+    """The same topic and settings cached in another language
+
+    Returns (source_language, explanation) or None, preferring the first
+    language in catalog order (English). Memory is checked for every
+    language before a single database query for all of them.
+    """
+    language = language or "English"
+    keys = {
+        other: make_cache_key(topic, level, tone, extras, other)
+        for other in languages if other != language
+    }
+    for other, cache_key in keys.items():
+        explanation = response_cache.get(cache_key)
+        if explanation is not None:
+            return other, explanation
+    if not keys:
+        return None
+
+    try:
+        if IS_POSTGRES:
+            rows = await get_cached_explanations_pg(list(keys.values()))
+        else:
+            rows = get_cached_explanations_sqlite(list(keys.values()))
+    except Exception as e:
+        print(f"❌ Error reading explanation cache: {e}")
+        return None
+
+    found = {row["cache_key"]: row for row in rows if _is_fresh(row)}
+    for other, cache_key in keys.items():
+        if cache_key in found:
+            response_cache.set(cache_key, found[cache_key]["explanation"])
+            return other, found[cache_key]["explanation"]
+    return None
+
+async def _get_by_cache_key(cache_key):
+    explanation = response_cache.get(cache_key)
+    if explanation is not None:
+        return explanation
+
+    try:
+        if IS_POSTGRES:
+            row = await get_cached_explanation_pg(cache_key)
+        else:
+            row = get_cached_explanation_sqlite(cache_key)
+    except Exception as e:
+        print(f"❌ Error reading explanation cache: {e}")
+        return None
+
+    if row and _is_fresh(row):
+        response_cache.set(cache_key, row["explanation"])
+        return row["explanation"]
+    return None
+
+async def store_cached_explanation(topic, level, tone, extras, language, explanation):
+    """Store an explanation in both cache tiers"""
+    if not is_cacheable(explanation):
+        return
+    cache_key = make_cache_key(topic, level, tone, extras, language)
+    response_cache.set(cache_key, explanation)
+    topic_index.add(topic, level, tone, extras, language, cache_key)
+
+    entry = {
+        "cache_key": cache_key,
+        "topic": topic.strip(),
+        "level": level,
+        "tone": tone,
+        "language": language or "English",
+        "extras": (extras or "").strip(),
+        "explanation": explanation,
+        "created_at": datetime.utcnow()
+    }
+    try:
+        if IS_POSTGRES:
+            await store_cached_explanation_pg(entry)
+        else:
+            store_cached_explanation_sqlite(entry)
+    except Exception as e:
+        print(f"❌ Error writing explanation cache: {e}")
+
+def _recent_cache_topics_sqlite(limit):
+    conn = connect_sqlite()
+    conn.row_factory = sqlite3.Row
+    try:
+        return [dict(row) for row in conn.execute(
+            'SELECT cache_key, topic, level, tone, extras, language FROM explanation_cache '
+            'ORDER BY created_at DESC LIMIT ?', (limit,)
+        )]
+    finally:
+        conn.close()
+
+def _index_topics(rows):
+    # Oldest first, so the index evicts in age order
+    for row in reversed(rows):
+        topic_index.add(row["topic"], row["level"], row["tone"], row["extras"], row["language"], row["cache_key"])
+
+async def load_topic_index(limit=TOPIC_INDEX_LOAD_LIMIT):
+    """Fill the similarity index with the most recent cached topics"""
+    columns = [
+        explanation_cache_table.c.cache_key, explanation_cache_table.c.topic,
+        explanation_cache_table.c.level, explanation_cache_table.c.tone,
+        explanation_cache_table.c.extras, explanation_cache_table.c.language,
+    ]
+    try:
+        if IS_POSTGRES:
+            query = explanation_cache_table.select().with_only_columns(*columns).order_by(
+                explanation_cache_table.c.created_at.desc()
+            ).limit(limit)
+            rows = [dict(row) for row in await database.fetch_all(query)]
+        else:
+            rows = await asyncio.to_thread(_recent_cache_topics_sqlite, limit)
+    except Exception as e:
+        print(f"❌ Error loading topic index: {e}")
+        return
+
+    # Hashing tens of thousands of topics takes a while; keep it off the event loop
+    await asyncio.to_thread(_index_topics, rows)
+    print(f"✅ Topic index loaded with {len(topic_index)} topics")
@@ -0,0 +1,424 @@
+# retention.py - Explanation retention: hot/cold split, archival and rehydration
+# PostgreSQL keeps explanations in monthly partitions (see
+# ensure_explanation_partitions in database.py); SQLite moves rows older
+# than SQLITE_HOT_DAYS from explanations to explanations_cold. Once a month
+# is older than RETENTION_DAYS its rows are written to a compressed JSONL
+# file in ARCHIVE_DIR (zstd when the zstandard package is installed,
+# otherwise gzip), replaced by a stub row in archived_explanations and
+# removed from the database - whole partitions are simply dropped, and
+# bodies nothing references any more are deleted from explanation_blobs. Opening
+# an archived item decompresses only the part of its file that holds it
+# (rehydration).
+#
+#   python retention.py run          # split, archive and create partitions now
+#   python retention.py partition    # convert an existing PostgreSQL explanations table
+import os
+import gzip
+import json
+import zlib
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import sqlalchemy
+
+from database import (
+    IS_POSTGRES, get_engine, connect_sqlite, fetch_one_read, fetch_all_read, sqlite_fetch_one_read,
+    explanations_table, archived_explanations_table, month_start, ensure_explanation_partitions
+)
+from serialization import dumps
+from blob_store import inflate
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+# Months entirely older than this many days are archived (0 keeps everything in the database)
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "0"))
+# SQLite rows older than this move to explanations_cold
+SQLITE_HOT_DAYS = int(os.getenv("SQLITE_HOT_DAYS", "90"))
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "./archive")
+ARCHIVE_COMPRESSION = os.getenv("ARCHIVE_COMPRESSION", "zstd" if HAS_ZSTD else "gzip")
+RETENTION_CHECK_HOURS = float(os.getenv("RETENTION_CHECK_HOURS", "24"))
+# Uncompressed bytes per independently readable archive member
+ARCHIVE_MEMBER_SIZE = int(os.getenv("ARCHIVE_MEMBER_SIZE", "262144"))
+# Rehydrated explanations kept in memory
+REHYDRATE_CACHE_SIZE = int(os.getenv("REHYDRATE_CACHE_SIZE", "256"))
+
+STUB_COLUMNS = ["id", "user_id", "topic", "level", "tone", "language", "extras", "timestamp"]
+ARCHIVE_SUFFIXES = {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz"}
+
+# Archive files
+class ArchiveWriter:
+    """Writes rows to a new archive file as independently compressed members
+
+    Each member holds about ARCHIVE_MEMBER_SIZE bytes of JSONL, so one row
+    can be read back by decompressing only the member at its offset.
+    Concatenated members are still a valid gzip/zstd stream.
+    """
+
+    def __init__(self, month):
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        self.compression = "zstd" if ARCHIVE_COMPRESSION == "zstd" and HAS_ZSTD else "gzip"
+        self.name = f"explanations-{month:%Y-%m}-{datetime.utcnow():%Y%m%d%H%M%S%f}{ARCHIVE_SUFFIXES[self.compression]}"
+        self.path = os.path.join(ARCHIVE_DIR, self.name)
+        # Written under a temporary name so a crash never leaves a truncated archive
+        self.file = open(self.path + ".tmp", "wb")
+        self.buffer = []
+        self.buffered = 0
+        self.count = 0
+
+    def add(self, row):
+        """Append a row and return the offset of the member it's written to"""
+        line = dumps(row) + b"\n"
+        self.buffer.append(line)
+        self.buffered += len(line)
+        self.count += 1
+        offset = self.file.tell()
+        if self.buffered >= ARCHIVE_MEMBER_SIZE:
+            self._flush()
+        return offset
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        data = b"".join(self.buffer)
+        if self.compression == "zstd":
+            self.file.write(zstandard.ZstdCompressor(level=10).compress(data))
+        else:
+            self.file.write(gzip.compress(data, compresslevel=6))
+        self.buffer, self.buffered = [], 0
+
+    def close(self):
+        self._flush()
+        self.file.close()
+        if self.count:
+            os.replace(self.path + ".tmp", self.path)
+        else:
+            os.remove(self.path + ".tmp")
+
+def read_member(name, offset):
+    """Rows of the compressed member starting at offset in an archive file"""
+    with open(os.path.join(ARCHIVE_DIR, name), "rb") as f:
+        f.seek(offset)
+        if name.endswith(".zst"):
+            if not HAS_ZSTD:
+                raise RuntimeError(f"The zstandard package is needed to read {name}")
+            data = zstandard.ZstdDecompressor().stream_reader(f, read_across_frames=False).read()
+        else:
+            decompressor = zlib.decompressobj(wbits=31)
+            chunks = []
+            while not decompressor.eof:
+                chunk = f.read(65536)
+                if not chunk:
+                    break
+                chunks.append(decompressor.decompress(chunk))
+            data = b"".join(chunks)
+    return [json.loads(line) for line in data.splitlines()]
+
+class RehydrateCache:
+    """Small LRU of explanations read back from archive files"""
+
+    def __init__(self, capacity=REHYDRATE_CACHE_SIZE):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, explanation_id):
+        with self._lock:
+            item = self._items.get(explanation_id)
+            if item is not None:
+                self._items.move_to_end(explanation_id)
+            return item
+
+    def put(self, explanation_id, item):
+        with self._lock:
+            self._items[explanation_id] = item
+            self._items.move_to_end(explanation_id)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+rehydrate_cache = RehydrateCache()
+
+# Archiving
+def _bound(timestamp):
+    """Bind value for a timestamp (SQLite stores isoformat strings)"""
+    return timestamp if IS_POSTGRES else timestamp.isoformat()
+
+def _archive_query(source):
+    columns = ", ".join(f"e.{column}" for column in STUB_COLUMNS + ["content_hash"])
+    # Grouped by user so a user's rows share few members
+    return sqlalchemy.text(f'''
+        SELECT {columns},
+               COALESCE(b.explanation, e.explanation) AS explanation,
+               COALESCE(b.explanation_html, e.explanation_html) AS explanation_html,
+               b.codec, b.explanation_compressed, b.explanation_html_compressed
+        FROM {source} e
+        LEFT JOIN explanation_blobs b ON b.content_hash = e.content_hash
+        WHERE e.timestamp >= :start AND e.timestamp < :end
+        ORDER BY e.user_id, e.timestamp
+    ''')
+
+def archive_month(conn, source, month, drop_partition=False):
+    """Archive one month of rows from a table or partition inside conn's transaction"""
+    params = {"start": _bound(month), "end": _bound(month_start(month, 1))}
+    writer = ArchiveWriter(month)
+    stubs = []
+    try:
+        result = conn.execution_options(stream_results=True).execute(_archive_query(source), params)
+        for row in result.mappings():
+            row = inflate(dict(row))
+            stub = {column: row[column] for column in STUB_COLUMNS}
+            stub["archive_offset"] = writer.add(row)
+            stubs.append(stub)
+    finally:
+        writer.close()
+    if not stubs:
+        return 0
+    for stub in stubs:
+        stub["archive"] = writer.name
+    stub_columns = STUB_COLUMNS + ["archive", "archive_offset"]
+    conn.execute(sqlalchemy.text(
+        f'INSERT INTO archived_explanations ({", ".join(stub_columns)}) '
+        f'VALUES ({", ".join(":" + column for column in stub_columns)})'
+    ), stubs)
+    if drop_partition:
+        conn.execute(sqlalchemy.text(f"ALTER TABLE explanations DETACH PARTITION {source}"))
+        conn.execute(sqlalchemy.text(f"DROP TABLE {source}"))
+    else:
+        conn.execute(sqlalchemy.text(f"DELETE FROM {source} WHERE id = :id"), [{"id": stub["id"]} for stub in stubs])
+    return len(stubs)
+
+def _oldest(conn, source, cutoff):
+    oldest = conn.execute(
+        sqlalchemy.text(f"SELECT MIN(timestamp) FROM {source} WHERE timestamp < :cutoff"),
+        {"cutoff": _bound(cutoff)}
+    ).scalar()
+    if oldest is None:
+        return None
+    return oldest if isinstance(oldest, datetime) else datetime.fromisoformat(oldest)
+
+def _partitions(conn):
+    """Monthly partitions of explanations as {month start: name}"""
+    names = [row[0] for row in conn.execute(sqlalchemy.text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass('explanations')"
+    ))]
+    return {
+        datetime.strptime(name[len("explanations_p"):], "%Y_%m"): name
+        for name in names if name.startswith("explanations_p")
+    }
+
+def archive_before(cutoff):
+    """Archive every month that ends on or before cutoff
+
+    Returns (rows archived, bodies deleted).
+    """
+    cutoff = month_start(cutoff)
+    archived = 0
+    engine = get_engine()
+    with engine.connect() as conn:
+        if IS_POSTGRES:
+            partitions = _partitions(conn)
+            for month in sorted(month for month in partitions if month < cutoff):
+                archived += archive_month(conn, partitions[month], month, drop_partition=True)
+                conn.commit()
+            # Rows outside the monthly partitions, or the whole table if it isn't partitioned
+            sources = ["explanations_default"] if partitions else ["explanations"]
+        else:
+            sources = ["explanations_cold", "explanations"]
+        for source in sources:
+            month = _oldest(conn, source, cutoff)
+            while month is not None and month_start(month) < cutoff:
+                archived += archive_month(conn, source, month_start(month))
+                conn.commit()
+                month = _oldest(conn, source, cutoff)
+        deleted_blobs = 0
+        if archived:
+            deleted_blobs = delete_orphan_blobs(conn, cutoff, ["explanations"] if IS_POSTGRES else ["explanations", "explanations_cold"])
+            conn.commit()
+    return archived, deleted_blobs
+
+def delete_orphan_blobs(conn, cutoff, sources):
+    """Delete bodies created before cutoff that no explanation references any more"""
+    if IS_POSTGRES:
+        # NOT EXISTS plans as a hash anti-join on PostgreSQL
+        unreferenced = " AND ".join(
+            f"NOT EXISTS (SELECT 1 FROM {source} e WHERE e.content_hash = explanation_blobs.content_hash)"
+            for source in sources
+        )
+    else:
+        # SQLite builds one temporary index for NOT IN instead of scanning per blob
+        unreferenced = " AND ".join(
+            f"content_hash NOT IN (SELECT content_hash FROM {source} WHERE content_hash IS NOT NULL)"
+            for source in sources
+        )
+    return conn.execute(sqlalchemy.text(
+        f"DELETE FROM explanation_blobs WHERE created_at < :cutoff AND {unreferenced}"
+    ), {"cutoff": _bound(cutoff)}).rowcount
+
+def split_sqlite(hot_days=SQLITE_HOT_DAYS):
+    """Move SQLite explanations older than hot_days to explanations_cold"""
+    cutoff = (datetime.utcnow() - timedelta(days=hot_days)).replace(hour=0, minute=0, second=0, microsecond=0)
+    columns = ", ".join(column.name for column in explanations_table.columns)
+    with get_engine().begin() as conn:
+        moved = conn.execute(sqlalchemy.text(
+            f"INSERT OR IGNORE INTO explanations_cold ({columns}) "
+            f"SELECT {columns} FROM explanations WHERE timestamp < :cutoff"
+        ), {"cutoff": cutoff.isoformat()}).rowcount
+        conn.execute(sqlalchemy.text("DELETE FROM explanations WHERE timestamp < :cutoff"), {"cutoff": cutoff.isoformat()})
+    return moved
+
+def run_retention(retention_days=RETENTION_DAYS):
+    """One maintenance pass: partitions or hot/cold split, then archival"""
+    report = {"moved_to_cold": 0, "archived": 0, "deleted_blobs": 0}
+    if IS_POSTGRES:
+        report["partitions_created"] = ensure_explanation_partitions()
+    else:
+        report["moved_to_cold"] = split_sqlite()
+    if retention_days > 0:
+        report["archived"], report["deleted_blobs"] = archive_before(datetime.utcnow() - timedelta(days=retention_days))
+    return report
+
+async def retention_loop():
+    while True:
+        await asyncio.sleep(RETENTION_CHECK_HOURS * 3600)
+        try:
+            report = await asyncio.to_thread(run_retention)
+            if report["moved_to_cold"] or report["archived"]:
+                print(f"📦 Retention: {report['moved_to_cold']} moved to cold storage, {report['archived']} archived, "
+                      f"{report['deleted_blobs']} bodies deleted")
+        except Exception as e:
+            print(f"❌ Retention pass failed: {e}")
+
+def start_retention():
+    """Schedule periodic retention passes on the running event loop"""
+    return asyncio.create_task(retention_loop())
+
+# Reading archived history
+async def get_archived_history(user_id, since=None, limit=20, oldest_first=False):
+    """Newest (or, with oldest_first, oldest) archived stubs for a user
+
+    Bodies are rehydrated on demand.
+    """
+    stubs = archived_explanations_table
+    if IS_POSTGRES:
+        query = stubs.select().where(stubs.c.user_id == user_id)
+        if since is not None:
+            query = query.where(stubs.c.timestamp > since)
+        order = stubs.c.timestamp.asc() if oldest_first else stubs.c.timestamp.desc()
+        rows = [dict(row) for row in await fetch_all_read(query.order_by(order).limit(limit), key=user_id)]
+    else:
+        conn = connect_sqlite(read_only=True, key=user_id)
+        try:
+            cursor = conn.execute(
+                'SELECT * FROM archived_explanations WHERE user_id = ? AND timestamp > ? '
+                f'ORDER BY timestamp {"ASC" if oldest_first else "DESC"} LIMIT ?',
+                (user_id, since.isoformat() if since else "", limit)
+            )
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    for row in rows:
+        row.pop("archive")
+        row.pop("archive_offset")
+        row.update(explanation=None, explanation_html=None, archived=True)
+    return rows
+
+async def rehydrate_explanation(user_id, explanation_id):
+    """Read an archived explanation back from its archive file (None if not archived)"""
+    item = rehydrate_cache.get(explanation_id)
+    if item is not None and item["user_id"] == user_id:
+        return item
+    if IS_POSTGRES:
+        stubs = archived_explanations_table
+        stub = await fetch_one_read(
+            stubs.select().where((stubs.c.id == explanation_id) & (stubs.c.user_id == user_id)), key=user_id
+        )
+        stub = dict(stub) if stub else None
+    else:
+        stub = sqlite_fetch_one_read(
+            'SELECT * FROM archived_explanations WHERE id = ? AND user_id = ?', (explanation_id, user_id), key=user_id
+        )
+    if not stub:
+        return None
+    rows = await asyncio.to_thread(read_member, stub["archive"], stub["archive_offset"])
+    item = next((row for row in rows if row["id"] == explanation_id), None)
+    if item is None:
+        return None
+    item["archived"] = True
+    rehydrate_cache.put(explanation_id, item)
+    return item
+
+async def archived_items_for_user(user_id):
+    """Every archived explanation of a user, oldest first, one archive member at a time"""
+    stubs = archived_explanations_table
+    if IS_POSTGRES:
+        query = sqlalchemy.select(stubs.c.archive, stubs.c.archive_offset).where(stubs.c.user_id == user_id).distinct()
+        members = [(row["archive"], row["archive_offset"]) for row in await fetch_all_read(query, key=user_id)]
+    else:
+        conn = connect_sqlite(read_only=True, key=user_id)
+        try:
+            members = conn.execute(
+                'SELECT DISTINCT archive, archive_offset FROM archived_explanations WHERE user_id = ?', (user_id,)
+            ).fetchall()
+        finally:
+            conn.close()
+    # Names start with the archived month, so they sort chronologically
+    for name, offset in sorted(members):
+        for row in await asyncio.to_thread(read_member, name, offset):
+            if row["user_id"] == user_id:
+                yield row
+
+# Converting an existing PostgreSQL table
+def partition_pg():
+    """Replace an unpartitioned explanations table with a monthly-partitioned copy"""
+    engine = get_engine()
+    with engine.begin() as conn:
+        if conn.execute(sqlalchemy.text(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass('explanations')"
+        )).first():
+            print("✅ explanations is already partitioned")
+            return
+        # Free the table's index and constraint names for the new table
+        conn.execute(sqlalchemy.text("ALTER TABLE explanations RENAME TO explanations_unpartitioned"))
+        for (index_name,) in conn.execute(sqlalchemy.text(
+            "SELECT indexname FROM pg_indexes WHERE tablename = 'explanations_unpartitioned'"
+        )).fetchall():
+            conn.execute(sqlalchemy.text(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_unpartitioned"'))
+        explanations_table.create(conn)
+        oldest = conn.execute(sqlalchemy.text("SELECT MIN(timestamp) FROM explanations_unpartitioned")).scalar()
+    ensure_explanation_partitions(start=oldest)
+    columns = ", ".join(column.name for column in explanations_table.columns)
+    with engine.begin() as conn:
+        copied = conn.execute(sqlalchemy.text(
+            f"INSERT INTO explanations ({columns}) SELECT {columns} FROM explanations_unpartitioned"
+        )).rowcount
+        conn.execute(sqlalchemy.text("DROP TABLE explanations_unpartitioned"))
+        conn.execute(sqlalchemy.text("ANALYZE explanations"))
+    print(f"✅ Copied {copied} explanations into monthly partitions")
+
+if __name__ == "__main__":
+    from database import create_tables
+
+    parser = argparse.ArgumentParser(description="Explanation retention and archival")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Split, archive and create partitions now")
+    run_parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    subparsers.add_parser("partition", help="Convert an existing PostgreSQL explanations table")
+    args = parser.parse_args()
+
+    if args.command == "partition":
+        if not IS_POSTGRES:
+            parser.error("Partitioning needs PostgreSQL; SQLite uses the hot/cold split")
+        partition_pg()
+    else:
+        create_tables()
+        report = run_retention(args.retention_days)
+        print(f"✅ {report['moved_to_cold']} moved to cold storage, {report['archived']} archived, "
+              f"{report['deleted_blobs']} bodies deleted")
@@ -0,0 +1,184 @@
+# scheduler.py - Priority scheduling of model calls
+# Every upstream model call takes one of MODEL_CONCURRENCY slots. Waiting
+# calls are served strictly by class (interactive > deeper dive > batch),
+# and within a class by weighted fair queuing across users, so one user's
+# burst can't starve the others. Batch work (warm-up, pre-generation) may
+# only hold batch_limit slots; that limit backs off whenever interactive
+# queue-wait p95 goes over INTERACTIVE_WAIT_P95_MS and creeps back up while
+# it's comfortably under. Full queues reject new work (QueueFull) instead
+# of letting it pile up behind deadlines it can't meet.
+import os
+import time
+import heapq
+import asyncio
+import itertools
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+
+INTERACTIVE, DEEPER_DIVE, BATCH = 0, 1, 2
+PRIORITIES = {"interactive": INTERACTIVE, "deeper_dive": DEEPER_DIVE, "batch": BATCH}
+PRIORITY_NAMES = {value: name for name, value in PRIORITIES.items()}
+
+MODEL_CONCURRENCY = int(os.getenv("MODEL_CONCURRENCY", "8"))
+# Slots batch work can never take, whatever the current batch limit
+INTERACTIVE_RESERVED_SLOTS = int(os.getenv("INTERACTIVE_RESERVED_SLOTS", "2"))
+INTERACTIVE_WAIT_P95_MS = float(os.getenv("INTERACTIVE_WAIT_P95_MS", "250"))
+BATCH_ADJUST_SECONDS = float(os.getenv("BATCH_ADJUST_SECONDS", "5"))
+# Admission control: queued calls per class and per user
+MAX_QUEUED = {
+    INTERACTIVE: int(os.getenv("MAX_QUEUED_INTERACTIVE", "200")),
+    DEEPER_DIVE: int(os.getenv("MAX_QUEUED_DEEPER_DIVE", "100")),
+    BATCH: int(os.getenv("MAX_QUEUED_BATCH", "10000")),
+}
+MAX_QUEUED_PER_USER = int(os.getenv("MAX_QUEUED_PER_USER", "4"))
+# Queue-wait samples kept per class for the percentiles
+WAIT_WINDOW = 500
+
+class QueueFull(Exception):
+    """Admission control turned the call away; retry later"""
+
+def _percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+class Scheduler:
+    """Priority classes, fair queuing within a class, adaptive batch share"""
+
+    def __init__(self, slots=MODEL_CONCURRENCY, reserved=INTERACTIVE_RESERVED_SLOTS):
+        self.slots = slots
+        self.batch_max = max(slots - reserved, 1)
+        self.batch_limit = self.batch_max
+        self.running = Counter()
+        self.queues = {priority: [] for priority in PRIORITY_NAMES}
+        self.depth = Counter()
+        # Start-time fair queuing: per-class virtual time and per-user finish tags
+        self.virtual = Counter()
+        self.finish = {priority: {} for priority in PRIORITY_NAMES}
+        self.queued_by_user = Counter()
+        self.waits = {priority: deque(maxlen=WAIT_WINDOW) for priority in PRIORITY_NAMES}
+        self.admitted = Counter()
+        self.rejected = Counter()
+        self._sequence = itertools.count()
+        self._adjusted_at = time.monotonic()
+        # Interactive waits since the last adjustment
+        self._recent = []
+
+    def _can_run(self, priority):
+        if sum(self.running.values()) >= self.slots:
+            return False
+        return priority != BATCH or self.running[BATCH] < self.batch_limit
+
+    def _admit(self, priority, key):
+        if self.depth[priority] >= MAX_QUEUED[priority] or \
+                (priority != BATCH and self.queued_by_user[key] >= MAX_QUEUED_PER_USER):
+            self.rejected[priority] += 1
+            raise QueueFull(f"{PRIORITY_NAMES[priority]} queue is full")
+        self.admitted[priority] += 1
+
+    def _dequeue(self, priority, key):
+        self.depth[priority] -= 1
+        self.queued_by_user[key] -= 1
+        if not self.queued_by_user[key]:
+            del self.queued_by_user[key]
+
+    def _start(self, priority, waited):
+        self.running[priority] += 1
+        self.waits[priority].append(waited)
+        if priority == INTERACTIVE:
+            self._recent.append(waited)
+        self._adjust()
+
+    def _adjust(self):
+        """AIMD on the batch limit against the interactive queue-wait target"""
+        now = time.monotonic()
+        if now - self._adjusted_at < BATCH_ADJUST_SECONDS:
+            return
+        self._adjusted_at = now
+        p95 = _percentile(self._recent, 0.95) * 1000
+        self._recent = []
+        for priority, finish in self.finish.items():
+            # Users with nothing queued and no credit left start fresh next time
+            for key in [key for key, tag in finish.items() if tag <= self.virtual[priority]]:
+                del finish[key]
+        if p95 > INTERACTIVE_WAIT_P95_MS:
+            self.batch_limit = max(self.batch_limit // 2, 1)
+        elif p95 < INTERACTIVE_WAIT_P95_MS / 2:
+            self.batch_limit = min(self.batch_limit + 1, self.batch_max)
+
+    def _dispatch(self):
+        """Hand free slots to the best waiting calls"""
+        for priority in sorted(self.queues):
+            queue = self.queues[priority]
+            while queue and self._can_run(priority):
+                tag, _, key, enqueued, future = heapq.heappop(queue)
+                if future.done():
+                    continue
+                self.virtual[priority] = tag
+                self._dequeue(priority, key)
+                self._start(priority, time.monotonic() - enqueued)
+                future.set_result(None)
+            if queue:
+                # Lower classes wait until this one is drained
+                return
+
+    async def acquire(self, priority=INTERACTIVE, key=None, cost=1.0, weight=1.0):
+        """Wait for a slot; pair every successful acquire with release"""
+        if self._can_run(priority) and not any(self.depth[p] for p in PRIORITY_NAMES if p <= priority):
+            self.admitted[priority] += 1
+            self._start(priority, 0.0)
+            return
+        self._admit(priority, key)
+        finish = self.finish[priority]
+        tag = max(self.virtual[priority], finish.get(key, 0.0))
+        finish[key] = tag + cost / weight
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queues[priority], (tag, next(self._sequence), key, time.monotonic(), future))
+        self.depth[priority] += 1
+        self.queued_by_user[key] += 1
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted a slot just as it was cancelled
+                self.release(priority)
+            else:
+                future.cancel()
+                self._dequeue(priority, key)
+            raise
+
+    def release(self, priority=INTERACTIVE):
+        self.running[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority=INTERACTIVE, key=None, cost=1.0):
+        """Hold one model-call slot for the duration of the block"""
+        await self.acquire(priority, key, cost)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def snapshot(self):
+        """Queue depth, running calls and queue-wait percentiles per class"""
+        classes = {}
+        for priority, name in PRIORITY_NAMES.items():
+            waits = self.waits[priority]
+            classes[name] = {
+                "queued": self.depth[priority],
+                "running": self.running[priority],
+                "admitted": self.admitted[priority],
+                "rejected": self.rejected[priority],
+                "wait_p50_ms": round(_percentile(waits, 0.5) * 1000, 1),
+                "wait_p95_ms": round(_percentile(waits, 0.95) * 1000, 1),
+            }
+        return {
+            "slots": self.slots,
+            "batch_limit": self.batch_limit,
+            "interactive_wait_p95_target_ms": INTERACTIVE_WAIT_P95_MS,
+            "classes": classes,
+        }
+
+scheduler = Scheduler()
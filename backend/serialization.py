@@ -0,0 +1,32 @@
+# serialization.py - Fast JSON responses and ETags
+import json
+import hashlib
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    from fastapi.responses import ORJSONResponse
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+# Default response class for the app - orjson when available
+FastJSONResponse = ORJSONResponse if HAS_ORJSON else JSONResponse
+
+def dumps(content) -> bytes:
+    """Serialize content to compact JSON bytes"""
+    if HAS_ORJSON:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), separators=(",", ":")).encode("utf-8")
+
+def make_etag(body: bytes) -> str:
+    """Weak ETag for a serialized body (weak so it survives compression)"""
+    return f'W/"{hashlib.sha1(body).hexdigest()}"'
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    """Check an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or etag[2:] in candidates
@@ -0,0 +1,141 @@
+# stats.py - In-memory counters for users, explanations and their breakdowns
+# Health checks and dashboards read these instead of running COUNT(*).
+# A baseline is loaded at startup and every STATS_REFRESH_SECONDS - from
+# catalog estimates on PostgreSQL (pg_class.reltuples and the planner's
+# most-common-value statistics, no table scans), exact counts on SQLite -
+# and this process's own writes are added on top as they happen. Totals
+# include archived explanations, so they don't drop when a month is archived.
+import os
+import time
+import asyncio
+import threading
+from collections import Counter
+from datetime import datetime
+
+from database import IS_POSTGRES, connect_sqlite, fetch_all_read
+
+STATS_REFRESH_SECONDS = int(os.getenv("STATS_REFRESH_SECONDS", "300"))
+BREAKDOWN_COLUMNS = ("language", "level")
+
+class Stats:
+    """Thread-safe aggregate counters"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.users = 0
+        self.explanations = 0
+        self.breakdowns = {column: Counter() for column in BREAKDOWN_COLUMNS}
+        self.source = None
+        self.refreshed_at = None
+
+    def record_users(self, count=1):
+        with self._lock:
+            self.users += count
+
+    def record_explanation(self, language, level):
+        with self._lock:
+            self.explanations += 1
+            self.breakdowns["language"][language or "English"] += 1
+            self.breakdowns["level"][level] += 1
+
+    def load(self, baseline):
+        """Replace the counters with a freshly loaded baseline"""
+        with self._lock:
+            self.users = baseline["users"]
+            self.explanations = baseline["explanations"]
+            self.breakdowns = {column: Counter(baseline[column]) for column in BREAKDOWN_COLUMNS}
+            self.source = baseline["source"]
+            self.refreshed_at = datetime.utcnow()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "total_users": self.users,
+                "total_explanations": self.explanations,
+                "explanations_by_language": dict(self.breakdowns["language"].most_common()),
+                "explanations_by_level": dict(self.breakdowns["level"].most_common()),
+                "source": self.source,
+                "refreshed_at": self.refreshed_at
+            }
+
+stats = Stats()
+
+# Baselines
+# Every table holding explanation rows: explanations itself (or, once it's
+# partitioned, its partitions - autovacuum never analyzes a partitioned
+# parent, so it has no statistics of its own) and the archived stubs
+EXPLANATION_RELATIONS = (
+    "SELECT c.oid FROM pg_class c WHERE c.relkind = 'r' "
+    "AND c.oid IN (to_regclass('explanations'), to_regclass('archived_explanations')) "
+    "UNION SELECT i.inhrelid FROM pg_inherits i WHERE i.inhparent = to_regclass('explanations')"
+)
+
+async def load_baseline_pg():
+    """Row estimates and value frequencies from the planner statistics"""
+    estimates = {
+        row["name"]: row["estimate"] for row in await fetch_all_read(
+            "SELECT 'users' AS name, GREATEST(reltuples, 0)::bigint AS estimate FROM pg_class "
+            "WHERE oid = to_regclass('users') "
+            "UNION ALL SELECT 'explanations', COALESCE(SUM(GREATEST(reltuples, 0)), 0)::bigint FROM pg_class "
+            f"WHERE oid IN ({EXPLANATION_RELATIONS})"
+        )
+    }
+    baseline = {"source": "estimate"}
+    for table in ("users", "explanations"):
+        baseline[table] = int(estimates.get(table) or 0)
+
+    # Each table's most-common-value frequencies, weighted by its row estimate
+    breakdowns = {column: Counter() for column in BREAKDOWN_COLUMNS}
+    for row in await fetch_all_read(
+        "SELECT s.attname, s.most_common_vals::text::text[] AS vals, s.most_common_freqs AS freqs, "
+        "GREATEST(c.reltuples, 0) AS estimate "
+        "FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "JOIN pg_stats s ON s.schemaname = n.nspname AND s.tablename = c.relname AND NOT s.inherited "
+        f"WHERE c.oid IN ({EXPLANATION_RELATIONS}) AND s.attname IN ('language', 'level')"
+    ):
+        for value, freq in zip(row["vals"] or [], row["freqs"] or []):
+            breakdowns[row["attname"]][value] += freq * row["estimate"]
+    for column in BREAKDOWN_COLUMNS:
+        baseline[column] = Counter({value: round(count) for value, count in breakdowns[column].items()})
+    return baseline
+
+def load_baseline_sqlite():
+    """Exact counts - local SQLite databases are small (hot, cold and archived rows)"""
+    tables = ("explanations", "explanations_cold", "archived_explanations")
+    conn = connect_sqlite(read_only=True)
+    try:
+        baseline = {
+            "source": "exact",
+            "users": conn.execute('SELECT COUNT(*) FROM users').fetchone()[0],
+            "explanations": conn.execute(
+                'SELECT ' + ' + '.join(f'(SELECT COUNT(*) FROM {table})' for table in tables)
+            ).fetchone()[0],
+        }
+        for column in BREAKDOWN_COLUMNS:
+            rows = ' UNION ALL '.join(f'SELECT {column} FROM {table}' for table in tables)
+            baseline[column] = Counter(dict(conn.execute(
+                f'SELECT COALESCE({column}, \'Unknown\'), COUNT(*) FROM ({rows}) GROUP BY 1'
+            ).fetchall()))
+        return baseline
+    finally:
+        conn.close()
+
+async def refresh_stats():
+    """Reload the baseline; errors keep the current counters"""
+    started = time.perf_counter()
+    try:
+        baseline = await load_baseline_pg() if IS_POSTGRES else load_baseline_sqlite()
+    except Exception as e:
+        print(f"❌ Error loading stats: {e}")
+        return
+    stats.load(baseline)
+    print(f"📊 Stats refreshed ({baseline['source']}, {(time.perf_counter() - started) * 1000:.0f} ms)")
+
+async def stats_loop():
+    while True:
+        await asyncio.sleep(STATS_REFRESH_SECONDS)
+        await refresh_stats()
+
+def start_stats_refresh():
+    """Schedule periodic baseline reloads on the running event loop"""
+    return asyncio.create_task(stats_loop())
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+import explain_engine
+from scheduler import QueueFull
+
+class FakeResponse:
+    text = "summary"
+
+def test_failing_chunk_cancels_its_siblings(monkeypatch):
+    started, cancelled = [], []
+
+    async def fake_generate(prompt, max_output_tokens, *args, **kwargs):
+        chunk = prompt.rsplit("\n", 1)[-1]
+        started.append(chunk)
+        if chunk == "bad":
+            raise QueueFull("interactive queue is full")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(chunk)
+            raise
+        return FakeResponse()
+
+    async def run():
+        with pytest.raises(QueueFull):
+            await explain_engine.summarize_chunks_async(["one", "bad", "two", "three", "four", "five"])
+        await asyncio.sleep(0)
+        # Chunks already running were cancelled; the rest never started
+        assert cancelled and set(cancelled) == set(started) - {"bad"}
+        assert "five" not in started
+
+    monkeypatch.setattr(explain_engine, "SUMMARY_WORKERS", 4)
+    monkeypatch.setattr(explain_engine, "_generate_async", fake_generate)
+    asyncio.run(run())
+
+def test_summaries_keep_chunk_order(monkeypatch):
+    async def fake_generate(prompt, max_output_tokens, *args, **kwargs):
+        chunk = prompt.rsplit("\n", 1)[-1]
+        await asyncio.sleep(0.01 if chunk == "first" else 0)
+        response = FakeResponse()
+        response.text = chunk.upper()
+        return response
+
+    monkeypatch.setattr(explain_engine, "_generate_async", fake_generate)
+    assert asyncio.run(explain_engine.summarize_chunks_async(["first", "second"])) == ["FIRST", "SECOND"]
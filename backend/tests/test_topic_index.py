@@ -0,0 +1,35 @@
+from topic_index import TopicIndex, canonicalize_topic
+
+SETTINGS = ("Beginner", "Casual", "", "English")
+
+def index_with(*topics):
+    index = TopicIndex()
+    for number, topic in enumerate(topics):
+        index.add(topic, *SETTINGS, cache_key=f"key_{number}")
+    return index
+
+def test_question_phrasings_share_a_canonical_form():
+    assert canonicalize_topic("How do black holes work?") == "black hole"
+    assert canonicalize_topic("black holes explained") == "black hole"
+    assert canonicalize_topic("What are black holes?") == "black hole"
+
+def test_question_phrasing_finds_cached_topic():
+    match = index_with("black holes explained").find("How do black holes work?", *SETTINGS)
+    assert match is not None
+    assert match["cache_key"] == "key_0"
+    assert match["similarity"] == 1.0
+
+def test_single_letter_words_are_kept():
+    assert canonicalize_topic("Vitamin A") == "vitamin a"
+    assert canonicalize_topic("Vitamin A") != canonicalize_topic("Vitamin")
+
+def test_vitamin_a_does_not_match_vitamin():
+    assert index_with("Vitamin").find("Vitamin A", *SETTINGS) is None
+    assert index_with("Vitamin A").find("Vitamin", *SETTINGS) is None
+
+def test_numerals_must_match():
+    assert index_with("World War I").find("World War II", *SETTINGS) is None
+
+def test_misspelling_still_matches():
+    match = index_with("quantum entanglement").find("quantum entanglment", *SETTINGS)
+    assert match is not None and match["cache_key"] == "key_0"
@@ -0,0 +1,106 @@
+# token_budget.py - Prompt-size control for explanation requests
+import os
+
+# Rough token estimate used for budgeting (Gemini averages ~4 characters per token)
+CHARS_PER_TOKEN = 4
+
+# Inputs up to this size are explained directly
+MAX_INPUT_TOKENS = int(os.getenv("MAX_INPUT_TOKENS", "6000"))
+# Larger inputs are split into chunks of this size and summarized in parallel
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "3000"))
+# Anything past this is cut off before chunking so one paste can't fan out forever
+HARD_INPUT_TOKENS = int(os.getenv("HARD_INPUT_TOKENS", "48000"))
+# Output cap for each chunk summary
+SUMMARY_OUTPUT_TOKENS = int(os.getenv("SUMMARY_OUTPUT_TOKENS", "512"))
+
+# Output caps per understanding level
+LEVEL_OUTPUT_TOKENS = {
+    "Beginner": 1024,
+    "Intermediate": 1536,
+    "Advanced": 2048,
+}
+DEFAULT_OUTPUT_TOKENS = 1536
+
+def count_tokens(text):
+    """Estimate the number of tokens in a piece of text"""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+def output_token_cap(level):
+    """Get the max_output_tokens setting for an understanding level"""
+    return LEVEL_OUTPUT_TOKENS.get(level, DEFAULT_OUTPUT_TOKENS)
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text down to roughly max_tokens, preferring a paragraph or sentence boundary"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    for boundary in ("\n\n", "\n", ". "):
+        index = cut.rfind(boundary)
+        if index > max_chars // 2:
+            return cut[:index + len(boundary)].rstrip()
+    return cut
+
+def split_into_chunks(text, chunk_tokens=CHUNK_TOKENS):
+    """Split text into chunks of at most chunk_tokens, keeping paragraphs together"""
+    max_chars = chunk_tokens * CHARS_PER_TOKEN
+    chunks = []
+    current = ""
+    for paragraph in text.split("\n\n"):
+        # Paragraphs that are too big on their own get hard-split
+        while len(paragraph) > max_chars:
+            piece = truncate_to_tokens(paragraph, chunk_tokens)
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(piece)
+            paragraph = paragraph[len(piece):].lstrip()
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            chunks.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current.strip():
+        chunks.append(current)
+    return chunks
+
+def plan_budget(topic, level):
+    """Decide how to fit the user's input into the prompt budget
+
+    Returns a dict with the strategy ("direct", "map_reduce"), the text or
+    chunks to send, and the numbers that end up in the response metadata.
+    """
+    input_tokens = count_tokens(topic)
+    truncated = input_tokens > HARD_INPUT_TOKENS
+    text = truncate_to_tokens(topic, HARD_INPUT_TOKENS) if truncated else topic
+
+    plan = {
+        "strategy": "direct",
+        "text": text,
+        "chunks": [],
+        "input_tokens": input_tokens,
+        "input_token_limit": MAX_INPUT_TOKENS,
+        "truncated": truncated,
+        "max_output_tokens": output_token_cap(level),
+    }
+    if count_tokens(text) > MAX_INPUT_TOKENS:
+        plan["strategy"] = "map_reduce"
+        plan["chunks"] = split_into_chunks(text)
+    return plan
+
+def budget_metadata(plan, prompt_tokens, usage=None):
+    """Build the budget report returned with an explanation"""
+    metadata = {
+        "strategy": plan["strategy"],
+        "input_tokens": plan["input_tokens"],
+        "input_token_limit": plan["input_token_limit"],
+        "truncated": plan["truncated"],
+        "chunks": len(plan["chunks"]),
+        "prompt_tokens": prompt_tokens,
+        "max_output_tokens": plan["max_output_tokens"],
+    }
+    if usage:
+        metadata["usage"] = usage
+    return metadata
@@ -0,0 +1,196 @@
+# topic_index.py - Topic canonicalization and near-duplicate lookup
+# "What are black holes?", "How do black holes work?" and "black holes
+# explained" all canonicalize to "black hole": question phrasings around the
+# topic are stripped, words inside it are kept ("Vitamin A" stays "vitamin
+# a"). Topics that still differ are compared by MinHash signatures over
+# character trigrams, computed with NumPy. A match must also share most of
+# its words (allowing typos) and exactly the same numerals/ordinals, so
+# "Vitamin A" never matches "Vitamin" and "World War II" never "World War I".
+import os
+import re
+import zlib
+import difflib
+import threading
+import numpy as np
+
+# Minimum estimated similarity (0-1) to reuse another topic's explanation
+TOPIC_SIMILARITY_THRESHOLD = float(os.getenv("TOPIC_SIMILARITY_THRESHOLD", "0.7"))
+# Minimum share of words two topics must have in common to match
+TOPIC_WORD_OVERLAP = float(os.getenv("TOPIC_WORD_OVERLAP", "0.75"))
+# Two words count as the same if they're this close (misspellings)
+WORD_MATCH_RATIO = 0.8
+# Topics remembered per settings bucket
+TOPIC_INDEX_MAX_TOPICS = int(os.getenv("TOPIC_INDEX_MAX_TOPICS", "20000"))
+
+NUM_PERMUTATIONS = 64
+MINHASH_PRIME = np.uint64((1 << 61) - 1)
+MINHASH_MAX = np.uint64((1 << 32) - 1)
+_rng = np.random.default_rng(20240601)
+# Universal hashing (a * x + b) mod p; the multiply wraps in uint64 on
+# purpose - small coefficients would leave shingle order unpermuted
+_MINHASH_A = _rng.integers(1, (1 << 61) - 1, NUM_PERMUTATIONS, dtype=np.uint64)
+_MINHASH_B = _rng.integers(0, (1 << 61) - 1, NUM_PERMUTATIONS, dtype=np.uint64)
+
+# + and # stay: "C++" and "C#" are different topics
+NON_WORD = re.compile(r"[^\w\s+#]")
+# Phrasings around a topic that say nothing about the topic itself. Only
+# whole frames at the start or end are stripped, so words that can be part
+# of a topic ("a", "work", "how") survive anywhere else.
+HOW_IT_WORKS = re.compile(r"^how (?:do|does|did|can) (.+) (?:work|works|happen|function)$")
+LEADING_FRAME = re.compile(
+    r"^(?:please|can you|could you|explain|describe|define|tell me about|whats|"
+    r"what (?:is|are|was|were)|who (?:is|was)|why (?:is|are|do|does)|how (?:is|are|do|does|did)|"
+    r"the|an|a) "
+)
+TRAILING_FRAME = re.compile(r" (?:explained|explanation|in simple terms|simply)$")
+# Numbers, ordinals and roman numerals up to 39: "1990s", "2nd", "third", "ii"
+NUMERAL = re.compile(
+    r"^(\d+(st|nd|rd|th)?|first|second|third|fourth|fifth|sixth|seventh|eighth|ninth|tenth"
+    r"|x{0,3}(ix|iv|v?i{0,3}))$"
+)
+
+def normalize_topic(topic):
+    """Lowercase, drop punctuation and question phrasing, collapse whitespace"""
+    words = " ".join(NON_WORD.sub(" ", topic.lower().replace("'", "").replace("\u2019", "")).split())
+    text = HOW_IT_WORKS.sub(r"\1", words)
+    previous = None
+    while text != previous:
+        previous = text
+        text = TRAILING_FRAME.sub("", LEADING_FRAME.sub("", text))
+    return text or words
+
+def stem(word):
+    """Light suffix-stripping stemmer (holes -> hole, studies -> study, computing -> comput)"""
+    if len(word) <= 3:
+        return word
+    for suffix, replacement in (("ies", "y"), ("sses", "ss"), ("ing", ""), ("ed", ""), ("es", "e"), ("s", "")):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            if suffix == "s" and word.endswith("ss"):
+                return word
+            return word[:-len(suffix)] + replacement
+    return word
+
+def canonicalize_topic(topic):
+    """Normalized, stemmed form of a topic used for near-duplicate matching"""
+    return " ".join(stem(word) for word in normalize_topic(topic).split())
+
+def topic_shape(canonical):
+    """Numerals of a canonical topic; only topics with equal shapes are compared"""
+    return hash(tuple(word for word in canonical.split() if NUMERAL.match(word)))
+
+def word_overlap(canonical, other):
+    """Share (0-1) of the longer topic's words found in the other, allowing typos"""
+    words, others = canonical.split(), other.split()
+    if len(words) < len(others):
+        words, others = others, words
+    matched = sum(
+        any(word == candidate or difflib.SequenceMatcher(None, word, candidate).ratio() >= WORD_MATCH_RATIO
+            for candidate in others)
+        for word in words
+    )
+    return matched / len(words) if words else 0.0
+
+def shingles(canonical):
+    """Stable 32-bit hashes of the character trigrams of a canonical topic"""
+    padded = f"  {canonical} "
+    grams = {padded[i:i + 3] for i in range(len(padded) - 2)}
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+def minhash(canonical):
+    """MinHash signature (NUM_PERMUTATIONS values) of a canonical topic"""
+    values = shingles(canonical)
+    with np.errstate(over="ignore"):
+        hashed = ((_MINHASH_A[:, None] * values[None, :] + _MINHASH_B[:, None]) % MINHASH_PRIME) & MINHASH_MAX
+    return hashed.min(axis=1)
+
+class _Bucket:
+    """Topics with one set of settings: a ring buffer of signatures that
+    grows by doubling up to max_topics, then overwrites the oldest slot"""
+
+    def __init__(self, max_topics):
+        self.max_topics = max_topics
+        self.size = 0
+        # Slot holding the oldest topic once the buffer is full
+        self.head = 0
+        self.signatures = np.empty((min(64, max_topics), NUM_PERMUTATIONS), dtype=np.uint64)
+        self.shapes = np.empty(min(64, max_topics), dtype=np.int64)
+        self.keys = []
+        self.topics = []
+        self.canonicals = []
+        self.canonical = {}
+
+    def add(self, canonical, signature, cache_key, topic):
+        if self.size < self.max_topics:
+            slot = self.size
+            if slot == len(self.signatures):
+                grown = np.empty((min(slot * 2, self.max_topics), NUM_PERMUTATIONS), dtype=np.uint64)
+                grown[:slot] = self.signatures
+                self.signatures = grown
+                shapes = np.empty(len(grown), dtype=np.int64)
+                shapes[:slot] = self.shapes
+                self.shapes = shapes
+            self.size += 1
+            self.keys.append(cache_key)
+            self.topics.append(topic)
+            self.canonicals.append(canonical)
+        else:
+            # Forget the oldest topic
+            slot = self.head
+            self.head = (self.head + 1) % self.max_topics
+            del self.canonical[self.canonicals[slot]]
+            self.keys[slot], self.topics[slot], self.canonicals[slot] = cache_key, topic, canonical
+        self.signatures[slot] = signature
+        self.shapes[slot] = topic_shape(canonical)
+        self.canonical[canonical] = slot
+
+class TopicIndex:
+    """MinHash signatures of cached topics, grouped by explanation settings"""
+
+    def __init__(self, max_topics=TOPIC_INDEX_MAX_TOPICS):
+        self.max_topics = max_topics
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bucket_key(level, tone, extras, language):
+        return (level, tone, (extras or "").strip(), language or "English")
+
+    def add(self, topic, level, tone, extras, language, cache_key):
+        canonical = canonicalize_topic(topic)
+        signature = minhash(canonical)
+        with self._lock:
+            bucket = self._buckets.get(self.bucket_key(level, tone, extras, language))
+            if bucket is None:
+                bucket = self._buckets[self.bucket_key(level, tone, extras, language)] = _Bucket(self.max_topics)
+            if canonical not in bucket.canonical:
+                bucket.add(canonical, signature, cache_key, topic)
+
+    def find(self, topic, level, tone, extras, language, threshold=TOPIC_SIMILARITY_THRESHOLD):
+        """Most similar cached topic with the same settings
+
+        Returns {"cache_key", "topic", "similarity"} or None if nothing
+        reaches the threshold.
+        """
+        canonical = canonicalize_topic(topic)
+        with self._lock:
+            bucket = self._buckets.get(self.bucket_key(level, tone, extras, language))
+            if not bucket or not bucket.size:
+                return None
+            exact = bucket.canonical.get(canonical)
+            if exact is not None:
+                return {"cache_key": bucket.keys[exact], "topic": bucket.topics[exact], "similarity": 1.0}
+
+            scores = (bucket.signatures[:bucket.size] == minhash(canonical)).mean(axis=1)
+            scores[bucket.shapes[:bucket.size] != topic_shape(canonical)] = 0
+            # Best trigram match first; the few over the threshold also need the words
+            candidates = np.flatnonzero(scores >= threshold)
+            for best in candidates[np.argsort(-scores[candidates], kind="stable")]:
+                if word_overlap(canonical, bucket.canonicals[best]) >= TOPIC_WORD_OVERLAP:
+                    return {"cache_key": bucket.keys[best], "topic": bucket.topics[best],
+                            "similarity": round(float(scores[best]), 3)}
+            return None
+
+    def __len__(self):
+        return sum(bucket.size for bucket in self._buckets.values())
+
+topic_index = TopicIndex()
@@ -0,0 +1,84 @@
+# translation.py - Explanations in other languages, translated from the cache
+# When a topic is already cached with the same settings in another
+# language, the requested language is produced by translating that text
+# (a smaller model call than generating) instead of generating afresh.
+# explain_all_languages fills in every language for a topic at once.
+# TRANSLATION_MODE=off always generates.
+import asyncio
+
+from catalog import LANGUAGES
+from explain_engine import TRANSLATION_MODE, generate_explanation_async, translate_explanation_async
+from formatting import clean_response
+from response_cache import find_translation_source, get_cached_explanation, store_cached_explanation, is_cacheable
+from scheduler import BATCH, INTERACTIVE
+
+async def explain_in_language(topic, level, tone, extras, language, deadline=None,
+                              priority=INTERACTIVE, user=None):
+    """Translate a cached explanation of the topic if there is one, else generate
+
+    Returns (explanation, metadata) with metadata["cache"] "translated" or
+    "miss". A failed translation falls back to generating.
+    """
+    if TRANSLATION_MODE != "off":
+        source = await find_translation_source(topic, level, tone, extras, language)
+        if source is not None:
+            source_language, source_text = source
+            explanation, budget = await translate_explanation_async(
+                source_text, source_language, language, deadline, priority, user
+            )
+            if is_cacheable(explanation):
+                return explanation, {"cache": "translated", "source_language": source_language, "budget": budget}
+    explanation, budget = await generate_explanation_async(
+        topic, level, tone, extras, language, deadline, priority, user
+    )
+    return explanation, {"cache": "miss", "budget": budget}
+
+async def explain_all_languages(topic, level, tone, extras, languages=LANGUAGES, deadline=None,
+                                priority=BATCH, user=None):
+    """Cache the topic in every language, translating concurrently from one source
+
+    The source is a language that's already cached, or the first language
+    generated from scratch. Returns {language: {"explanation", "cache"}}
+    for the languages that succeeded.
+    """
+    results = {}
+    for language in languages:
+        explanation = await get_cached_explanation(topic, level, tone, extras, language)
+        if explanation is not None:
+            results[language] = {"explanation": explanation, "cache": "hit"}
+    missing = [language for language in languages if language not in results]
+    if not missing:
+        return results
+
+    source = next(((language, result["explanation"]) for language, result in results.items()), None)
+    if source is None and TRANSLATION_MODE != "off":
+        source = await find_translation_source(topic, level, tone, extras, missing[0])
+    if source is None:
+        explanation, _ = await generate_explanation_async(
+            topic, level, tone, extras, missing[0], deadline, priority, user
+        )
+        explanation = clean_response(explanation)
+        if not is_cacheable(explanation):
+            return results
+        await store_cached_explanation(topic, level, tone, extras, missing[0], explanation)
+        results[missing[0]] = {"explanation": explanation, "cache": "miss"}
+        source = (missing.pop(0), explanation)
+
+    async def fill(language):
+        if TRANSLATION_MODE == "off":
+            explanation, _ = await generate_explanation_async(
+                topic, level, tone, extras, language, deadline, priority, user
+            )
+            cache = "miss"
+        else:
+            explanation, _ = await translate_explanation_async(
+                source[1], source[0], language, deadline, priority, user
+            )
+            cache = "translated"
+        explanation = clean_response(explanation)
+        if is_cacheable(explanation):
+            await store_cached_explanation(topic, level, tone, extras, language, explanation)
+            results[language] = {"explanation": explanation, "cache": cache}
+
+    await asyncio.gather(*map(fill, missing))
+    return {language: results[language] for language in languages if language in results}
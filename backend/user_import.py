@@ -0,0 +1,203 @@
+# user_import.py - Bulk account creation for schools and companies
+# Accounts come as CSV (header: username,email,password[,full_name]) or
+# NDJSON (one {"username", "email", "password", "full_name"} per line).
+# Passwords are bcrypt-hashed on a thread pool (bcrypt releases the GIL)
+# and the rows are written with one executemany (SQLite) or a COPY into a
+# staging table (PostgreSQL). Rows whose username or email is taken are
+# skipped and reported.
+#
+#   python user_import.py users.csv [--workers N]
+import os
+import csv
+import io
+import json
+import uuid
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import func
+
+from auth import get_password_hash, normalize_email
+from database import IS_POSTGRES, database, users_table, connect_sqlite
+
+# Threads hashing passwords at once
+IMPORT_HASH_WORKERS = int(os.getenv("IMPORT_HASH_WORKERS", str(os.cpu_count() or 4)))
+# Largest import accepted in one request
+IMPORT_MAX_USERS = int(os.getenv("IMPORT_MAX_USERS", "50000"))
+# Skipped rows listed individually in the report
+REPORTED_SKIPS = 100
+
+USER_COLUMNS = ["id", "username", "email", "hashed_password", "full_name", "total_explanations", "created_at", "is_active"]
+
+def parse_users(text):
+    """Parse CSV or NDJSON into (rows, skipped) where rows carry their line number"""
+    stripped = text.lstrip()
+    if stripped.startswith("{"):
+        records = []
+        for line_number, line in enumerate(text.splitlines(), 1):
+            if line.strip():
+                try:
+                    records.append((line_number, json.loads(line)))
+                except ValueError:
+                    records.append((line_number, None))
+    else:
+        # Line 1 is the header
+        records = list(enumerate(csv.DictReader(io.StringIO(text)), 2))
+
+    rows, skipped = [], []
+    seen_usernames, seen_emails = set(), set()
+    for line_number, record in records:
+        if not isinstance(record, dict):
+            skipped.append({"line": line_number, "reason": "unreadable row"})
+            continue
+        username = (record.get("username") or "").strip()
+        email = normalize_email(record.get("email") or "")
+        password = record.get("password") or ""
+        if not username or "@" not in email or not password:
+            skipped.append({"line": line_number, "username": username, "reason": "username, email and password are required"})
+        elif username in seen_usernames or email in seen_emails:
+            skipped.append({"line": line_number, "username": username, "reason": "duplicate in file"})
+        else:
+            seen_usernames.add(username)
+            seen_emails.add(email)
+            rows.append({
+                "line": line_number, "username": username, "email": email,
+                "password": password, "full_name": (record.get("full_name") or "").strip() or None
+            })
+    return rows, skipped
+
+def hash_passwords(passwords, workers=IMPORT_HASH_WORKERS):
+    """bcrypt-hash passwords in parallel, preserving their order"""
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(get_password_hash, passwords))
+
+# Database functions
+async def find_existing_pg(usernames, emails):
+    query = users_table.select().with_only_columns(users_table.c.username, users_table.c.email).where(
+        users_table.c.username.in_(usernames) | func.lower(users_table.c.email).in_(emails)
+    )
+    return [(row["username"], row["email"]) for row in await database.fetch_all(query)]
+
+def find_existing_sqlite(usernames, emails, chunk_size=400):
+    conn = connect_sqlite()
+    try:
+        found = []
+        for start in range(0, max(len(usernames), len(emails)), chunk_size):
+            names, mails = usernames[start:start + chunk_size], emails[start:start + chunk_size]
+            found += conn.execute(
+                f'SELECT username, email FROM users WHERE username IN ({",".join("?" * len(names))}) '
+                f'OR lower(email) IN ({",".join("?" * len(mails))})',
+                names + mails
+            ).fetchall()
+        return found
+    finally:
+        conn.close()
+
+async def insert_users_pg(users):
+    """COPY the rows into a staging table, then insert the ones still free
+
+    Rows whose username or email was registered since the existence check
+    are skipped (ON CONFLICT DO NOTHING) instead of failing the whole COPY.
+    """
+    columns = ", ".join(USER_COLUMNS)
+    async with database.connection() as connection:
+        raw = connection.raw_connection
+        async with raw.transaction():
+            await raw.execute('CREATE TEMP TABLE users_import (LIKE users INCLUDING DEFAULTS) ON COMMIT DROP')
+            await raw.copy_records_to_table(
+                "users_import", columns=USER_COLUMNS,
+                records=[tuple(user[column] for column in USER_COLUMNS) for user in users]
+            )
+            status = await raw.execute(
+                f'INSERT INTO users ({columns}) SELECT {columns} FROM users_import ON CONFLICT DO NOTHING'
+            )
+    # Status is "INSERT 0 <rows>"
+    return int(status.split()[-1])
+
+def insert_users_sqlite(users):
+    """executemany the rows, skipping any that raced in since the check"""
+    conn = connect_sqlite()
+    try:
+        before = conn.total_changes
+        conn.executemany(
+            f'INSERT OR IGNORE INTO users ({", ".join(USER_COLUMNS)}) VALUES ({", ".join("?" * len(USER_COLUMNS))})',
+            [tuple(user["created_at"].isoformat() if column == "created_at" else user[column] for column in USER_COLUMNS)
+             for user in users]
+        )
+        conn.commit()
+        return conn.total_changes - before
+    finally:
+        conn.close()
+
+async def import_users(text, workers=IMPORT_HASH_WORKERS):
+    """Create accounts from CSV/NDJSON text and report what was skipped"""
+    rows, skipped = parse_users(text)
+    received = len(rows) + len(skipped)
+    if len(rows) > IMPORT_MAX_USERS:
+        raise ValueError(f"At most {IMPORT_MAX_USERS} users per import")
+
+    # One query for every taken username/email, before spending bcrypt time on them
+    usernames = [row["username"] for row in rows]
+    emails = [row["email"] for row in rows]
+    if rows:
+        existing = await find_existing_pg(usernames, emails) if IS_POSTGRES else find_existing_sqlite(usernames, emails)
+    else:
+        existing = []
+    taken_usernames = {username for username, _ in existing}
+    taken_emails = {email.lower() for _, email in existing}
+    new_rows = []
+    for row in rows:
+        if row["username"] in taken_usernames:
+            skipped.append({"line": row["line"], "username": row["username"], "reason": "username already registered"})
+        elif row["email"] in taken_emails:
+            skipped.append({"line": row["line"], "username": row["username"], "reason": "email already registered"})
+        else:
+            new_rows.append(row)
+
+    hashes = await asyncio.to_thread(hash_passwords, [row["password"] for row in new_rows], workers)
+    now = datetime.utcnow()
+    users = [{
+        "id": f"user_{uuid.uuid4().hex}",
+        "username": row["username"],
+        "email": row["email"],
+        "hashed_password": hashed_password,
+        "full_name": row["full_name"],
+        "total_explanations": 0,
+        "created_at": now,
+        "is_active": True
+    } for row, hashed_password in zip(new_rows, hashes)]
+
+    created = 0
+    if users:
+        created = await insert_users_pg(users) if IS_POSTGRES else insert_users_sqlite(users)
+    skipped.sort(key=lambda skip: skip["line"])
+    return {
+        "received": received,
+        "created": created,
+        "skipped_count": received - created,
+        "skipped": skipped[:REPORTED_SKIPS]
+    }
+
+if __name__ == "__main__":
+    from database import connect_database, disconnect_database, create_tables
+
+    parser = argparse.ArgumentParser(description="Bulk-create accounts from CSV or NDJSON")
+    parser.add_argument("path")
+    parser.add_argument("--workers", type=int, default=IMPORT_HASH_WORKERS)
+    args = parser.parse_args()
+
+    async def main():
+        create_tables()
+        await connect_database()
+        try:
+            with open(args.path, encoding="utf-8") as f:
+                report = await import_users(f.read(), args.workers)
+        finally:
+            await disconnect_database()
+        print(f"✅ Created {report['created']} users, skipped {report['skipped_count']}")
+        for skip in report["skipped"]:
+            print(f"   line {skip['line']}: {skip.get('username', '')} - {skip['reason']}")
+
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+# warmup.py - Precompute explanations for the quick-example catalog
+# Run once from the CLI (`python warmup.py`) or in the background on startup
+# with WARMUP_ON_STARTUP=true, refreshing every WARMUP_REFRESH_HOURS.
+import os
+import time
+import asyncio
+import argparse
+import itertools
+
+from catalog import catalog_topics, LEVELS, TONES, LANGUAGES, DEFAULT_EXTRAS
+from response_cache import get_cached_explanation, store_cached_explanation, is_cacheable
+from explain_engine import generate_explanation_async
+from formatting import clean_response
+from scheduler import BATCH
+
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() == "true"
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+WARMUP_REFRESH_HOURS = float(os.getenv("WARMUP_REFRESH_HOURS", "12"))
+
+def warmup_jobs(topics=None, levels=None, tones=None, languages=None):
+    """Every topic x level x tone x language combination to precompute"""
+    return list(itertools.product(
+        topics or catalog_topics(),
+        levels or LEVELS,
+        tones or TONES,
+        languages or LANGUAGES
+    ))
+
+async def warm_one(semaphore, job, refresh, stats):
+    """Generate and cache one combination, skipping it if already cached"""
+    topic, level, tone, language = job
+    async with semaphore:
+        if not refresh and await get_cached_explanation(topic, level, tone, DEFAULT_EXTRAS, language):
+            stats["skipped"] += 1
+            return
+        # Batch class: interactive requests always go ahead of warm-up calls
+        explanation, _ = await generate_explanation_async(
+            topic, level, tone, DEFAULT_EXTRAS, language, priority=BATCH, user="warmup"
+        )
+        # Cached text is served as-is, so it's formatted like /api/explain's
+        explanation = clean_response(explanation)
+        if is_cacheable(explanation):
+            await store_cached_explanation(topic, level, tone, DEFAULT_EXTRAS, language, explanation)
+            stats["generated"] += 1
+        else:
+            stats["failed"] += 1
+
+async def run_warmup(refresh=False, concurrency=WARMUP_CONCURRENCY, jobs=None):
+    """Precompute the whole catalog with bounded concurrency"""
+    jobs = jobs if jobs is not None else warmup_jobs()
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"jobs": len(jobs), "generated": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+
+    print(f"🔥 Warm-up starting: {len(jobs)} combinations, concurrency {concurrency}")
+    await asyncio.gather(*(warm_one(semaphore, job, refresh, stats) for job in jobs))
+    stats["seconds"] = round(time.perf_counter() - started, 1)
+    print(f"✅ Warm-up finished: {stats}")
+    return stats
+
+async def warmup_loop():
+    """Warm the cache now, then refresh it on a schedule"""
+    refresh = False
+    while True:
+        try:
+            await run_warmup(refresh=refresh)
+        except Exception as e:
+            print(f"❌ Warm-up failed: {e}")
+        refresh = True
+        await asyncio.sleep(WARMUP_REFRESH_HOURS * 3600)
+
+def start_background_warmup():
+    """Schedule the warm-up loop on the running event loop"""
+    return asyncio.create_task(warmup_loop())
+
+async def _main(args):
+    from database import IS_POSTGRES, connect_database, disconnect_database, create_tables
+
+    if IS_POSTGRES:
+        await connect_database()
+    create_tables()
+    try:
+        await run_warmup(refresh=args.refresh, concurrency=args.concurrency)
+    finally:
+        if IS_POSTGRES:
+            await disconnect_database()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute catalog explanations")
+    parser.add_argument("--refresh", action="store_true", help="Regenerate entries that are already cached")
+    parser.add_argument("--concurrency", type=int, default=WARMUP_CONCURRENCY)
+    asyncio.run(_main(parser.parse_args()))
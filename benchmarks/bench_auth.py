@@ -0,0 +1,47 @@
+# benchmarks/bench_auth.py - Per-request token verification overhead
+#
+#   python benchmarks/bench_auth.py
+#
+# Compares a plain PyJWT decode (what get_current_user did on every
+# request) with backend/auth.py: cached tokens, first-seen tokens, and
+# the cheap rejects for malformed and unknown-key tokens.
+import os
+import sys
+import timeit
+
+import jwt
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+from auth import ALGORITHM, InvalidTokenError, create_access_token, key_ring, token_cache, verify_token
+
+def bench(name, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+    print(f"{name:<28} {seconds * 1e6:8.2f} µs")
+    return seconds
+
+def rejects(token):
+    def run():
+        try:
+            verify_token(token)
+        except InvalidTokenError:
+            pass
+    return run
+
+if __name__ == "__main__":
+    token = create_access_token({"sub": "bench-user"})
+    secret = key_ring.keys[key_ring.active_kid]
+    unknown_kid = jwt.encode({"sub": "x", "exp": 4102444800}, "other", algorithm=ALGORITHM, headers={"kid": "retired"})
+
+    legacy = bench("PyJWT decode every time", lambda: jwt.decode(token, secret, algorithms=[ALGORITHM]), 20000)
+
+    def uncached():
+        token_cache.clear()
+        verify_token(token)
+    first = bench("verify (not cached)", uncached, 20000)
+    verify_token(token)
+    cached = bench("verify (cached)", lambda: verify_token(token), 100000)
+    bench("reject malformed", rejects("not-a-token"), 100000)
+    bench("reject unknown kid", rejects(unknown_kid), 20000)
+    bench("reject bad signature", rejects(token[:-4] + "AAAA"), 20000)
+    print(f"cached speedup       {legacy / cached:6.1f}x")
@@ -0,0 +1,134 @@
+# benchmarks/bench_blob_compression.py - Storage/latency trade-off of compressed explanation bodies
+#
+#   python benchmarks/bench_blob_compression.py [--bodies 2000] [--users 200] [--queries 1000]
+#
+# Builds a corpus of markdown explanations (with their rendered HTML) and
+# compares codecs per body: compression ratio, compress and decompress
+# time - zstd with and without a trained dictionary, gzip and brotli.
+# It then stores the corpus as history in a throwaway SQLite database
+# with plain-text blobs, times history reads, compresses the blobs with
+# the migration (blob_store.recode_blobs) and times them again.
+import os
+import sys
+import gzip
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+import brotli
+import zstandard
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+from rendering import render_html
+
+WORDS = (
+    "energy particle wave field force system model process structure pattern cell signal data network "
+    "value example result change rate balance reaction layer surface light pressure memory language"
+).split()
+SECTIONS = ["Overview", "How It Works", "Key Concepts", "Real-World Examples", "Common Misconceptions", "Summary"]
+
+def make_body(rng, index):
+    """A markdown explanation shaped like the model's answers"""
+    parts = [f"# {rng.choice(WORDS).title()} {rng.choice(WORDS).title()} {index}\n"]
+    for section in rng.sample(SECTIONS, rng.randint(3, len(SECTIONS))):
+        parts.append(f"## {section}\n")
+        for _ in range(rng.randint(1, 3)):
+            parts.append(" ".join(rng.choice(WORDS) for _ in range(rng.randint(30, 70))).capitalize() + ".\n")
+        if rng.random() < 0.6:
+            parts.append("\n".join(f"- **{rng.choice(WORDS).title()}**: " + " ".join(rng.choice(WORDS) for _ in range(12))
+                                   for _ in range(rng.randint(2, 5))) + "\n")
+    return "\n".join(parts)
+
+def per_body(func, items):
+    started = time.perf_counter()
+    results = [func(item) for item in items]
+    return results, (time.perf_counter() - started) / len(items) * 1e6
+
+def compare_codecs(corpus, training):
+    dictionary = zstandard.train_dictionary(64 * 1024, training)
+    codecs = {
+        "zstd-3": (zstandard.ZstdCompressor(level=3).compress, zstandard.ZstdDecompressor().decompress),
+        "zstd-6": (zstandard.ZstdCompressor(level=6).compress, zstandard.ZstdDecompressor().decompress),
+        "zstd-6 + dictionary": (zstandard.ZstdCompressor(level=6, dict_data=dictionary).compress,
+                                zstandard.ZstdDecompressor(dict_data=dictionary).decompress),
+        "gzip-6": (lambda data: gzip.compress(data, compresslevel=6), gzip.decompress),
+        "brotli-5": (lambda data: brotli.compress(data, quality=5), brotli.decompress),
+    }
+    raw = sum(map(len, corpus))
+    print(f"{len(corpus)} bodies, {raw / len(corpus) / 1000:.1f} KB average (markdown + HTML)")
+    print(f"{'codec':<22} {'ratio':>6} {'compress':>12} {'decompress':>12}")
+    for name, (compress, decompress) in codecs.items():
+        compressed, compress_us = per_body(compress, corpus)
+        _, decompress_us = per_body(decompress, compressed)
+        print(f"{name:<22} {raw / sum(map(len, compressed)):5.2f}x {compress_us:9.1f} µs {decompress_us:9.1f} µs")
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.95)]
+
+async def history_latency(app_module, args, label):
+    rng = random.Random(3)
+    samples = []
+    for _ in range(args.queries):
+        started = time.perf_counter()
+        await app_module.get_user_explanations(f"user_{rng.randrange(args.users)}")
+        samples.append((time.perf_counter() - started) * 1000)
+    p50, p95 = percentiles(samples)
+    conn = sqlite3.connect("xplainit.db")
+    conn.execute('VACUUM')
+    conn.close()
+    print(f"{label:<22} history p50 {p50:6.3f} ms  p95 {p95:6.3f} ms  database {os.path.getsize('xplainit.db') / 1e6:6.1f} MB")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bodies", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    markdown = [make_body(rng, i) for i in range(args.bodies + 1000)]
+    html = [render_html(body) for body in markdown]
+    corpus = [(m + h).encode("utf-8") for m, h in zip(markdown[:args.bodies], html[:args.bodies])]
+    training = [text.encode("utf-8") for pair in zip(markdown[args.bodies:], html[args.bodies:]) for text in pair]
+    compare_codecs(corpus, training)
+    print()
+
+    os.chdir(tempfile.mkdtemp())
+    os.environ["BLOB_COMPRESSION"] = "off"
+    import app as app_module
+    import blob_store
+    app_module.create_tables()
+    now = datetime.utcnow()
+    # Every user's page is 20 explanations spread over the corpus
+    for user in range(args.users):
+        for n in range(20):
+            i = (user * 20 + n) % args.bodies
+            app_module.save_explanation_to_db_sqlite({
+                "id": f"exp_{user}_{n}", "user_id": f"user_{user}", "topic": f"topic {i}",
+                "explanation": markdown[i], "explanation_html": html[i], "timestamp": now - timedelta(minutes=n),
+                "settings": {"level": "Intermediate", "tone": "Casual", "language": "English", "extras": ""}
+            })
+    await history_latency(app_module, args, "plain text")
+
+    blob_store.BLOB_COMPRESSION = "zstd"
+    started = time.perf_counter()
+    blob_store.recode_blobs(True)
+    print(f"   compressed without a dictionary in {time.perf_counter() - started:.1f} s")
+    await history_latency(app_module, args, "zstd")
+
+    blob_store.train_dictionary(1000)
+    blob_store.recode_blobs(False)
+    started = time.perf_counter()
+    blob_store.recode_blobs(True)
+    print(f"   recompressed with the dictionary in {time.perf_counter() - started:.1f} s")
+    await history_latency(app_module, args, "zstd + dictionary")
+
+if __name__ == "__main__":
+    asyncio.run(main())
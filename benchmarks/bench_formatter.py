@@ -0,0 +1,59 @@
+# benchmarks/bench_formatter.py - Response formatting on ~50 KB responses
+#
+#   python benchmarks/bench_formatter.py
+#
+# Compares the old clean_response from main.py (seven uncompiled re.sub
+# passes) with backend/formatting.py and the memoized frontend wrapper.
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+sys.path.insert(0, os.path.join(ROOT, "frontend"))
+from formatting import clean_response
+from utils.formatter import format_response
+
+def legacy_clean_response(response):
+    """clean_response as it was in frontend/main.py"""
+    response = re.sub(r'</?div[^>]*>', '', response)
+    response = re.sub(r'^\*{1,2}([^\n*]+)\*{1,2}\s*$', r'### \1', response, flags=re.MULTILINE)
+    response = re.sub(r'^(.+?[\?:])\s*$', r'### \1', response, flags=re.MULTILINE)
+    response = re.sub(r'\*{1,2}([^\*]+)\*{1,2}', r'**\1**', response)
+    response = re.sub(r'^\s*•\s?', '- ', response, flags=re.MULTILINE)
+    response = re.sub(r'^\s*-\s?', '- ', response, flags=re.MULTILINE)
+    response = re.sub(r'\n{3,}', '\n\n', response)
+    return response.strip()
+
+SECTION = """**How It Works**
+
+What happens inside a black hole?
+A black hole is a region where *gravity* is so strong that **nothing** escapes.
+
+
+Key ideas:
+• The event horizon is the point of no return
+• Singularities are where our equations break down
+  - Time dilation grows near the horizon
+<div class="note">Even light cannot escape.</div>
+
+"""
+
+def make_response(size=50_000):
+    return (SECTION * (size // len(SECTION) + 1))[:size]
+
+def bench(name, func, text, number):
+    seconds = min(timeit.repeat(lambda: func(text), number=number, repeat=5)) / number
+    print(f"{name:<28} {seconds * 1000:8.3f} ms")
+    return seconds
+
+if __name__ == "__main__":
+    text = make_response()
+    print(f"Response size: {len(text) / 1000:.0f} KB")
+    legacy = bench("legacy (7 re.sub passes)", legacy_clean_response, text, 20)
+    single = bench("precompiled single pass", clean_response, text, 20)
+    format_response(text)
+    memo = bench("memoized (cache hit)", format_response, text, 200)
+    print(f"single pass speedup  {legacy / single:6.1f}x")
+    print(f"memoized speedup     {legacy / memo:6.1f}x")
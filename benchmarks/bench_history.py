@@ -0,0 +1,154 @@
+# benchmarks/bench_history.py - History latency before/after the hot/cold split and archival
+#
+#   python benchmarks/bench_history.py [--rows 10000000] [--users 20000] [--days 730]
+#                                      [--hot-days 90] [--retention-days 365] [--queries 2000]
+#
+# Fills a throwaway SQLite database with a synthetic history (timestamps
+# spread evenly over --days; explanations close in time share a body),
+# then times /api/history's query path for random users: the first page,
+# an incremental ?since= sync, and the page of a user whose recent
+# history is short (the case that falls through to cold and archived
+# rows). It runs the retention pass and repeats the measurements, then
+# times rehydrating archived items from their files.
+import os
+import sys
+import time
+import random
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+import statistics
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+BATCH_SIZE = 200_000
+# Explanations per distinct body; explanations close in time share bodies
+ROWS_PER_BODY = 20
+BODY = "Some markdown text for the synthetic explanation body. " * 30
+
+def populate(args):
+    """Insert the synthetic users, blobs and explanations"""
+    conn = sqlite3.connect("xplainit.db")
+    now = datetime.utcnow()
+    conn.executemany(
+        'INSERT INTO users (id, username, email, hashed_password, created_at, total_explanations, is_active) '
+        'VALUES (?, ?, ?, ?, ?, 0, 1)',
+        [(f"user_{u}", f"user{u}", f"user{u}@example.com", "x", now.isoformat()) for u in range(args.users + 1)]
+    )
+    span = args.days * 86400
+    bodies = max(args.rows // ROWS_PER_BODY, 1)
+    for start in range(0, bodies, BATCH_SIZE):
+        conn.executemany(
+            'INSERT INTO explanation_blobs (content_hash, explanation, size, created_at) VALUES (?, ?, ?, ?)',
+            [(f"hash_{b}", f"# Explanation {b}\n\n{BODY}", len(BODY),
+              (now - timedelta(seconds=span * (b + 1) // bodies)).isoformat()) for b in range(start, min(start + BATCH_SIZE, bodies))]
+        )
+    # The index is built once at the end; it's much faster than maintaining it per row
+    conn.execute('DROP INDEX ix_explanations_user_id_timestamp')
+    rng = random.Random(1)
+
+    def explanation(i):
+        age = rng.randrange(span)
+        return (f"exp_{i}", f"user_{rng.randrange(args.users)}", f"topic {i % 5000}",
+                f"hash_{min(age * bodies // span, bodies - 1)}", (now - timedelta(seconds=age)).isoformat())
+
+    for start in range(0, args.rows, BATCH_SIZE):
+        conn.executemany(
+            'INSERT INTO explanations (id, user_id, topic, explanation, content_hash, level, tone, language, extras, timestamp) '
+            'VALUES (?, ?, ?, \'\', ?, \'Intermediate\', \'Casual\', \'English\', \'\', ?)',
+            [explanation(i) for i in range(start, min(start + BATCH_SIZE, args.rows))]
+        )
+        conn.commit()
+        print(f"\r   {min(start + BATCH_SIZE, args.rows):,} rows", end="", flush=True)
+    # One user whose last activity was long ago: their page comes from cold and archived rows
+    conn.executemany(
+        'INSERT INTO explanations (id, user_id, topic, explanation, content_hash, level, tone, language, extras, timestamp) '
+        'VALUES (?, ?, \'old topic\', \'\', \'hash_0\', \'Beginner\', \'Casual\', \'English\', \'\', ?)',
+        [(f"old_{i}", f"user_{args.users}", (now - timedelta(days=args.days - i)).isoformat()) for i in range(20)]
+    )
+    conn.execute('CREATE INDEX ix_explanations_user_id_timestamp ON explanations (user_id, timestamp)')
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+    print()
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return (statistics.median(samples), samples[int(len(samples) * 0.95)], samples[int(len(samples) * 0.99)])
+
+async def measure(app_module, args, label):
+    rng = random.Random(2)
+    since = datetime.utcnow() - timedelta(days=1)
+    cases = {
+        "first page": lambda: app_module.get_user_explanations(f"user_{rng.randrange(args.users)}"),
+        "since 1 day": lambda: app_module.get_user_explanations(f"user_{rng.randrange(args.users)}", since),
+        "inactive user": lambda: app_module.get_user_explanations(f"user_{args.users}"),
+    }
+    for name, call in cases.items():
+        samples = []
+        for _ in range(args.queries):
+            started = time.perf_counter()
+            await call()
+            samples.append((time.perf_counter() - started) * 1000)
+        p50, p95, p99 = percentiles(samples)
+        print(f"{label:<8} {name:<15} p50 {p50:7.3f} ms  p95 {p95:7.3f} ms  p99 {p99:7.3f} ms")
+
+def sizes():
+    archive = sum(os.path.getsize(os.path.join("archive", name)) for name in os.listdir("archive")) if os.path.isdir("archive") else 0
+    return os.path.getsize("xplainit.db") / 1e6, archive / 1e6
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=20_000)
+    parser.add_argument("--days", type=int, default=730)
+    parser.add_argument("--hot-days", type=int, default=90)
+    parser.add_argument("--retention-days", type=int, default=365)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    os.environ["SQLITE_HOT_DAYS"] = str(args.hot_days)
+    import app as app_module
+    import retention
+    app_module.create_tables()
+
+    print(f"Generating {args.rows:,} explanations for {args.users:,} users over {args.days} days")
+    started = time.perf_counter()
+    populate(args)
+    print(f"   {time.perf_counter() - started:.0f} s, database {sizes()[0]:.0f} MB")
+
+    await measure(app_module, args, "before")
+
+    started = time.perf_counter()
+    report = retention.run_retention(args.retention_days)
+    elapsed = time.perf_counter() - started
+    conn = sqlite3.connect("xplainit.db")
+    conn.execute('VACUUM')
+    conn.execute('ANALYZE')
+    conn.close()
+    database_mb, archive_mb = sizes()
+    print(f"Retention pass: {report['moved_to_cold']:,} moved to cold, {report['archived']:,} archived, "
+          f"{report['deleted_blobs']:,} bodies deleted in {elapsed:.1f} s; "
+          f"database {database_mb:.0f} MB after VACUUM, archives {archive_mb:.0f} MB")
+
+    await measure(app_module, args, "after")
+
+    conn = sqlite3.connect("xplainit.db")
+    archived = conn.execute('SELECT id, user_id FROM archived_explanations ORDER BY RANDOM() LIMIT 20').fetchall()
+    conn.close()
+    samples = []
+    for explanation_id, user_id in archived:
+        retention.rehydrate_cache = retention.RehydrateCache()
+        started = time.perf_counter()
+        assert await app_module.get_explanation(user_id, explanation_id)
+        samples.append((time.perf_counter() - started) * 1000)
+    if samples:
+        p50, p95, _ = percentiles(samples)
+        print(f"Rehydrating an archived item (uncached): p50 {p50:.0f} ms  p95 {p95:.0f} ms")
+
+if __name__ == "__main__":
+    asyncio.run(main())
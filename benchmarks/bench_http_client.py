@@ -0,0 +1,52 @@
+# benchmarks/bench_http_client.py - Handshake savings of the pooled frontend client
+#
+#   python benchmarks/bench_http_client.py                  # against BACKEND_URL
+#   python benchmarks/bench_http_client.py --url http://localhost:8000 -n 50
+#
+# Compares bare requests.get (new TCP+TLS connection per call, like the old
+# main.py helpers) with the shared keep-alive session from utils/api_client.py.
+import os
+import sys
+import time
+import argparse
+import statistics
+import requests
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend")))
+from utils.api_client import BACKEND_URL, build_session
+
+# Backend calls made by one Streamlit rerun that logs in or explains a topic
+CALLS_PER_RERUN = 2
+
+def time_calls(get, url, n):
+    timings = []
+    for _ in range(n):
+        started = time.perf_counter()
+        get(url, timeout=(5, 30))
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=BACKEND_URL)
+    parser.add_argument("-n", type=int, default=20)
+    args = parser.parse_args()
+    url = f"{args.url.rstrip('/')}/test"
+
+    # Wake the backend (Render free tier sleeps) so both runs see a warm server
+    requests.get(url, timeout=(10, 60))
+
+    bare = time_calls(requests.get, url, args.n)
+    session = build_session()
+    pooled = time_calls(session.get, url, args.n)
+
+    bare_ms = statistics.median(bare)
+    pooled_ms = statistics.median(pooled)
+    print(f"Target: {url} ({args.n} calls each)")
+    print(f"bare requests.get   median {bare_ms:8.1f} ms   p95 {sorted(bare)[int(args.n * 0.95) - 1]:8.1f} ms")
+    print(f"pooled session      median {pooled_ms:8.1f} ms   p95 {sorted(pooled)[int(args.n * 0.95) - 1]:8.1f} ms")
+    print(f"saved per call      {bare_ms - pooled_ms:8.1f} ms")
+    print(f"saved per rerun     {(bare_ms - pooled_ms) * CALLS_PER_RERUN:8.1f} ms ({CALLS_PER_RERUN} calls)")
+
+if __name__ == "__main__":
+    main()
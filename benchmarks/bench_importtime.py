@@ -0,0 +1,91 @@
+# benchmarks/bench_importtime.py - Cold-start import budget
+#
+#   python benchmarks/bench_importtime.py            # check import budgets
+#   python benchmarks/bench_importtime.py --serve    # also time process start -> first /test
+#
+# Runs `python -X importtime` in a fresh interpreter per module, prints the
+# heaviest imports, and exits non-zero when a module goes over its budget.
+import os
+import sys
+import time
+import argparse
+import subprocess
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BACKEND = os.path.join(ROOT, "backend")
+FRONTEND = os.path.join(ROOT, "frontend")
+
+# (module, working directory, budget in ms)
+BUDGETS = [
+    ("app", BACKEND, int(os.getenv("APP_IMPORT_BUDGET_MS", "1500"))),
+    ("explain_engine", BACKEND, int(os.getenv("ENGINE_IMPORT_BUDGET_MS", "150"))),
+    ("utils.api_client", FRONTEND, int(os.getenv("CLIENT_IMPORT_BUDGET_MS", "1500"))),
+]
+
+def import_profile(module, cwd):
+    """Return {module name: (cumulative µs, nesting depth)} for a fresh import"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nested imports are indented two spaces per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        timings[name.strip()] = (int(cumulative_us), depth)
+    return timings
+    return timings
+
+def time_to_first_request(port=8765, timeout=30):
+    """Seconds from starting uvicorn until /test answers"""
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port)],
+        cwd=BACKEND, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/test", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - started
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError("backend did not answer /test")
+    finally:
+        process.terminate()
+        process.wait()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--serve", action="store_true", help="Also time process start to first /test")
+    args = parser.parse_args()
+
+    over_budget = False
+    for module, cwd, budget_ms in BUDGETS:
+        timings = import_profile(module, cwd)
+        total_ms = timings[module][0] / 1000
+        status = "ok" if total_ms <= budget_ms else "OVER BUDGET"
+        over_budget |= total_ms > budget_ms
+        print(f"{module:<20} {total_ms:8.1f} ms  (budget {budget_ms} ms)  {status}")
+        # Heaviest direct imports of the module
+        heaviest = sorted(
+            ((name, us) for name, (us, depth) in timings.items() if depth == 1),
+            key=lambda item: item[1], reverse=True
+        )[:5]
+        for name, us in heaviest:
+            print(f"    {name:<30} {us / 1000:8.1f} ms")
+
+    if args.serve:
+        print(f"start -> first /test     {time_to_first_request() * 1000:8.1f} ms")
+
+    sys.exit(1 if over_budget else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_scheduler.py - Interactive latency under a big batch, with and without the scheduler
+#
+#   python benchmarks/bench_scheduler.py [--slots 8] [--seconds 20] [--rate 40] [--users 50]
+#                                        [--batch 5000] [--batch-concurrency 64] [--service-ms 100]
+#
+# Simulates upstream model calls as sleeps (lognormal around --service-ms)
+# sharing --slots of capacity. Interactive requests arrive as a Poisson
+# stream from --users users while a batch of --batch calls is pushed with
+# --batch-concurrency in flight. It reports interactive latency (queue
+# wait + call) and batch throughput for: interactive traffic alone, a
+# plain shared semaphore (FIFO, what ad-hoc concurrency limits give), and
+# scheduler.Scheduler.
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+import scheduler as scheduler_module
+from scheduler import INTERACTIVE, BATCH, Scheduler
+
+def percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples), samples[int(len(samples) * 0.95)], samples[int(len(samples) * 0.99)]
+
+class FifoLimit:
+    """A shared semaphore: every call queues in arrival order"""
+
+    def __init__(self, slots):
+        self.semaphore = asyncio.Semaphore(slots)
+
+    async def acquire(self, priority, key, cost):
+        await self.semaphore.acquire()
+
+    def release(self, priority):
+        self.semaphore.release()
+
+async def model_call(limiter, rng, args, priority, key):
+    await limiter.acquire(priority, key, 1.0)
+    try:
+        await asyncio.sleep(rng.lognormvariate(0, 0.5) * args.service_ms / 1000)
+    finally:
+        limiter.release(priority)
+
+async def run(label, limiter, args, with_batch=True):
+    rng = random.Random(1)
+    latencies = []
+    batch_done = 0
+    stop = time.monotonic() + args.seconds
+
+    async def interactive(user):
+        started = time.perf_counter()
+        await model_call(limiter, rng, args, INTERACTIVE, f"user_{user}")
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    async def batch_worker(jobs):
+        nonlocal batch_done
+        while jobs and time.monotonic() < stop:
+            jobs.pop()
+            await model_call(limiter, rng, args, BATCH, "batch")
+            batch_done += 1
+
+    workers = []
+    if with_batch:
+        jobs = list(range(args.batch))
+        workers = [asyncio.create_task(batch_worker(jobs)) for _ in range(args.batch_concurrency)]
+    requests = []
+    while time.monotonic() < stop:
+        await asyncio.sleep(rng.expovariate(args.rate))
+        requests.append(asyncio.create_task(interactive(rng.randrange(args.users))))
+    await asyncio.gather(*requests, *workers)
+    p50, p95, p99 = percentiles(latencies)
+    print(f"{label:<22} interactive p50 {p50:6.0f} ms  p95 {p95:6.0f} ms  p99 {p99:6.0f} ms  "
+          f"batch {batch_done / args.seconds:5.1f} calls/s")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--rate", type=float, default=40, help="interactive requests per second")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--batch-concurrency", type=int, default=64)
+    parser.add_argument("--service-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    scheduler_module.BATCH_ADJUST_SECONDS = 1
+    print(f"{args.slots} slots, {args.rate:.0f} interactive req/s (~{args.rate * args.service_ms / 1000 / args.slots:.0%} "
+          f"of capacity), batch of {args.batch} with {args.batch_concurrency} in flight, "
+          f"wait target {scheduler_module.INTERACTIVE_WAIT_P95_MS:.0f} ms")
+    await run("interactive only", FifoLimit(args.slots), args, with_batch=False)
+    await run("shared semaphore", FifoLimit(args.slots), args)
+    limiter = Scheduler(args.slots)
+    await run("scheduler", limiter, args)
+    print(f"   final batch limit {limiter.batch_limit}; {limiter.snapshot()['classes']}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+# benchmarks/bench_signup.py - Signup storm against a throwaway SQLite database
+#
+#   python benchmarks/bench_signup.py [--users 200] [--duplicates 20] [--bcrypt-rounds 4]
+#
+# Fires concurrent signups at the app (unique users plus a burst of
+# signups for the same username) and compares the old check-then-insert
+# flow (username lookup, email lookup, insert) with the single insert
+# backed by unique constraints: SQL statements per signup, wall time,
+# and whether every duplicate gets a clean 400 instead of a 500.
+import os
+import sys
+import time
+import asyncio
+import sqlite3
+import argparse
+import tempfile
+from collections import Counter
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+statements = Counter()
+_connect = sqlite3.connect
+
+def counting_connect(*args, **kwargs):
+    conn = _connect(*args, **kwargs)
+    conn.set_trace_callback(lambda sql: statements.update([sql.split(None, 1)[0].upper()]))
+    return conn
+
+async def legacy_signup(app_module, user):
+    """The signup flow before the single insert"""
+    from fastapi import HTTPException
+    if await app_module.get_user_by_username(user.username):
+        raise HTTPException(status_code=400, detail="Username already registered")
+    if await app_module.get_user_by_email(user.email):
+        raise HTTPException(status_code=400, detail="Email already registered")
+    # Same await point as the real handler: other signups run while bcrypt does
+    hashed_password = await asyncio.to_thread(app_module.get_password_hash, user.password)
+    from datetime import datetime
+    new_user = {
+        "id": f"user_{os.urandom(8).hex()}", "username": user.username, "email": user.email,
+        "full_name": user.full_name, "hashed_password": hashed_password,
+        "total_explanations": 0, "created_at": datetime.utcnow(), "is_active": True
+    }
+    try:
+        await app_module.create_user_in_db(new_user)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating user: {str(e)}")
+    return app_module.UserResponse(**new_user)
+
+async def storm(client, args, prefix):
+    """Concurrent signups; returns (seconds, status code counts, statement counts)"""
+    payloads = [
+        {"username": f"{prefix}{i}", "email": f"{prefix}{i}@example.com", "password": "storm-password"}
+        for i in range(args.users)
+    ] + [
+        {"username": f"{prefix}same", "email": f"{prefix}same{i}@example.com", "password": "storm-password"}
+        for i in range(args.duplicates)
+    ]
+    statements.clear()
+    started = time.perf_counter()
+    responses = await asyncio.gather(*[client.post("/auth/signup", json=payload) for payload in payloads])
+    elapsed = time.perf_counter() - started
+    return elapsed, Counter(response.status_code for response in responses), statements.copy()
+
+def report(name, result, total):
+    elapsed, codes, executed = result
+    per_signup = (executed["SELECT"] + executed["INSERT"]) / total
+    print(f"{name:<20} {elapsed:6.2f} s  {per_signup:4.1f} statements/signup  status codes {dict(codes)}")
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--duplicates", type=int, default=20)
+    parser.add_argument("--bcrypt-rounds", type=int, default=4)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    sqlite3.connect = counting_connect
+    import httpx
+    import app as app_module
+    import auth
+    app_module.create_tables()
+    auth.pwd_context.update(bcrypt__rounds=args.bcrypt_rounds)
+
+    route = next(route for route in app_module.app.routes if getattr(route, "path", None) == "/auth/signup")
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        single = await storm(client, args, "single")
+        original = route.dependant.call
+        route.dependant.call = lambda user: legacy_signup(app_module, user)
+        try:
+            legacy = await storm(client, args, "legacy")
+        finally:
+            route.dependant.call = original
+
+    total = args.users + args.duplicates
+    print(f"{args.users} unique signups + {args.duplicates} concurrent signups for one username")
+    report("check-then-insert", legacy, total)
+    report("single insert", single, total)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,17 +1,24 @@
 # Enhanced main.py - XplainIT.ai with Authentication + WORKING Load Button
 import streamlit as st
-import requests
 from datetime import datetime
-import re
 import warnings
 import json
 import sys
 import os
+import importlib.util
 warnings.filterwarnings("ignore", message=".*ScriptRunContext.*")
 
 backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "backend"))
 sys.path.append(backend_path)
 
+from utils.constants import QUICK_EXAMPLES, LEVELS, TONES, LANGUAGES, EXTRA_PROMPTS
+from utils.api_client import (
+    BACKEND_URL, signup_user, login_user, logout_user, get_user_info, call_explain_api
+)
+from utils.backend_health import get_backend_health
+from utils.state import apply_user_stats, merge_history, sync_history, store_tokens, ensure_fresh_token, load_archived_item
+from utils.formatter import format_response
+
 # Try to import local modules, fallback if not available
 try:
     from utils.theme import apply_custom_css
@@ -19,14 +26,9 @@ try:
 except ImportError:
     HAS_THEME = False
 
-try:
-    from explain_engine import generate_explanation
-    HAS_LOCAL_ENGINE = True
-except ImportError:
-    HAS_LOCAL_ENGINE = False
-
-# Backend configuration
-BACKEND_URL = "https://xplainit-ai.onrender.com"
+# The local engine (and the Gemini SDK behind it) is only imported when a
+# fallback is actually needed, not on every script run
+HAS_LOCAL_ENGINE = importlib.util.find_spec("explain_engine") is not None
 
 
 # Page config with better SEO
@@ -42,10 +44,18 @@ if 'authenticated' not in st.session_state:
     st.session_state.authenticated = False
 if 'token' not in st.session_state:
     st.session_state.token = None
+if 'refresh_token' not in st.session_state:
+    st.session_state.refresh_token = None
+if 'token_expires_at' not in st.session_state:
+    st.session_state.token_expires_at = None
 if 'user_info' not in st.session_state:
     st.session_state.user_info = None
 if 'history' not in st.session_state:
     st.session_state.history = []
+if 'history_etag' not in st.session_state:
+    st.session_state.history_etag = None
+if 'history_synced' not in st.session_state:
+    st.session_state.history_synced = False
 if 'selected_example' not in st.session_state:
     st.session_state.selected_example = ""
 if 'regenerate_requested' not in st.session_state:
@@ -54,6 +64,8 @@ if 'input_text' not in st.session_state:
     st.session_state.input_text = ""
 if 'current_response' not in st.session_state:
     st.session_state.current_response = ""
+if 'current_response_html' not in st.session_state:
+    st.session_state.current_response_html = ""
 if 'current_topic' not in st.session_state:
     st.session_state.current_topic = ""
 if 'topic_to_load' not in st.session_state:
@@ -61,89 +73,22 @@ if 'topic_to_load' not in st.session_state:
 if 'auto_generate' not in st.session_state:
     st.session_state.auto_generate = False
 
-# Authentication functions
-def signup_user(username, email, password, full_name):
-    """Register a new user"""
-    try:
-        response = requests.post(f"{BACKEND_URL}/auth/signup", json={
-            "username": username,
-            "email": email,
-            "password": password,
-            "full_name": full_name
-        })
-        return response
-    except requests.exceptions.RequestException:
-        return None
-
-def login_user(username, password):
-    """Login user and get JWT token"""
-    try:
-        response = requests.post(f"{BACKEND_URL}/auth/login", data={
-            "username": username,
-            "password": password
-        })
-        return response
-    except requests.exceptions.RequestException:
-        return None
-
-def get_user_info(token):
-    """Get current user information"""
-    try:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(f"{BACKEND_URL}/auth/me", headers=headers)
-        return response
-    except requests.exceptions.RequestException:
-        return None
-
-def call_explain_api(topic, level, tone, extras, language, token):
-    """Call the protected explain API"""
+def local_generate_explanation(topic, level, tone, extras, language):
+    """Answer without the backend: offline snapshot first (no network), then
+    the local Gemini engine, then the demo fallback if neither can load"""
     try:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.post(f"{BACKEND_URL}/api/explain", 
-                               json={
-                                   "topic": topic,
-                                   "level": level,
-                                   "tone": tone,
-                                   "extras": extras,
-                                   "language": language
-                               },
-                               headers=headers)
-        return response
-    except requests.exceptions.RequestException:
-        return None
-
-def get_user_history(token):
-    """Get user's explanation history"""
-    try:
-        headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(f"{BACKEND_URL}/api/history", headers=headers)
-        return response
-    except requests.exceptions.RequestException:
-        return None
-
-def clean_response(response):
-    """Clean up AI response and format with markdown headings"""
-    import re
-    # Remove HTML divs
-    response = re.sub(r'</?div[^>]*>', '', response)
+        from offline_engine import generate_offline_explanation
+        offline_response = generate_offline_explanation(topic, level, tone, extras, language)
+        if offline_response:
+            return offline_response
+    except ImportError:
+        pass
     
-    # Convert *Heading* or **Heading** (at start of line) to markdown heading
-    response = re.sub(r'^\*{1,2}([^\n*]+)\*{1,2}\s*$', r'### \1', response, flags=re.MULTILINE)
-    
-    # Convert lines ending with : or ? to markdown heading
-    response = re.sub(r'^(.+?[\?:])\s*$', r'### \1', response, flags=re.MULTILINE)
-
-    # Replace extra bold/italic markup in the content
-    response = re.sub(r'\*{1,2}([^\*]+)\*{1,2}', r'**\1**', response)
-
-    # Convert bullets
-    response = re.sub(r'^\s*•\s?', '- ', response, flags=re.MULTILINE)
-    response = re.sub(r'^\s*-\s?', '- ', response, flags=re.MULTILINE)
-
-    # Remove excessive empty lines
-    response = re.sub(r'\n{3,}', '\n\n', response)
-
-    return response.strip()
+    try:
+        from explain_engine import generate_explanation
+    except ImportError:
+        return fallback_generate_explanation(topic, level, tone, extras, language)
+    return generate_explanation(topic, level, tone, extras, language)
 
 def fallback_generate_explanation(topic, level, tone, extras, language):
     """Fallback explanation when backend is not available"""
@@ -166,16 +111,21 @@ def fallback_generate_explanation(topic, level, tone, extras, language):
     Additional context: {extras}
     """
 
+# Renew the access token before it expires instead of asking for the password again
+if st.session_state.authenticated and not ensure_fresh_token():
+    st.session_state.authenticated = False
+    st.session_state.token = None
+    st.session_state.refresh_token = None
+    st.session_state.user_info = None
+    st.warning("Your session has expired. Please log in again.")
+
 # Authentication Section
 if not st.session_state.authenticated:
-    # Check if backend is available
-    try:
-        test_response = requests.get(f"{BACKEND_URL}/test", timeout=2)
-        backend_available = test_response.status_code == 200
-    except:
-        backend_available = False
+    # Check if backend is available (cached status, refreshed in the background)
+    backend_health = get_backend_health()
     
-    if not backend_available:
+    if not backend_health.is_available():
+        backend_health.refresh()
         st.error(f"⚠️ Backend server not available at {BACKEND_URL}. Please start your backend first.")
         st.info("To start backend: `cd backend` then `python app.py`")
         st.stop()
@@ -207,8 +157,7 @@ if not st.session_state.authenticated:
                         response = login_user(login_username, login_password)
                         
                         if response and response.status_code == 200:
-                            data = response.json()
-                            st.session_state.token = data["access_token"]
+                            store_tokens(response.json())
                             st.session_state.authenticated = True
                             
                             # Get user info
@@ -243,7 +192,7 @@ if not st.session_state.authenticated:
                             if response and response.status_code == 200:
                                 st.success("✅ Account created successfully! Please login.")
                             elif response and response.status_code == 400:
-                                st.error("❌ Username or email already exists")
+                                st.error(f"❌ {response.json().get('detail', 'Username or email already exists')}")
                             else:
                                 st.error("❌ Failed to create account")
                     else:
@@ -268,10 +217,16 @@ else:
                 st.markdown(f"**Explanations Generated:** {total_explanations}")
         
         if st.button("🚪 Logout", use_container_width=True):
+            if st.session_state.refresh_token:
+                logout_user(st.session_state.refresh_token)
             st.session_state.authenticated = False
             st.session_state.token = None
+            st.session_state.refresh_token = None
+            st.session_state.token_expires_at = None
             st.session_state.user_info = None
             st.session_state.history = []  # Clear history on logout
+            st.session_state.history_etag = None
+            st.session_state.history_synced = False
             st.success("Logged out successfully!")
             st.rerun()
         
@@ -286,41 +241,24 @@ else:
         st.markdown("---")
         st.markdown("### 📜 Recent History")
 
-        # Load backend history with error handling
+        # Load history once per session; after that only newer items are fetched
+        if not st.session_state.history_synced:
+            sync_history(st.session_state.token)
+
         if st.button("🔄 Refresh History"):
             with st.spinner("Loading history..."):
-                history_response = get_user_history(st.session_state.token)
-                if history_response and history_response.status_code == 200:
-                    try:
-                        history_data = history_response.json()
-                        backend_history = history_data.get('explanations', [])
-                        
-                        # Convert backend format to local format - SAFE VERSION
-                        st.session_state.history = []
-                        for exp in backend_history:
-                            st.session_state.history.append({
-                                'topic': exp.get('topic', 'Untitled'),
-                                'response': exp.get('explanation', 'No explanation available'),
-                                'level': exp.get('level', 'Unknown'),
-                                'tone': exp.get('tone', 'Unknown'),
-                                'timestamp': exp.get('timestamp', ''),
-                                'settings': {
-                                    'level': exp.get('level', 'Unknown'),
-                                    'tone': exp.get('tone', 'Unknown'),
-                                    'language': exp.get('language', 'English'),
-                                    'extras': exp.get('extras', '')
-                                }
-                            })
-                        
-                        if st.session_state.history:
-                            st.success(f"✅ Loaded {len(st.session_state.history)} explanations from history!")
-                        else:
-                            st.info("No history found. Start asking questions!")
-                            
-                    except Exception as e:
-                        st.error(f"❌ Error parsing history data: {str(e)}")
-                else:
-                    st.error("❌ Failed to load history. Please try again.")
+                try:
+                    new_items = sync_history(st.session_state.token)
+                    if new_items is None:
+                        st.error("❌ Failed to load history. Please try again.")
+                    elif new_items:
+                        st.success(f"✅ Loaded {new_items} new explanations from history!")
+                    elif st.session_state.history:
+                        st.success(f"✅ History is up to date ({len(st.session_state.history)} explanations)")
+                    else:
+                        st.info("No history found. Start asking questions!")
+                except Exception as e:
+                    st.error(f"❌ Error parsing history data: {str(e)}")
 
         # Show recent history items - CORRECTED WORKING LOAD BUTTON VERSION
         if st.session_state.history:
@@ -346,12 +284,18 @@ else:
                     
                     # CORRECTED LOAD BUTTON - NOW TRIGGERS AUTO GENERATION
                     if st.button("📋 Load Topic", key=f"load_history_{i}"):
+                        # Archived items come without a body until they're opened
+                        if item.get('archived') and not item.get('response'):
+                            with st.spinner("Restoring archived explanation..."):
+                                load_archived_item(st.session_state.token, item)
+                        
                         # Set the topic to be loaded
                         st.session_state.topic_to_load = topic
                         st.session_state.input_text = topic
                         
                         # Load the previous explanation immediately
                         st.session_state.current_response = item.get('response', '')
+                        st.session_state.current_response_html = item.get('response_html') or ""
                         st.session_state.current_topic = topic
                         
                         # Set flag to trigger automatic explanation generation (optional)
@@ -440,38 +384,7 @@ else:
             st.markdown("### 🎲 Quick Examples")
             
             # Diverse category buttons
-            categories = {
-                "🔬 Science": [
-                    "How do black holes work?",
-                    "What is DNA?",
-                    "Climate change explained"
-                ],
-                "🎨 Arts": [
-                    "What is the Mona Lisa's significance?",
-                    "Jazz music origins",
-                    "Modern art movements"
-                ],
-                "📚 History": [
-                    "The Renaissance period",
-                    "Ancient Egyptian civilization",
-                    "The Cold War"
-                ],
-                "🏥 Health": [
-                    "How does the immune system work?",
-                    "What is mental health?",
-                    "Nutrition basics"
-                ],
-                "💰 Finance": [
-                    "What is cryptocurrency?",
-                    "How do mortgages work?",
-                    "Stock market basics"
-                ],
-                "🌍 Culture": [
-                    "World religions overview",
-                    "Cultural traditions",
-                    "Language families"
-                ]
-            }
+            categories = QUICK_EXAMPLES
             
             selected_category = st.selectbox("Choose a category:", list(categories.keys()))
             
@@ -487,21 +400,21 @@ else:
             with col1:
                 level = st.selectbox(
                     "My Understanding Level",
-                    ["Beginner", "Intermediate", "Advanced"],
+                    LEVELS,
                     help="We'll adjust the complexity accordingly"
                 )
                 
             with col2:
                 tone = st.selectbox(
                     "Explanation Style",
-                    ["Casual", "Formal", "Technical"],
+                    TONES,
                     help="How would you like us to explain?"
                 )
                 
             with col3:
                 language = st.selectbox(
                     "Language",
-                    ["English", "Spanish", "French", "Hindi", "Chinese", "German", "Japanese", "Arabic"],
+                    LANGUAGES,
                     help="Get explanations in your preferred language"
                 )
             
@@ -532,8 +445,10 @@ else:
             )
         
         # Check if regeneration was requested (Deeper Dive)
+        priority = "interactive"
         if st.session_state.regenerate_requested:
             generate_button = True
+            priority = "deeper_dive"
             st.session_state.regenerate_requested = False
         
         # NEW: Auto-generate explanation for loaded topics
@@ -549,50 +464,54 @@ else:
                 # Build enhanced prompt
                 enhanced_extras = []
                 if include_examples:
-                    enhanced_extras.append("Include practical real-world examples")
+                    enhanced_extras.append(EXTRA_PROMPTS["examples"])
                 if include_analogies:
-                    enhanced_extras.append("Use simple, relatable analogies")
+                    enhanced_extras.append(EXTRA_PROMPTS["analogies"])
                 if visual_aids:
-                    enhanced_extras.append("Describe visual representations where helpful")
+                    enhanced_extras.append(EXTRA_PROMPTS["visual_aids"])
                 if include_history:
-                    enhanced_extras.append("Add historical context and evolution")
+                    enhanced_extras.append(EXTRA_PROMPTS["history"])
                 if include_resources:
-                    enhanced_extras.append("Suggest resources for further learning")
+                    enhanced_extras.append(EXTRA_PROMPTS["resources"])
                 if eli5_mode:
-                    enhanced_extras.append("Explain as if to a 5-year-old child")
+                    enhanced_extras.append(EXTRA_PROMPTS["eli5"])
                 if extras:
                     enhanced_extras.append(extras)
                 
                 final_extras = ". ".join(enhanced_extras)
                 
+                # Pre-rendered HTML only comes from the backend
+                response_html = ""
+                
                 # Show simple spinner
                 with st.spinner("🧠 Generating your explanation..."):
                     # Try backend first, fallback to local
                     if st.session_state.token:
-                        api_response = call_explain_api(topic, level, tone, final_extras, language, st.session_state.token)
+                        api_response = call_explain_api(topic, level, tone, final_extras, language, st.session_state.token, priority)
                         if api_response and api_response.status_code == 200:
                             explanation_data = api_response.json()
                             response = explanation_data['explanation']
+                            response_html = explanation_data.get('explanation_html') or ""
                             
-                            # Refresh user info to get updated explanation count
-                            user_response = get_user_info(st.session_state.token)
-                            if user_response and user_response.status_code == 200:
-                                st.session_state.user_info = user_response.json()
+                            # Update the explanation count and history from the response itself
+                            apply_user_stats(explanation_data.get('user'))
+                            merge_history([explanation_data])
                         else:
                             # Fallback to local generation or demo
                             if HAS_LOCAL_ENGINE:
-                                response = generate_explanation(topic, level, tone, final_extras, language)
+                                response = local_generate_explanation(topic, level, tone, final_extras, language)
                             else:
                                 response = fallback_generate_explanation(topic, level, tone, final_extras, language)
                     else:
                         # Fallback to local generation
                         if HAS_LOCAL_ENGINE:
-                            response = generate_explanation(topic, level, tone, final_extras, language)
+                            response = local_generate_explanation(topic, level, tone, final_extras, language)
                         else:
                             response = fallback_generate_explanation(topic, level, tone, final_extras, language)
                 
                 # Store response in session state
                 st.session_state.current_response = response
+                st.session_state.current_response_html = response_html
                 st.session_state.current_topic = topic
 
         # Display response if it exists in session state
@@ -600,46 +519,20 @@ else:
             st.markdown("---")
             st.markdown("### 💡 Your Personalized Explanation")
             
-            # Clean the response
-            cleaned_response = clean_response(st.session_state.current_response)
-            
-            # Display with custom styling
-            st.markdown("""
-            <style>
-            div[data-testid="stMarkdownContainer"] .response-box {
-                background: linear-gradient(135deg, #1a1a2e 0%, #16213e 50%, #1a1a2e 100%) !important;
-                border-left: 5px solid #7b3ff2 !important;
-                border-radius: 15px !important;
-                padding: 2.5rem !important;
-                margin: 1.5rem 0 !important;
-                box-shadow: 0 10px 40px rgba(123, 63, 242, 0.15) !important;
-                border: 1px solid rgba(123, 63, 242, 0.2) !important;
-                color: #ffffff !important;
-            }
-            div[data-testid="stMarkdownContainer"] .response-box h3 {
-                color: #7b3ff2 !important;
-                font-size: 1.4rem !important;
-                font-weight: 700 !important;
-                margin: 1.5rem 0 1rem 0 !important;
-            }
-            div[data-testid="stMarkdownContainer"] .response-box p {
-                color: #e0e0e0 !important;
-                line-height: 1.8 !important;
-                font-size: 1.05rem !important;
-            }
-            div[data-testid="stMarkdownContainer"] .response-box strong {
-                color: #ffffff !important;
-                font-weight: 600 !important;
-            }
-            </style>
-            """, unsafe_allow_html=True)
-            
-            # Display with clean container
-            st.markdown(f"""
-            <div class="response-box">
-            {cleaned_response}
-            </div>
-            """, unsafe_allow_html=True)
+            # Display pre-rendered HTML from the backend when available
+            if st.session_state.current_response_html:
+                st.markdown(
+                    f'<div class="response-box">{st.session_state.current_response_html}</div>',
+                    unsafe_allow_html=True
+                )
+            else:
+                # Clean the response (memoized by response hash)
+                cleaned_response = format_response(st.session_state.current_response)
+                st.markdown(f"""
+                <div class="response-box">
+                {cleaned_response}
+                </div>
+                """, unsafe_allow_html=True)
             
             # Action buttons
             col1, col2, col3, col4 = st.columns(4)
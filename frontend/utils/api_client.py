@@ -0,0 +1,143 @@
+# utils/api_client.py - Pooled HTTP client for the XplainIT.ai backend
+# One requests.Session is shared by every script run through st.cache_resource,
+# so reruns reuse kept-alive TCP+TLS connections instead of handshaking again.
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Backend configuration
+BACKEND_URL = "https://xplainit-ai.onrender.com"
+
+# (connect, read) timeouts in seconds per endpoint
+TIMEOUTS = {
+    "test": (2, 2),
+    "signup": (5, 20),    # bcrypt hashing on the server
+    "login": (5, 20),
+    "refresh": (5, 10),
+    "me": (5, 10),
+    "explain": (5, 120),  # model generation
+    "history": (5, 20),
+}
+
+# Only idempotent requests are retried (GET/HEAD); POSTs are sent once
+RETRY = Retry(
+    total=3,
+    connect=3,
+    read=2,
+    backoff_factor=0.5,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset({"GET", "HEAD"}),
+    raise_on_status=False,
+)
+
+def build_session(pool_maxsize=20):
+    """Create a keep-alive session with pooling and retries"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, max_retries=RETRY)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+@st.cache_resource
+def get_session():
+    """Session shared by all Streamlit reruns and users"""
+    return build_session()
+
+def _auth_headers(token):
+    return {"Authorization": f"Bearer {token}"}
+
+def signup_user(username, email, password, full_name):
+    """Register a new user"""
+    try:
+        return get_session().post(f"{BACKEND_URL}/auth/signup", json={
+            "username": username,
+            "email": email,
+            "password": password,
+            "full_name": full_name
+        }, timeout=TIMEOUTS["signup"])
+    except requests.exceptions.RequestException:
+        return None
+
+def login_user(username, password):
+    """Login user and get JWT token"""
+    try:
+        return get_session().post(f"{BACKEND_URL}/auth/login", data={
+            "username": username,
+            "password": password
+        }, timeout=TIMEOUTS["login"])
+    except requests.exceptions.RequestException:
+        return None
+
+def refresh_tokens(refresh_token):
+    """Exchange a refresh token for a new access token (no password check)"""
+    try:
+        return get_session().post(f"{BACKEND_URL}/auth/refresh", json={"refresh_token": refresh_token},
+                                  timeout=TIMEOUTS["refresh"])
+    except requests.exceptions.RequestException:
+        return None
+
+def logout_user(refresh_token):
+    """Revoke the refresh token on the backend"""
+    try:
+        return get_session().post(f"{BACKEND_URL}/auth/logout", json={"refresh_token": refresh_token},
+                                  timeout=TIMEOUTS["refresh"])
+    except requests.exceptions.RequestException:
+        return None
+
+def get_user_info(token):
+    """Get current user information"""
+    try:
+        return get_session().get(f"{BACKEND_URL}/auth/me", headers=_auth_headers(token),
+                                 timeout=TIMEOUTS["me"])
+    except requests.exceptions.RequestException:
+        return None
+
+def call_explain_api(topic, level, tone, extras, language, token, priority="interactive"):
+    """Call the protected explain API ("deeper_dive" priority for follow-ups)"""
+    try:
+        return get_session().post(f"{BACKEND_URL}/api/explain",
+                                  json={
+                                      "topic": topic,
+                                      "level": level,
+                                      "tone": tone,
+                                      "extras": extras,
+                                      "language": language,
+                                      "priority": priority
+                                  },
+                                  # The server gives up (and stops the model call) when we would
+                                  headers={**_auth_headers(token), "X-Request-Timeout": str(TIMEOUTS["explain"][1])},
+                                  timeout=TIMEOUTS["explain"])
+    except requests.exceptions.RequestException:
+        return None
+
+def get_user_history(token, etag=None, since=None):
+    """Get user's explanation history (304 if unchanged since etag)
+
+    With since, only explanations newer than that timestamp are returned.
+    """
+    try:
+        headers = _auth_headers(token)
+        if etag:
+            headers["If-None-Match"] = etag
+        params = {"since": since} if since else None
+        return get_session().get(f"{BACKEND_URL}/api/history", headers=headers, params=params,
+                                 timeout=TIMEOUTS["history"])
+    except requests.exceptions.RequestException:
+        return None
+
+def get_history_item(token, explanation_id):
+    """Get one explanation with its body (archived ones are restored on the server)"""
+    try:
+        return get_session().get(f"{BACKEND_URL}/api/history/{explanation_id}", headers=_auth_headers(token),
+                                 timeout=TIMEOUTS["history"])
+    except requests.exceptions.RequestException:
+        return None
+
+def check_backend():
+    """Return True if the backend answers /test"""
+    try:
+        response = get_session().get(f"{BACKEND_URL}/test", timeout=TIMEOUTS["test"])
+        return response.status_code == 200
+    except requests.exceptions.RequestException:
+        return False
@@ -0,0 +1,54 @@
+# utils/backend_health.py - Cached backend health with background refresh
+# Script reruns read the last known status instead of probing /test
+# themselves; a daemon thread re-probes on an interval.
+import time
+import threading
+import streamlit as st
+
+from utils.api_client import check_backend
+
+# How often the background thread probes /test
+HEALTH_REFRESH_SECONDS = 15
+# A status older than this is treated as unknown
+HEALTH_TTL_SECONDS = 60
+
+class BackendHealth:
+    def __init__(self, probe, refresh_seconds=HEALTH_REFRESH_SECONDS, ttl_seconds=HEALTH_TTL_SECONDS):
+        self.probe = probe
+        self.refresh_seconds = refresh_seconds
+        self.ttl_seconds = ttl_seconds
+        self._available = None
+        self._checked_at = 0.0
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="backend-health", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            available = self.probe()
+            self._available = available
+            self._checked_at = time.monotonic()
+            self._wake.wait(self.refresh_seconds)
+            self._wake.clear()
+
+    def refresh(self):
+        """Ask the background thread to probe now (non-blocking)"""
+        self._wake.set()
+
+    def status(self):
+        """Last known status: True, False, or None if unknown/stale"""
+        if self._available is None or time.monotonic() - self._checked_at > self.ttl_seconds:
+            return None
+        return self._available
+
+    def is_available(self):
+        """Optimistic read - only a confirmed failed probe counts as down"""
+        return self.status() is not False
+
+@st.cache_resource
+def get_backend_health():
+    """Process-wide health monitor shared by all sessions"""
+    return BackendHealth(check_backend).start()
@@ -54,4 +54,56 @@ TOPIC_EXAMPLES = {
         "Literature genres",
         "Photography basics"
     ]
-}
\ No newline at end of file
+}
+
+# Quick examples shown next to the topic input on the main page
+QUICK_EXAMPLES = {
+    "🔬 Science": [
+        "How do black holes work?",
+        "What is DNA?",
+        "Climate change explained"
+    ],
+    "🎨 Arts": [
+        "What is the Mona Lisa's significance?",
+        "Jazz music origins",
+        "Modern art movements"
+    ],
+    "📚 History": [
+        "The Renaissance period",
+        "Ancient Egyptian civilization",
+        "The Cold War"
+    ],
+    "🏥 Health": [
+        "How does the immune system work?",
+        "What is mental health?",
+        "Nutrition basics"
+    ],
+    "💰 Finance": [
+        "What is cryptocurrency?",
+        "How do mortgages work?",
+        "Stock market basics"
+    ],
+    "🌍 Culture": [
+        "World religions overview",
+        "Cultural traditions",
+        "Language families"
+    ]
+}
+
+# Explanation settings
+LEVELS = ["Beginner", "Intermediate", "Advanced"]
+TONES = ["Casual", "Formal", "Technical"]
+LANGUAGES = ["English", "Spanish", "French", "Hindi", "Chinese", "German", "Japanese", "Arabic"]
+
+# Prompt additions for the "Customize Your Explanation" checkboxes
+EXTRA_PROMPTS = {
+    "examples": "Include practical real-world examples",
+    "analogies": "Use simple, relatable analogies",
+    "visual_aids": "Describe visual representations where helpful",
+    "history": "Add historical context and evolution",
+    "resources": "Suggest resources for further learning",
+    "eli5": "Explain as if to a 5-year-old child"
+}
+
+# Extras sent when only the default checkboxes are ticked (examples + analogies)
+DEFAULT_EXTRAS = ". ".join([EXTRA_PROMPTS["examples"], EXTRA_PROMPTS["analogies"]])
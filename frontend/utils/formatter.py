@@ -0,0 +1,34 @@
+# utils/formatter.py - Memoized response formatting for the main page
+# Explanations from the backend are already cleaned at generation time;
+# this covers older history rows and local fallback responses, and caches
+# the result by response hash so reruns don't re-format the same text.
+import hashlib
+from collections import OrderedDict
+
+try:
+    from formatting import clean_response
+except ImportError:
+    def clean_response(response):
+        return response.strip()
+
+# Formatted responses kept per process
+FORMAT_CACHE_SIZE = 256
+
+_format_cache = OrderedDict()
+
+def response_hash(response):
+    return hashlib.blake2b(response.encode("utf-8"), digest_size=16).digest()
+
+def format_response(response):
+    """Clean a response, reusing the result for text we've seen before"""
+    key = response_hash(response)
+    cached = _format_cache.get(key)
+    if cached is not None:
+        _format_cache.move_to_end(key)
+        return cached
+
+    cleaned = clean_response(response)
+    _format_cache[key] = cleaned
+    if len(_format_cache) > FORMAT_CACHE_SIZE:
+        _format_cache.popitem(last=False)
+    return cleaned
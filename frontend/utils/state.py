@@ -0,0 +1,132 @@
+# utils/state.py - Local session state updates from backend responses
+import time
+
+import streamlit as st
+
+from utils.api_client import get_user_history, get_history_item, refresh_tokens
+
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 120
+
+def store_tokens(data):
+    """Keep the tokens from /auth/login or /auth/refresh in the session"""
+    st.session_state.token = data["access_token"]
+    st.session_state.refresh_token = data.get("refresh_token")
+    expires_in = data.get("expires_in")
+    st.session_state.token_expires_at = time.time() + expires_in if expires_in else None
+
+def ensure_fresh_token():
+    """Refresh the access token shortly before it expires
+
+    Returns False if the session could not be renewed and the user has
+    to log in again.
+    """
+    expires_at = st.session_state.get("token_expires_at")
+    refresh_token = st.session_state.get("refresh_token")
+    if not refresh_token or not expires_at or time.time() < expires_at - TOKEN_REFRESH_MARGIN:
+        return True
+    response = refresh_tokens(refresh_token)
+    if response is not None and response.status_code == 200:
+        store_tokens(response.json())
+        return True
+    if response is not None and response.status_code == 401:
+        return False
+    # Backend unreachable: keep the current token and retry on the next run
+    return True
+
+def apply_user_stats(user_stats):
+    """Apply the counters returned by /api/explain to the cached user info
+
+    Falls back to a local +1 when the backend didn't send counters, so the
+    sidebar stays current without another /auth/me round-trip.
+    """
+    user_info = st.session_state.user_info
+    if not user_info:
+        return
+    if user_stats and user_stats.get("total_explanations") is not None:
+        user_info["total_explanations"] = user_stats["total_explanations"]
+    else:
+        user_info["total_explanations"] = (user_info.get("total_explanations") or 0) + 1
+
+# Max explanations kept in the local history cache
+HISTORY_CACHE_SIZE = 50
+
+def to_history_item(exp):
+    """Convert a backend explanation into the local history format"""
+    return {
+        'id': exp.get('id'),
+        'topic': exp.get('topic', 'Untitled'),
+        'response': exp.get('explanation', 'No explanation available'),
+        'response_html': exp.get('explanation_html'),
+        'level': exp.get('level', exp.get('settings', {}).get('level', 'Unknown')),
+        'tone': exp.get('tone', exp.get('settings', {}).get('tone', 'Unknown')),
+        'timestamp': exp.get('timestamp', ''),
+        'archived': exp.get('archived', False),
+        'settings': exp.get('settings') or {
+            'level': exp.get('level', 'Unknown'),
+            'tone': exp.get('tone', 'Unknown'),
+            'language': exp.get('language', 'English'),
+            'extras': exp.get('extras', '')
+        }
+    }
+
+def merge_history(explanations):
+    """Merge explanations into the bounded local history (oldest first)
+
+    Returns the number of items that weren't already cached.
+    """
+    items = {item.get('id') or item['timestamp']: item for item in st.session_state.history}
+    added = 0
+    for exp in explanations:
+        item = to_history_item(exp)
+        key = item['id'] or item['timestamp']
+        if key not in items:
+            added += 1
+        items[key] = item
+    merged = sorted(items.values(), key=lambda item: item['timestamp'] or '')
+    st.session_state.history = merged[-HISTORY_CACHE_SIZE:]
+    return added
+
+def load_archived_item(token, item):
+    """Fetch the body of an archived history item in place
+
+    Returns False if the backend couldn't restore it.
+    """
+    response = get_history_item(token, item['id'])
+    if response is None or response.status_code != 200:
+        return False
+    restored = to_history_item(response.json())
+    item['response'] = restored['response']
+    item['response_html'] = restored['response_html']
+    return True
+
+def latest_history_timestamp():
+    """Timestamp of the newest cached explanation, used as the sync cursor"""
+    if not st.session_state.history:
+        return None
+    return st.session_state.history[-1]['timestamp'] or None
+
+def sync_history(token):
+    """Fetch only explanations newer than the local cache and merge them
+
+    Pages forward from the cursor until the backend says there is no more.
+    Returns the number of new items, or None if the request failed.
+    """
+    response = get_user_history(token, st.session_state.history_etag, since=latest_history_timestamp())
+    st.session_state.history_synced = True
+    added = 0
+    while True:
+        if response is None:
+            return None
+        if response.status_code == 304:
+            return added
+        if response.status_code != 200:
+            return None
+        st.session_state.history_etag = response.headers.get("ETag")
+        data = response.json()
+        explanations = data.get('explanations', [])
+        added += merge_history(explanations)
+        if not data.get('has_more') or not explanations:
+            return added
+        # The page is oldest first; continue after its newest item
+        response = get_user_history(token, since=explanations[-1].get('timestamp'))